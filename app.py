@@ -1,8 +1,15 @@
 # app.py
 from __future__ import annotations
 
+import argparse
+import sys
+import time
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
-from converter.core import ConverterCore, parse_pair
+from pathlib import Path
+from typing import List, Optional
+
+# Ядро импортируется только там, где конвертация идёт в этом процессе: клиенту демона
+# (--pair/--amount) хватает сокета, и короткий вызов из скрипта не платит за импорт ядра.
 
 
 def choose_language() -> str:
@@ -19,21 +26,25 @@ def ask_pair(lang: str) -> str:
     return input('Enter currencies like: "RUB - USD": ').strip()
 
 
+def parse_amount(raw: str) -> Decimal:
+    cleaned = (
+        raw.replace(" ", "")
+           .replace("\u00a0", "")
+           .replace("_", "")
+           .replace(",", ".")
+    )
+    amount = Decimal(cleaned)
+    if not amount.is_finite() or amount <= 0:
+        raise InvalidOperation
+    return amount
+
+
 def ask_amount(lang: str) -> Decimal:
     while True:
         prompt = "Введите сумму: " if lang == "ru" else "Enter amount: "
         raw = input(prompt).strip()
         try:
-            cleaned = (
-                raw.replace(" ", "")
-                   .replace("\u00a0", "")
-                   .replace("_", "")
-                   .replace(",", ".")
-            )
-            amount = Decimal(cleaned)
-            if amount <= 0:
-                raise InvalidOperation
-            return amount
+            return parse_amount(raw)
         except InvalidOperation:
             if lang == "ru":
                 print("Некорректная сумма, попробуйте ещё раз.")
@@ -45,32 +56,189 @@ def q3(x: Decimal) -> Decimal:
     return x.quantize(Decimal("0.001"), rounding=ROUND_HALF_UP)
 
 
-def main() -> None:
+def print_result(res, amount: Decimal, lang: str) -> None:
+    """res — ConversionResult ядра или RemoteResult демона (поля одинаковые)."""
+    result_3 = q3(res.result)
+    rate_6 = res.rate.quantize(Decimal("0.000001"), rounding=ROUND_HALF_UP)
+    fetched_local = res.fetched_at.astimezone().strftime("%Y-%m-%d %H:%M:%S")
+
+    if lang == "ru":
+        print(f"{q3(amount)} {res.base} = {result_3} {res.quote}")
+        print(f"Курс: {rate_6} | Обновлено: {fetched_local} | Источник: {res.source}")
+    else:
+        print(f"{q3(amount)} {res.base} = {result_3} {res.quote}")
+        print(f"Rate: {rate_6} | Updated: {fetched_local} | Source: {res.source}")
+
+
+def convert_local(pair: str, amount: Decimal, db: Path):
+    from converter.core import ConverterCore
+
+    core = ConverterCore(db_path=db, auto_update_age_hours=12)
+    try:
+        a, b = core.resolver.parse_pair(pair)
+        return core.convert(a, b, amount=amount)
+    finally:
+        core.close()
+
+
+def interactive() -> None:
     lang = choose_language()
     pair = ask_pair(lang)
     amount = ask_amount(lang)
 
-    core = ConverterCore(db_path="rates.sqlite3", auto_update_age_hours=12)
     try:
-        a, b = parse_pair(pair)
-        res = core.convert(a, b, amount=amount)
+        print_result(convert_local(pair, amount, Path("rates.sqlite3")), amount, lang)
+    except Exception as e:
+        print(("Ошибка: " if lang == "ru" else "Error: ") + str(e))
 
-        result_3 = q3(res.result)
-        rate_6 = res.rate.quantize(Decimal("0.000001"), rounding=ROUND_HALF_UP)
-        fetched_local = res.fetched_at.astimezone().strftime("%Y-%m-%d %H:%M:%S")
 
-        if lang == "ru":
-            print(f"{q3(amount)} {res.base} = {result_3} {res.quote}")
-            print(f"Курс: {rate_6} | Обновлено: {fetched_local} | Источник: {res.source}")
-        else:
-            print(f"{q3(amount)} {res.base} = {result_3} {res.quote}")
-            print(f"Rate: {rate_6} | Updated: {fetched_local} | Source: {res.source}")
+def run_once(args: argparse.Namespace) -> int:
+    """Неинтерактивная конвертация: через демон, а если его нет — в этом процессе."""
+    lang = args.lang
+    try:
+        amount = parse_amount(args.amount)
+    except InvalidOperation:
+        print("Некорректная сумма" if lang == "ru" else "Invalid amount", file=sys.stderr)
+        return 2
 
-    except Exception as e:
-        print(("Ошибка: " if lang == "ru" else "Error: ") + str(e))
+    res = None
+    if not args.no_daemon:
+        from converter.daemon import DaemonClient, DaemonUnavailable
+
+        try:
+            with DaemonClient(args.socket) as client:
+                res = client.convert(args.pair, amount)
+        except DaemonUnavailable:
+            pass  # считаем сами
+        except ValueError as e:
+            print(("Ошибка: " if lang == "ru" else "Error: ") + str(e), file=sys.stderr)
+            return 2
+    if res is None:
+        try:
+            res = convert_local(args.pair, amount, args.db)
+        except Exception as e:
+            print(("Ошибка: " if lang == "ru" else "Error: ") + str(e), file=sys.stderr)
+            return 2
+
+    if args.quiet:
+        print(res.result)
+    else:
+        print_result(res, amount, lang)
+    return 0
+
+
+def run_daemon(args: argparse.Namespace) -> int:
+    from converter.core import ConverterCore
+    from converter.daemon import ConversionDaemon
+
+    core = ConverterCore(db_path=args.db, auto_update_age_hours=12, fetch_on_init=False)
+    daemon = ConversionDaemon(core, args.socket)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    finally:
+        core.close()
+    return 0
+
+
+def run_bulk(args: argparse.Namespace) -> int:
+    from converter.bulk import convert_csv, convert_jsonl
+    from converter.core import ConverterCore
+
+    fmt = args.format or ("jsonl" if str(args.input).endswith((".jsonl", ".ndjson")) else "csv")
+    convert = convert_jsonl if fmt == "jsonl" else convert_csv
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    core = ConverterCore(db_path=args.db, auto_update_age_hours=12)
+    try:
+        stats = convert(core, src, dst, base_col=args.base_col, quote_col=args.quote_col,
+                        amount_col=args.amount_col, quote=args.quote, chunk_size=args.chunk_size)
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    finally:
+        core.close()
+        for f in (src, dst):
+            if f not in (sys.stdin, sys.stdout):
+                f.close()
+    print(f"Строк: {stats.rows}, ошибок: {stats.errors}, курсы: {stats.source} (версия {stats.version})",
+          file=sys.stderr)
+    return 1 if stats.errors else 0
+
+
+def run_import_ecb(args: argparse.Namespace) -> int:
+    from converter.core import ConverterCore
+
+    core = ConverterCore(db_path=args.db, auto_update_age_hours=12, fetch_on_init=False)
+    started = time.perf_counter()
+    try:
+        days, rows = core.import_ecb_history(args.source, batch_days=args.batch_days)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
     finally:
         core.close()
+    print(f"Дней: {days}, курсов: {rows}, за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Конвертер валют / Currency converter")
+    parser.add_argument("--pair", help='пара без диалога, например "RUB - USD" / currency pair, no prompts')
+    parser.add_argument("--amount", default="1", help="сумма (по умолчанию 1)")
+    parser.add_argument("--lang", choices=("ru", "eng"), default="ru")
+    parser.add_argument("-q", "--quiet", action="store_true", help="вывести только результат")
+    parser.add_argument("--socket", type=Path, help="сокет демона (по умолчанию $CONVERTER_SOCKET)")
+    parser.add_argument("--no-daemon", action="store_true", help="не обращаться к демону")
+    parser.add_argument("--db", default="rates.sqlite3", type=Path)
+    sub = parser.add_subparsers(dest="command")
+    # --db и --socket можно указать и до, и после подкоманды. У подкоманд значения по умолчанию
+    # нет (SUPPRESS): иначе оно затёрло бы значение, заданное до подкоманды
+    db_opt = argparse.ArgumentParser(add_help=False)
+    db_opt.add_argument("--db", type=Path, default=argparse.SUPPRESS)
+    socket_opt = argparse.ArgumentParser(add_help=False)
+    socket_opt.add_argument("--socket", type=Path, default=argparse.SUPPRESS,
+                            help="путь сокета (по умолчанию $CONVERTER_SOCKET)")
+
+    sub.add_parser("daemon", parents=[db_opt, socket_opt],
+                   help="держать курсы в памяти и отвечать по Unix-сокету / run the daemon")
+
+    bulk = sub.add_parser("bulk", parents=[db_opt],
+                          help="конвертация CSV/JSONL-файла потоком / convert a CSV/JSONL file")
+    bulk.add_argument("input", help="входной файл или '-' для stdin")
+    bulk.add_argument("output", help="выходной файл или '-' для stdout")
+    bulk.add_argument("--format", choices=("csv", "jsonl"), help="по умолчанию — по расширению входного файла")
+    bulk.add_argument("--base-col", default="base")
+    bulk.add_argument("--quote-col", default="quote")
+    bulk.add_argument("--amount-col", default="amount")
+    bulk.add_argument("--to", dest="quote", help="одна валюта назначения для всех строк")
+    bulk.add_argument("--chunk-size", type=int, default=10000)
+
+    ecb = sub.add_parser("import-ecb", parents=[db_opt],
+                         help="загрузить историю курсов ЕЦБ / import ECB rate history")
+    ecb.add_argument("source", nargs="?", default="full",
+                     help='"full" (с 1999 года), "90d", URL или файл .xml/.csv/.zip (по умолчанию full)')
+    ecb.add_argument("--batch-days", type=int, default=1000, help="дней на транзакцию")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "bulk":
+        return run_bulk(args)
+    if args.command == "import-ecb":
+        return run_import_ecb(args)
+    if args.command == "daemon":
+        return run_daemon(args)
+    if args.pair:
+        return run_once(args)
+    interactive()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
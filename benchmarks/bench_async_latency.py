@@ -0,0 +1,101 @@
+"""Нагрузочный замер: p99 задержки aconvert до и во время фонового обновления курсов.
+
+Провайдеры заменяются заглушкой, которая «висит» refresh_delay секунд, поэтому
+замер воспроизводим без сети. Запуск:
+
+    python benchmarks/bench_async_latency.py --requests 5000 --concurrency 64
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import converter.core as coremod  # noqa: E402
+from converter.core import ConverterCore, RateSnapshot  # noqa: E402
+
+RATES = {"USD": Decimal("1"), "EUR": Decimal("0.92"), "RUB": Decimal("91.5"), "BTC": Decimal("0.000016")}
+PAIRS = [("USD", "EUR"), ("RUB", "BTC"), ("EUR", "RUB"), ("BTC", "USD")]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+async def run_load(core: ConverterCore, requests: int, concurrency: int) -> list:
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        a, b = PAIRS[i % len(PAIRS)]
+        async with sem:
+            t0 = time.perf_counter()
+            await core.aconvert(a, b, Decimal("100"))
+            latencies.append(time.perf_counter() - t0)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+def report(name: str, latencies: list) -> float:
+    p99 = percentile(latencies, 99) * 1e3
+    print(f"{name:<22} n={len(latencies):<6} p50={percentile(latencies, 50) * 1e3:.3f}ms "
+          f"p99={p99:.3f}ms mean={statistics.mean(latencies) * 1e3:.3f}ms")
+    return p99
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--refresh-delay", type=float, default=2.0)
+    ap.add_argument("--max-ratio", type=float, default=3.0,
+                    help="допустимый рост p99 во время обновления (с поправкой на 1 мс шума)")
+    args = ap.parse_args()
+
+    coremod.fetch_usd_rates = lambda: (RATES, "stub")
+    with tempfile.TemporaryDirectory() as tmp:
+        core = ConverterCore(db_path=Path(tmp) / "rates.sqlite3")
+        try:
+            baseline = report("idle", asyncio.run(run_load(core, args.requests, args.concurrency)))
+
+            def slow_fetch():
+                time.sleep(args.refresh_delay)
+                return RATES, "stub-refreshed"
+
+            coremod.fetch_usd_rates = slow_fetch
+            snap = core.snapshot
+            core._snapshot = RateSnapshot(snap.base, snap.rates, snap.fetched_at - core.auto_update_age - timedelta(seconds=1),
+                                          snap.source, snap.version)
+
+            async def during_refresh():
+                core.refresh_in_background()
+                return await run_load(core, args.requests, args.concurrency)
+
+            latencies = asyncio.run(during_refresh())
+            in_flight = core._refresh_flight.in_flight
+            during = report("during refresh", latencies)
+            print(f"refresh still in flight after load: {in_flight}")
+        finally:
+            core.close()
+
+    if during > baseline * args.max_ratio + 1.0:
+        print("FAIL: p99 grew while a refresh was in flight")
+        return 1
+    print("OK: p99 stays flat while a refresh is in flight")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
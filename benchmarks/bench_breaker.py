@@ -0,0 +1,83 @@
+"""Обновление курсов, когда основной провайдер завис: с автоматом и без него.
+
+Основной фиатный провайдер отвечает только по таймауту (как недоступный ЕЦБ), резервный —
+сразу. Подряд выполняются --refreshes обновлений fetch_usd_rates; печатается время каждого.
+Без автомата каждое обновление ждёт hedge_delay, прежде чем спросить резервный провайдер;
+с автоматом после нескольких таймаутов основной пропускается и обновление идёт сразу
+к резервному. Запуск:
+
+    python benchmarks/bench_breaker.py --refreshes 20 --deadline 2 --hedge-delay 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import converter.core as coremod  # noqa: E402
+from converter.providers import CircuitBreaker, ProviderRegistry, StubProvider  # noqa: E402
+
+FIAT = {"USD": Decimal("1"), "EUR": Decimal("0.9")}
+
+
+class HangingProvider(StubProvider):
+    def __init__(self, stop: threading.Event, **kwargs) -> None:
+        super().__init__({}, **kwargs)
+        self.stop = stop
+
+    def fetch(self, timeout=10.0, symbols=None):
+        self.calls += 1
+        self.stop.wait(timeout)
+        raise TimeoutError(f"{self.name}: timed out")
+
+
+def run(args, breaker: bool, stop: threading.Event) -> list:
+    primary = HangingProvider(stop, name="ECB", kind="fiat")
+    if not breaker:
+        primary.breaker = CircuitBreaker(failure_threshold=10 ** 9)
+    registry = ProviderRegistry()
+    registry.register(primary)
+    registry.register(StubProvider(FIAT, name="Frankfurter(ECB)", kind="fiat"))
+    times = []
+    for _ in range(args.refreshes):
+        t0 = time.perf_counter()
+        coremod.fetch_usd_rates(deadline=args.deadline, hedge_delay=args.hedge_delay, registry=registry)
+        times.append(time.perf_counter() - t0)
+        time.sleep(args.interval)
+    return times
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--refreshes", type=int, default=20)
+    ap.add_argument("--deadline", type=float, default=2.0, help="общий дедлайн = таймаут зависшего провайдера")
+    ap.add_argument("--hedge-delay", type=float, default=0.5)
+    ap.add_argument("--interval", type=float, default=0.1, help="пауза между обновлениями")
+    args = ap.parse_args()
+
+    stop = threading.Event()
+    results = {}
+    try:
+        for breaker in (False, True):
+            times = run(args, breaker, stop)
+            mode = "breaker" if breaker else "no breaker"
+            results[mode] = times
+            print(f"{mode:<11} total={sum(times):6.2f}s last5 avg={sum(times[-5:]) / 5 * 1e3:7.1f}ms  "
+                  + " ".join(f"{t * 1e3:.0f}" for t in times))
+    finally:
+        stop.set()
+
+    if sum(results["breaker"][-5:]) / 5 > args.hedge_delay / 2:
+        print("FAIL: зависший провайдер не пропускается")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""Холодный старт: время от запуска интерпретатора до готового к запросам ConverterCore.
+
+Каждый замер — отдельный процесс (импорт модулей + создание ядра на пустой БД
+с fetch_on_init=False), поэтому кэш импортов не искажает результат. Запуск:
+
+    python benchmarks/bench_cold_start.py --runs 10 --target-ms 150
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHILD = """
+import sys, time
+t0 = time.perf_counter()
+from converter.core import ConverterCore
+core = ConverterCore(db_path=sys.argv[1], fetch_on_init=False)
+t1 = time.perf_counter()
+core.close()
+print((t1 - t0) * 1e3)
+"""
+
+
+def one_run(db_path: Path) -> float:
+    out = subprocess.run([sys.executable, "-c", CHILD, str(db_path)], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--target-ms", type=float, default=150.0,
+                    help="допустимая медиана импорта и создания ядра, мс")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        one_run(Path(tmp) / "warmup.sqlite3")  # компиляция .pyc не должна попасть в замер
+        times = [one_run(Path(tmp) / f"rates{i}.sqlite3") for i in range(args.runs)]
+
+    median = statistics.median(times)
+    print(f"cold start n={len(times)} median={median:.1f}ms min={min(times):.1f}ms max={max(times):.1f}ms")
+    if median > args.target_ms:
+        print(f"FAIL: median cold start exceeds {args.target_ms:.0f}ms")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Импорт истории ЕЦБ: время и пиковая память на синтетическом архиве размером с полный.
+
+Генерирует eurofxref-hist.zip (CSV, --days дней по --currencies валют, как у ЕЦБ с 1999 года),
+затем импортирует его в пустую БД через ConverterCore.import_ecb_history и печатает
+время и пик памяти Python (tracemalloc, отдельным прогоном — он замедляет разбор). Запуск:
+
+    python benchmarks/bench_ecb_import.py --days 6500 --max-seconds 15
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from converter.core import ConverterCore  # noqa: E402
+from converter.providers import ProviderRegistry, StubProvider  # noqa: E402
+
+
+def make_archive(path: Path, days: int, currencies: int) -> None:
+    codes = ["USD"] + [f"X{i:02d}" for i in range(currencies - 1)]
+    rnd = random.Random(1)
+    buf = io.StringIO()
+    buf.write("Date, " + ", ".join(codes) + ", \n")
+    start = date(2025, 1, 1)
+    for i in range(days):
+        rates = ", ".join(f"{rnd.uniform(0.5, 200):.4f}" if rnd.random() > 0.05 else "N/A" for _ in codes[1:])
+        buf.write(f"{start - timedelta(days=i)}, {rnd.uniform(0.8, 1.6):.4f}, {rates}, \n")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("eurofxref-hist.csv", buf.getvalue())
+
+
+def run(tmp: Path, archive: Path, name: str) -> tuple:
+    registry = ProviderRegistry()
+    registry.register(StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.9")}))
+    core = ConverterCore(db_path=tmp / f"{name}.sqlite3", registry=registry)
+    try:
+        started = time.perf_counter()
+        days, rows = core.import_ecb_history(archive)
+        return days, rows, time.perf_counter() - started
+    finally:
+        core.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=6500)
+    ap.add_argument("--currencies", type=int, default=42)
+    ap.add_argument("--max-seconds", type=float, default=15.0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        archive = tmp / "eurofxref-hist.zip"
+        make_archive(archive, args.days, args.currencies)
+        days, rows, elapsed = run(tmp, archive, "timed")
+
+        tracemalloc.start()
+        run(tmp, archive, "traced")
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f"days={days} rows={rows} time={elapsed:.2f}s rows/s={rows / elapsed:,.0f} peak_mem={peak / 2**20:.1f}MiB")
+    if elapsed > args.max_seconds:
+        print(f"FAIL: import took longer than {args.max_seconds}s")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
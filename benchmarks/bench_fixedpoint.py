@@ -0,0 +1,88 @@
+"""Целочисленная арифметика с фиксированной точкой против Decimal на горячем пути конвертации.
+
+Сравнивается строка пакетной конвертации: сумма с копейками из текста * кросс-курс,
+округление ROUND_HALF_UP до сотых, результат в текст — в Decimal (как в BulkConverter)
+и на целых числах Python (мантисса курса из FixedRates). Отдельно — только арифметика,
+без разбора и форматирования. Результаты путей сверяются. Запуск:
+
+    python benchmarks/bench_fixedpoint.py --rows 200000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from converter.fixedpoint import FixedRates  # noqa: E402
+
+CENT = Decimal("0.01")
+
+
+def decimal_path(amounts, rate):
+    return [str((Decimal(a) * rate).quantize(CENT, rounding=ROUND_HALF_UP)) for a in amounts]
+
+
+def decimal_math(amounts, rate):
+    return [(a * rate).quantize(CENT, rounding=ROUND_HALF_UP) for a in amounts]
+
+
+def integer_path(amounts, mantissa, exponent):
+    cents = [int(a.replace(".", "")) for a in amounts]
+    return [f"{q // 100}.{q % 100:02d}" for q in integer_math(cents, mantissa, exponent)]
+
+
+def integer_math(amounts, mantissa, exponent):
+    # Суммы вида "123.45": сотые * мантисса, затем округление половины вверх до сотых.
+    # Произведение длиннее 28 цифр Decimal округлил бы дважды; на этих данных такого
+    # пограничного случая нет, поэтому результаты совпадают (сверяется ниже).
+    div = 10 ** -exponent
+    half = div // 2
+    out = []
+    for a in amounts:
+        q, r = divmod(a * mantissa, div)
+        out.append(q + 1 if r >= half else q)
+    return out
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200000)
+    args = ap.parse_args()
+
+    rnd = random.Random(5)
+    amounts = [f"{rnd.randint(0, 10 ** 7)}.{rnd.randint(0, 99):02d}" for _ in range(args.rows)]
+    rate = Decimal("91.37") / Decimal("0.9131")
+    mantissa, exponent = FixedRates({"X": rate}).fixed("X")
+
+    dec_amounts = [Decimal(a) for a in amounts]
+    cents = [int(a.replace(".", "")) for a in amounts]
+
+    rows = (
+        ("row: decimal", decimal_path, (amounts, rate)),
+        ("row: integer", integer_path, (amounts, mantissa, exponent)),
+        ("math: decimal", decimal_math, (dec_amounts, rate)),
+        ("math: integer", integer_math, (cents, mantissa, exponent)),
+    )
+    results = {}
+    for name, fn, fn_args in rows:
+        results[name], elapsed = timed(fn, *fn_args)
+        print(f"{name:<14} {elapsed / args.rows * 1e9:7.1f} ns/row")
+
+    mismatches = sum(1 for d, i in zip(results["row: decimal"], results["row: integer"]) if d != i)
+    print(f"mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Конкурентное чтение из SQLite во время записи: WAL + соединение на поток против одного соединения под замком.
+
+Читатели в нескольких потоках выполняют исторический запрос (rates_as_of) и загрузку текущих
+курсов, а пишущий поток раз за разом сохраняет крупное обновление (--symbols курсов) одной
+транзакцией. Для каждой схемы печатаются p50/p99/max задержки чтения. Запуск:
+
+    python benchmarks/bench_storage_concurrency.py --readers 8 --seconds 3
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from converter.history import append_history, rates_as_of  # noqa: E402
+from converter.storage import Storage, init_db, load_rates, upsert_rates  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class LockedStorage:
+    """Прежняя схема: одно соединение в журнале по умолчанию, все операции под общим замком."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        init_db(self.conn)
+
+    def load_rates(self, base):
+        with self.lock:
+            return load_rates(self.conn, base)
+
+    def rates_as_of(self, base, symbols, at):
+        with self.lock:
+            return rates_as_of(self.conn, base, symbols, at)
+
+    def save_refresh(self, base, rates, source, fetched_at):
+        with self.lock:
+            append_history(self.conn, base, rates, source=source, fetched_at=fetched_at)
+            upsert_rates(self.conn, base, rates, source=source, fetched_at=fetched_at)
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def run(storage, readers: int, seconds: float, symbols: int) -> tuple:
+    rates = {f"S{i:04d}": Decimal(i + 1) / Decimal(7) for i in range(symbols)}
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    storage.save_refresh("USD", rates, "seed", t0)
+    stop = threading.Event()
+    latencies, writes = [], [0]
+    lat_lock = threading.Lock()
+
+    def reader(i: int) -> None:
+        local = []
+        sym = [f"S{i:04d}", f"S{(i * 7) % symbols:04d}"]
+        while not stop.is_set():
+            start = time.perf_counter()
+            storage.rates_as_of("USD", sym, t0 + timedelta(days=1))
+            if i == 0:
+                storage.load_rates("USD")
+            local.append(time.perf_counter() - start)
+        with lat_lock:
+            latencies.extend(local)
+
+    def writer() -> None:
+        n = 0
+        while not stop.is_set():
+            n += 1
+            storage.save_refresh("USD", rates, f"w{n}", t0 + timedelta(seconds=n))
+        writes[0] = n
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return latencies, writes[0]
+
+
+def report(name: str, latencies: list, writes: int) -> float:
+    p99 = percentile(latencies, 99) * 1e3
+    print(f"{name:<18} reads={len(latencies):<7} writes={writes:<5} p50={percentile(latencies, 50) * 1e3:.3f}ms "
+          f"p99={p99:.3f}ms max={max(latencies) * 1e3:.3f}ms")
+    return p99
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--symbols", type=int, default=2000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, factory in (("locked", LockedStorage), ("wal+per-thread", Storage)):
+            storage = factory(Path(tmp) / f"{name}.sqlite3")
+            try:
+                results[name] = report(name, *run(storage, args.readers, args.seconds, args.symbols))
+            finally:
+                storage.close()
+
+    if results["wal+per-thread"] > results["locked"]:
+        print("FAIL: readers still wait on the writer")
+        return 1
+    print("OK: readers do not wait on the writer")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
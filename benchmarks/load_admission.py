@@ -0,0 +1,180 @@
+"""Нагрузка на сервер при всплеске: с контролем допуска и без него.
+
+Много клиентов одновременно шлют /convert: большая часть — из снимка (дёшево), остальные —
+исторические (at=), которые идут через пул потоков; их I/O искусственно замедлен на --io-ms,
+как при медленном диске или провайдере. Один «шумный» клиент шлёт запросы без пауз
+в --noisy-streams параллельных потоков с одного адреса.
+Для каждого режима печатаются коды ответов и p50/p99 задержек по классам запросов.
+
+По умолчанию сервер поднимается в этом процессе (httpx + ASGI, без сети, курсы — заглушки).
+С --url нагрузка идёт на запущенный сервер (uvicorn server:app …), режим там задаётся его
+переменными окружения. Запуск:
+
+    python benchmarks/load_admission.py --clients 200 --seconds 3
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+PAIRS = ["usd-eur", "eur-rub", "rub-usd", "btc-usd", "eth-eur", "gbp-jpy"]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else 0.0
+
+
+async def run_load(client, clients: int, seconds: float, expensive_share: float, noisy_streams: int):
+    stats = defaultdict(lambda: {"codes": Counter(), "ok": [], "rejected": []})
+    deadline = time.perf_counter() + seconds
+
+    async def worker(n: int, noisy: bool):
+        rnd = random.Random(n)
+        headers = {"X-Forwarded-For": "10.255.0.1" if noisy else f"10.0.{n // 256}.{n % 256}"}
+        while time.perf_counter() < deadline:
+            kind = "noisy" if noisy else "expensive" if rnd.random() < expensive_share else "cheap"
+            url = f"/convert?pair={rnd.choice(PAIRS)}&amount=100"
+            if kind == "expensive":
+                url += "&at=2025-01-01T12:00:00%2B00:00"
+            t0 = time.perf_counter()
+            resp = await client.get(url, headers=headers)
+            elapsed = time.perf_counter() - t0
+            entry = stats[kind]
+            entry["codes"][resp.status_code] += 1
+            if resp.status_code == 200:
+                entry["ok"].append(elapsed)
+            elif resp.status_code in (429, 503):
+                entry["rejected"].append(elapsed)
+            # Шумный клиент не делает пауз, но отдаёт управление (в этом процессе запрос из снимка
+            # выполняется без единого переключения и иначе занял бы event loop целиком)
+            await asyncio.sleep(0 if noisy else rnd.uniform(0.0, 0.05))
+
+    await asyncio.gather(*(worker(n, noisy=False) for n in range(clients)),
+                         *(worker(clients + n, noisy=True) for n in range(noisy_streams)))
+    return stats
+
+
+def report(mode: str, stats) -> dict:
+    print(f"--- {mode}")
+    summary = {}
+    for kind in ("cheap", "expensive", "noisy"):
+        entry = stats.get(kind)
+        if entry is None:
+            continue
+        ok, rejected = entry["ok"], entry["rejected"]
+        codes = " ".join(f"{code}={count}" for code, count in sorted(entry["codes"].items()))
+        print(f"{kind:<10} {codes:<28} ok p50={percentile(ok, 50) * 1e3:7.1f}ms p99={percentile(ok, 99) * 1e3:7.1f}ms"
+              f"  rejected p99={percentile(rejected, 99) * 1e3:7.1f}ms")
+        summary[kind] = {"ok_p99": percentile(ok, 99), "rejected_p99": percentile(rejected, 99),
+                         "codes": entry["codes"]}
+    return summary
+
+
+def in_process(args) -> int:
+    import httpx
+
+    os.chdir(tempfile.mkdtemp())
+    os.environ["CONVERTER_DYNAMIC_ASSETS"] = "0"
+    os.environ["CONVERTER_TRUST_PROXY"] = "1"
+
+    import converter.core as coremod
+    from converter.admission import ClientRateLimiter, IoLimiter
+    from converter.providers import ProviderRegistry, StubProvider
+
+    registry = ProviderRegistry()
+    registry.register(StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.9"), "RUB": Decimal("90"),
+                                    "GBP": Decimal("0.8"), "JPY": Decimal("150")}))
+    registry.register(StubProvider({"BTC": Decimal("0.00002"), "ETH": Decimal("0.0004")}, name="stub-crypto",
+                                   kind="crypto"))
+    original_fetch = coremod.fetch_usd_rates
+    coremod.fetch_usd_rates = lambda: original_fetch(registry=registry)
+
+    import server
+
+    server.core.update_rates(force=True)
+    # История на 2025-01-01 для запросов с at=
+    server.core.storage.import_history("USD", [(datetime(2025, 1, 1, tzinfo=timezone.utc),
+                                                 server.core.snapshot.rates)], "bench")
+    rates_as_of = server.core.storage.rates_as_of
+
+    def slow_rates_as_of(*a, **kw):
+        time.sleep(args.io_ms / 1000)
+        return rates_as_of(*a, **kw)
+
+    server.core.storage.rates_as_of = slow_rates_as_of
+
+    modes = {
+        # «без контроля»: очередь к пулу потоков не ограничена, частота клиентов — тоже
+        "no admission": (None, IoLimiter(10 ** 6, 10 ** 6, 3600.0)),
+        "admission": (ClientRateLimiter(server.RATE_LIMIT, server.RATE_BURST),
+                      IoLimiter(server.IO_CONCURRENCY, server.IO_QUEUE, server.IO_QUEUE_TIMEOUT)),
+    }
+    results = {}
+
+    async def main():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for mode, (client_limiter, io_limiter) in modes.items():
+                server.client_limiter, server.io_limiter = client_limiter, io_limiter
+                stats = await run_load(client, args.clients, args.seconds, args.expensive, args.noisy_streams)
+                results[mode] = report(mode, stats)
+
+    try:
+        asyncio.run(main())
+    finally:
+        server.core.close()
+        coremod.fetch_usd_rates = original_fetch
+
+    base, adm = results["no admission"], results["admission"]
+    failures = []
+    if adm["expensive"]["ok_p99"] > base["expensive"]["ok_p99"]:
+        failures.append("с контролем допуска I/O-запросы не стали быстрее")
+    if adm["expensive"]["rejected_p99"] > server.IO_QUEUE_TIMEOUT + 0.5:
+        failures.append("отказ 503 приходит не сразу")
+    if adm["noisy"]["codes"].get(429, 0) == 0:
+        failures.append("шумный клиент не ограничен")
+    if adm["cheap"]["codes"].get(503, 0):
+        failures.append("запросы из снимка получили 503")
+    for failure in failures:
+        print("FAIL:", failure)
+    if not failures:
+        print("OK: задержка ограничена, лишние запросы отклоняются сразу, запросы из снимка проходят")
+    return 1 if failures else 0
+
+
+def remote(args) -> int:
+    import httpx
+
+    async def main():
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            report(args.url, await run_load(client, args.clients, args.seconds, args.expensive, args.noisy_streams))
+
+    asyncio.run(main())
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--expensive", type=float, default=0.2, help="доля исторических (I/O) запросов")
+    ap.add_argument("--noisy-streams", type=int, default=10)
+    ap.add_argument("--io-ms", type=float, default=50.0, help="искусственная задержка I/O (в этом процессе)")
+    ap.add_argument("--url", help="адрес запущенного сервера вместо сервера в этом процессе")
+    args = ap.parse_args()
+    return remote(args) if args.url else in_process(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""Набор бенчмарков ядра и сервера на заглушках провайдеров (без сети).
+
+Каждый замер печатает ops/s и перцентили задержки одной операции. Результаты можно
+сохранить как базовую линию и сравнивать с ней последующие прогоны: при падении ops/s
+больше чем на --threshold или росте p99 больше чем на --p99-threshold скрипт завершается
+с кодом 1. Запуск:
+
+    python benchmarks/suite.py --save-baseline          # записать benchmarks/baseline.json
+    python benchmarks/suite.py                          # сравнить с базовой линией
+    python benchmarks/suite.py --only convert_hot,bulk_csv --quick
+
+Базовая линия зависит от машины — её записывают и сравнивают на одном и том же железе.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from converter.bulk import convert_csv  # noqa: E402
+from converter.core import ConverterCore, _resolver, logger, parse_pair  # noqa: E402
+from converter.providers import ProviderRegistry, StubProvider  # noqa: E402
+from converter.storage import Storage  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+FIAT = {"USD": "1", "EUR": "0.9137", "RUB": "91.37", "GBP": "0.7871", "JPY": "149.52", "CNY": "7.2981",
+        "CHF": "0.8842", "KZT": "478.11", "TRY": "32.18", "INR": "83.37", "BRL": "5.0412", "AED": "3.6725"}
+CRYPTO = {"BTC": "0.0000161", "ETH": "0.000312", "USDT": "1.0003", "SOL": "0.0071"}
+PAIRS = ["RUB - USD", "рубль в доллар", "btc/eur", "евро → йена", "USD EUR", "dollar to ruble",
+         "биткоин - рубль", "gbp-chf", "эфир в доллары", "юань в тенге"]
+
+
+def stub_registry() -> ProviderRegistry:
+    registry = ProviderRegistry()
+    registry.register(StubProvider({k: Decimal(v) for k, v in FIAT.items()}, name="stub-fiat", kind="fiat"))
+    registry.register(StubProvider({k: Decimal(v) for k, v in CRYPTO.items()}, name="stub-crypto", kind="crypto"))
+    return registry
+
+
+@dataclass
+class Result:
+    name: str
+    ops: int
+    seconds: float
+    latencies: List[float]
+
+    @property
+    def ops_per_sec(self) -> float:
+        return self.ops / self.seconds if self.seconds else 0.0
+
+    def percentile(self, q: float) -> float:
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"ops_per_sec": round(self.ops_per_sec, 1),
+                "p50_us": round(self.percentile(50) * 1e6, 2),
+                "p99_us": round(self.percentile(99) * 1e6, 2)}
+
+
+def measure(name: str, fn: Callable[[int], object], n: int, batch: int = 1) -> Result:
+    """n вызовов fn(i); каждый вызов — batch операций (задержка делится на batch)."""
+    clock = time.perf_counter
+    latencies = []
+    start = clock()
+    for i in range(n):
+        t0 = clock()
+        fn(i)
+        latencies.append((clock() - t0) / batch)
+    return Result(name, n * batch, clock() - start, latencies)
+
+
+# ------------------------- замеры -------------------------
+
+CASES: Dict[str, Callable[["Bench"], Result]] = {}
+
+
+def case(fn: Callable[["Bench"], Result]) -> Callable[["Bench"], Result]:
+    CASES[fn.__name__] = fn
+    return fn
+
+
+class Bench:
+    def __init__(self, tmp: Path, scale: float) -> None:
+        self.tmp = tmp
+        self.scale = scale
+        self._core: Optional[ConverterCore] = None
+
+    def n(self, count: int) -> int:
+        return max(10, int(count * self.scale))
+
+    def db(self, name: str) -> Path:
+        return self.tmp / f"{name}.sqlite3"
+
+    @property
+    def core(self) -> ConverterCore:
+        if self._core is None:
+            self._core = ConverterCore(db_path=self.db("core"), registry=stub_registry())
+        return self._core
+
+    def close(self) -> None:
+        if self._core is not None:
+            self._core.close()
+
+
+@case
+def parse_pair_cached(b: Bench) -> Result:
+    return measure("parse_pair_cached", lambda i: parse_pair(PAIRS[i % len(PAIRS)]), b.n(200000))
+
+
+@case
+def normalize_code_uncached(b: Bench) -> Result:
+    words = ["рубль", "доллары", "eur", "биткоин", "юань", "bitcoinn", "етериум", "franc"]
+    normalize = _resolver._normalize  # мимо LRU-кэша: разбор и поиск в trie каждый раз
+    return measure("normalize_code_uncached", lambda i: normalize(words[i % len(words)]), b.n(50000))
+
+
+@case
+def convert_hot(b: Bench) -> Result:
+    core = b.core
+    codes = list(FIAT) + list(CRYPTO)
+    amount = Decimal("1234.56")
+    return measure("convert_hot",
+                   lambda i: core.convert(codes[i % len(codes)], codes[(i * 7 + 3) % len(codes)], amount),
+                   b.n(100000))
+
+
+@case
+def convert_cold(b: Bench) -> Result:
+    # Холодный путь: новый процесс с тёплой БД — создание ядра, снимка и матрицы, затем конвертация
+    b.core  # БД с курсами
+    db = b.db("core")
+
+    def one(_):
+        core = ConverterCore(db_path=db, registry=stub_registry())
+        core.convert("RUB", "BTC", Decimal("100"))
+        core.close()
+
+    return measure("convert_cold", one, b.n(200))
+
+
+@case
+def refresh(b: Bench) -> Result:
+    core = b.core
+    return measure("refresh", lambda i: core.update_rates(force=True), b.n(300))
+
+
+@case
+def convert_contention(b: Bench) -> Result:
+    core = b.core
+    codes = list(FIAT) + list(CRYPTO)
+    threads, per_thread = 8, b.n(20000)
+    latencies: List[float] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed: int) -> None:
+        clock = time.perf_counter
+        local = []
+        amount = Decimal("99.99")
+        barrier.wait()
+        for i in range(per_thread):
+            t0 = clock()
+            core.convert(codes[(i + seed) % len(codes)], codes[(i * 5 + seed) % len(codes)], amount)
+            local.append(clock() - t0)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(s,)) for s in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    # Одновременно с чтениями идут обновления курсов
+    for _ in range(5):
+        core.update_rates(force=True)
+    for t in pool:
+        t.join()
+    return Result("convert_contention", threads * per_thread, time.perf_counter() - start, latencies)
+
+
+@case
+def bulk_csv(b: Bench) -> Result:
+    core = b.core
+    rnd = random.Random(3)
+    codes = ["usd", "EUR", "рубль", "btc", "GBP", "юань"]
+    rows = b.n(50000)
+    lines = ["base,quote,amount"]
+    for _ in range(rows):
+        lines.append(f"{rnd.choice(codes)},{rnd.choice(codes)},{rnd.randint(0, 10 ** 6)}.{rnd.randint(0, 99):02d}")
+    text = "\n".join(lines) + "\n"
+
+    def one(_):
+        convert_csv(core, io.StringIO(text), io.StringIO())
+
+    return measure("bulk_csv", one, 3, batch=rows)
+
+
+@case
+def storage_upsert(b: Bench) -> Result:
+    storage = Storage(b.db("upsert"))
+    rates = {f"S{i:03d}": Decimal(i + 1) / Decimal(7) for i in range(200)}
+    now = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())
+
+    def one(i):
+        # Как у реальных обновлений: меняется малая часть курсов (10 из 200), остальные те же
+        for k in range(10):
+            rates[f"S{(i * 10 + k) % 200:03d}"] += Decimal("0.0001")
+        storage.save_refresh("USD", rates, "bench", datetime.fromtimestamp(now + i, tz=timezone.utc))
+
+    try:
+        return measure("storage_upsert", one, b.n(300))
+    finally:
+        storage.close()
+
+
+@case
+def server_convert(b: Bench) -> Result:
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        return Result("server_convert", 0, 0.0, [0.0])
+
+    import converter.core as coremod
+
+    cwd = os.getcwd()
+    os.chdir(b.tmp)
+    os.environ["CONVERTER_DYNAMIC_ASSETS"] = "0"  # без фоновых запросов к CoinGecko
+    os.environ["CONVERTER_RATE_LIMIT"] = "0"  # один клиент шлёт тысячи запросов подряд
+    original_fetch = coremod.fetch_usd_rates
+    registry = stub_registry()
+    coremod.fetch_usd_rates = lambda: original_fetch(registry=registry)
+    try:
+        import server
+
+        with TestClient(server.app) as client:
+            server.core.update_rates(force=True)
+            urls = [f"/convert?pair={p}&amount=100" for p in PAIRS]
+            return measure("server_convert", lambda i: client.get(urls[i % len(urls)]), b.n(3000))
+    finally:
+        coremod.fetch_usd_rates = original_fetch
+        os.chdir(cwd)
+
+
+# ------------------------- сравнение -------------------------
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float, p99_threshold: float) -> List[str]:
+    failures = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not cur["ops_per_sec"]:
+            continue
+        if cur["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            failures.append(f"{name}: ops/s {cur['ops_per_sec']:.0f} < {base['ops_per_sec']:.0f}")
+        if cur["p99_us"] > base["p99_us"] * (1 + p99_threshold):
+            failures.append(f"{name}: p99 {cur['p99_us']:.1f}us > {base['p99_us']:.1f}us")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Бенчмарки конвертера на заглушках провайдеров")
+    ap.add_argument("--only", default="", help="замеры через запятую: " + ", ".join(CASES))
+    ap.add_argument("--quick", action="store_true", help="в 10 раз меньше итераций")
+    ap.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.25, help="допустимое падение ops/s (доля)")
+    ap.add_argument("--p99-threshold", type=float, default=1.0,
+                    help="допустимый рост p99 (доля; хвост на микросекундах шумнее пропускной способности)")
+    ap.add_argument("--json", type=Path, help="записать результаты прогона в файл")
+    args = ap.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        ap.error(f"неизвестные замеры: {', '.join(unknown)}")
+
+    logger.setLevel(logging.WARNING)  # сотни обновлений курсов не должны засорять вывод
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bench = Bench(Path(tmp), 0.1 if args.quick else 1.0)
+        try:
+            for name in names:
+                res = CASES[name](bench)
+                if not res.ops:
+                    print(f"{name:<26} пропущен (нет зависимостей)")
+                    continue
+                results[name] = res.as_dict()
+                print(f"{name:<26} {res.ops_per_sec:>12,.0f} ops/s   p50={res.percentile(50) * 1e6:9.1f}us   "
+                      f"p99={res.percentile(99) * 1e6:9.1f}us")
+        finally:
+            bench.close()
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text("utf-8")) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True), encoding="utf-8")
+        print(f"Базовая линия сохранена: {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print("Базовой линии нет — сравнение пропущено (запустите с --save-baseline)")
+        return 0
+
+    failures = compare(results, json.loads(args.baseline.read_text("utf-8")), args.threshold, args.p99_threshold)
+    for line in failures:
+        print("REGRESSION", line)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
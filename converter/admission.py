@@ -0,0 +1,143 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Tuple
+
+from .metrics import REGISTRY
+
+# Контроль допуска для сервера. Конвертация из снимка стоит микросекунды и выполняется прямо
+# в event loop, поэтому её ограничивает только частота запросов клиента. Работа с I/O (догрузка
+# курсов у провайдеров, история, пакеты) идёт в пуле потоков: её ограничивает IoLimiter —
+# не больше limit задач сразу и не больше max_queue ожидающих, остальные сразу получают 503,
+# а не копятся в очереди, увеличивая задержку для всех.
+
+# Приоритеты I/O-задач: меньше — раньше
+PRIORITY_INTERACTIVE = 0  # одиночная конвертация
+PRIORITY_BULK = 1         # пакет /convert/batch
+
+ADMISSION_TOTAL = REGISTRY.counter("converter_admission_total", "Решения контроля допуска", ["result"])
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("converter_admission_wait_seconds", "Ожидание слота для I/O-задачи")
+
+
+class Rejected(Exception):
+    """Запрос отклонён без выполнения: status — HTTP-код (429/503), retry_after — через сколько секунд повторить."""
+
+    def __init__(self, status: int, message: str, retry_after: float = 1.0) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class ClientRateLimiter:
+    """Token bucket на каждого клиента: rate запросов в секунду с всплеском до burst.
+
+    Хранит не больше max_clients корзин (LRU): давно не приходившие клиенты забываются —
+    их корзина всё равно была бы полной.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # клиент -> (токены, момент)
+        self._lock = threading.Lock()
+
+    def check(self, client: str) -> None:
+        """Списать токен клиента или бросить Rejected(429)."""
+        with self._lock:
+            now = time.monotonic()
+            tokens, at = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - at) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[client] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            ADMISSION_TOTAL.inc(result="rate_limited")
+            raise Rejected(429, "Слишком много запросов", (1 - tokens) / self.rate)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class IoLimiter:
+    """Ограничение одновременных I/O-задач с ограниченной очередью и приоритетами.
+
+    Используется из одного event loop. Освободившийся слот передаётся ожидающему с наименьшим
+    приоритетом (при равных — первому пришедшему), так что одиночные конвертации обгоняют пакеты.
+    """
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float) -> None:
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        if len(self._waiters) > 2 * self.max_queue:
+            # Ушедшие из очереди удаляются лениво; не даём им накапливаться
+            self._waiters = [w for w in self._waiters if not w[2].done()]
+            heapq.heapify(self._waiters)
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            ADMISSION_TOTAL.inc(result="admitted")
+            return
+        if self.waiting >= self.max_queue:
+            ADMISSION_TOTAL.inc(result="queue_full")
+            raise Rejected(503, "Сервер перегружен, повторите запрос позже")
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not fut.done():
+                fut.cancel()
+                ADMISSION_TOTAL.inc(result="queue_timeout")
+                raise Rejected(503, "Сервер перегружен, повторите запрос позже") from None
+            # слот передан одновременно с истечением ожидания — пользуемся им
+        except BaseException:
+            # Запрос отменён (клиент ушёл): если слот уже передан — вернуть его следующему
+            if fut.done() and not fut.cancelled():
+                self._release()
+            else:
+                fut.cancel()
+            raise
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - t0)
+        ADMISSION_TOTAL.inc(result="admitted")
+
+    def _release(self) -> None:
+        # Слот не освобождается, а переходит к следующему ожидающему (active не меняется)
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def state(self) -> Dict[Tuple[str, ...], float]:
+        return {("active",): self.active, ("waiting",): self.waiting}
@@ -0,0 +1,261 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from .providers import HttpClient
+
+logger = logging.getLogger(__name__)
+
+COIN_LIST_URL = "https://api.coingecko.com/api/v3/coins/list"
+# Справочник монет меняется медленно: перечитываем его раз в неделю
+COIN_LIST_TTL = 7 * 24 * 3600.0
+COIN_LIST_RETRY = 300.0
+COIN_LIST_FILE = "coingecko-assets.json"
+# Места монет по капитализации — чтобы выбрать между монетами с одним тикером
+COIN_MARKETS_URL = ("https://api.coingecko.com/api/v3/coins/markets"
+                    "?vs_currency=usd&order=market_cap_desc&per_page=250&page={page}")
+COIN_RANK_PAGES = 4
+
+# Спрос: монета, которую запрашивали последние HOT_WINDOW секунд, — «горячая» и обновляется
+# раз в HOT_TTL; запрошенная раньше, но не позже COLD_WINDOW — «холодная», раз в COLD_TTL;
+# остальные не обновляются вовсе, пока их снова не запросят.
+HOT_WINDOW = 900.0
+COLD_WINDOW = 24 * 3600.0
+HOT_TTL = 60.0
+COLD_TTL = 3600.0
+
+# Коды валют ISO 4217 (и драгметаллов): тикер монеты, совпадающий с одним из них, в справочник
+# не попадает — иначе, например, грузинский лари (GEL) считался бы токеном Gelato
+FIAT_CODES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BRL BSD BTN BWP
+    BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD FKP GBP
+    GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR
+    KMF KPW KRW KWD KYD KZT LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK
+    MXN MYR MZN NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF SAR
+    SBD SCR SDG SEK SGD SHP SLE SLL SOS SRD SSP STN SVC SYP SZL THB TJS TMT TND TOP TRY TTD TWD
+    TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XAG XAU XCD XDR XOF XPD XPF XPT YER ZAR ZMW ZWL
+""".split())
+
+
+def build_ids(coins: Iterable[Mapping[str, str]], pinned: Mapping[str, str],
+              ranks: Optional[Mapping[str, int]] = None) -> Dict[str, str]:
+    """Записи /coins/list ({"id", "symbol", "name"}) -> символ -> id.
+
+    У одного тикера бывает несколько монет (клоны, мосты, однодневки): закреплённые (pinned)
+    соответствия главнее, в остальных случаях берётся монета с лучшим местом по капитализации
+    (ranks: id -> место). Если ни у одной из монет тикера места нет, тикер неоднозначен
+    и не распознаётся — лучше «неизвестная валюта», чем курс чужого токена. Тикеры,
+    совпадающие с кодами фиатных валют (FIAT_CODES), пропускаются: у такого кода фиатное значение.
+    """
+    ranks = ranks or {}
+    candidates: Dict[str, List[str]] = {}
+    for coin in coins:
+        sym = str(coin.get("symbol") or "").upper()
+        cid = str(coin.get("id") or "")
+        if not sym or not cid or not sym.isalnum() or len(sym) > 8 or sym in FIAT_CODES:
+            continue
+        candidates.setdefault(sym, []).append(cid)
+
+    ids: Dict[str, str] = {}
+    ambiguous = 0
+    for sym, cids in candidates.items():
+        if len(cids) == 1:
+            ids[sym] = cids[0]
+            continue
+        ranked = [(ranks[cid], cid) for cid in cids if cid in ranks]
+        if ranked:
+            ids[sym] = min(ranked)[1]
+        elif sym not in pinned:
+            ambiguous += 1
+    if ambiguous:
+        logger.info("Неоднозначных тикеров без места по капитализации: %d — не распознаются", ambiguous)
+    ids.update(pinned)
+    return ids
+
+
+class AssetUniverse:
+    """Справочник криптоактивов (тикер -> id CoinGecko), спрос на них и свежесть курсов.
+
+    Пока справочник не загружен (load_coin_list), известны только закреплённые монеты.
+    touch() отмечает запрос символа; due() — символы, курс которых пора обновить
+    с учётом спроса; mark_fetched() — отметка о полученном курсе.
+    """
+
+    def __init__(self, pinned: Mapping[str, str], http: Optional[HttpClient] = None,
+                 cache_dir: Optional[Path] = None, hot_window: float = HOT_WINDOW, cold_window: float = COLD_WINDOW,
+                 hot_ttl: float = HOT_TTL, cold_ttl: float = COLD_TTL, list_ttl: float = COIN_LIST_TTL) -> None:
+        self.pinned = dict(pinned)
+        self.http = http
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.hot_window = hot_window
+        self.cold_window = cold_window
+        self.hot_ttl = hot_ttl
+        self.cold_ttl = cold_ttl
+        self.list_ttl = list_ttl
+        # Словари только заменяются целиком, поэтому читаются без блокировки
+        self.ids: Dict[str, str] = dict(self.pinned)
+        self.by_id: Dict[str, str] = {cid: sym for sym, cid in self.ids.items()}
+        self.list_loaded_at: Optional[float] = None  # time.time() загрузки справочника
+        self._list_attempt = float("-inf")
+        self._demand: Dict[str, float] = {}   # символ -> time.monotonic() последнего запроса
+        self._fetched: Dict[str, float] = {}  # символ -> time.monotonic() последнего курса
+        self._lock = threading.Lock()
+
+    # --- справочник ---
+
+    def covers(self, symbol: str) -> bool:
+        return symbol in self.ids
+
+    def load_coins(self, coins: Iterable[Mapping[str, str]], loaded_at: Optional[float] = None,
+                   ranks: Optional[Mapping[str, int]] = None) -> None:
+        self._set_ids(build_ids(coins, self.pinned, ranks), loaded_at)
+
+    def _set_ids(self, ids: Dict[str, str], loaded_at: Optional[float]) -> None:
+        ids.update(self.pinned)
+        self.by_id = {cid: sym for sym, cid in ids.items()}
+        self.ids = ids
+        self.list_loaded_at = time.time() if loaded_at is None else loaded_at
+
+    @property
+    def list_stale(self) -> bool:
+        return self.list_loaded_at is None or time.time() - self.list_loaded_at >= self.list_ttl
+
+    def load_coin_list(self, timeout: float = 10.0) -> bool:
+        """Загрузить справочник: из файла в кэше, а если его нет или он старше list_ttl — с CoinGecko.
+
+        True — если набор монет изменился. Ошибки сети не фатальны: остаётся прежний справочник,
+        следующая попытка — не раньше чем через COIN_LIST_RETRY секунд.
+        """
+        now = time.monotonic()
+        if now - self._list_attempt < COIN_LIST_RETRY:
+            return False
+        self._list_attempt = now
+        before = self.ids
+        if self.list_loaded_at is None:
+            self._load_cached()
+        if self.list_stale and self.http is not None:
+            try:
+                resp = self.http.get(COIN_LIST_URL, timeout=timeout)
+                coins = json.loads(resp.body.decode("utf-8"))
+                self.load_coins(coins, ranks=self._load_ranks(timeout))
+                self._store_cached()
+                logger.info("Справочник CoinGecko загружен: %d тикеров", len(self.ids))
+            except Exception as e:
+                logger.warning("Не удалось загрузить справочник монет CoinGecko: %s", e)
+        return self.ids is not before
+
+    def _load_ranks(self, timeout: float) -> Dict[str, int]:
+        """id -> место по капитализации для первых COIN_RANK_PAGES страниц /coins/markets.
+
+        Ошибка сети не фатальна: с неполными местами часть неоднозначных тикеров не распознается.
+        """
+        ranks: Dict[str, int] = {}
+        for page in range(1, COIN_RANK_PAGES + 1):
+            try:
+                resp = self.http.get(COIN_MARKETS_URL.format(page=page), timeout=timeout)
+                rows = json.loads(resp.body.decode("utf-8"))
+            except Exception as e:
+                logger.warning("Не удалось загрузить капитализацию монет CoinGecko (стр. %d): %s", page, e)
+                break
+            for row in rows:
+                if row.get("id") and isinstance(row.get("market_cap_rank"), int):
+                    ranks[str(row["id"])] = row["market_cap_rank"]
+            if len(rows) < 250:
+                break
+        return ranks
+
+    def _cache_path(self) -> Optional[Path]:
+        return self.cache_dir / COIN_LIST_FILE if self.cache_dir is not None else None
+
+    def _load_cached(self) -> None:
+        path = self._cache_path()
+        if path is None or not path.exists():
+            return
+        try:
+            data = json.loads(path.read_text("utf-8"))
+            ids = {sym: cid for sym, cid in dict(data["ids"]).items() if sym not in FIAT_CODES}
+            self._set_ids(ids, float(data["fetched_at"]))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Кэш справочника монет %s повреждён: %s", path, e)
+
+    def _store_cached(self) -> None:
+        path = self._cache_path()
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"fetched_at": self.list_loaded_at, "ids": self.ids},
+                                      separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить справочник монет %s: %s", path, e)
+
+    # --- спрос и свежесть ---
+
+    def touch(self, symbol: str) -> None:
+        """Отметить запрос символа (дёшево: вызывается на каждой конвертации)."""
+        if symbol in self.ids:
+            self._demand[symbol] = time.monotonic()
+
+    def touched_since(self, since: float) -> List[str]:
+        """Символы, запрошенные после момента since (time.monotonic())."""
+        return [sym for sym, last in list(self._demand.items()) if last > since]
+
+    def ttl(self, symbol: str, now: Optional[float] = None) -> Optional[float]:
+        """Период обновления символа по спросу; None — символ сейчас не обновляется."""
+        last = self._demand.get(symbol)
+        if last is None:
+            return None
+        idle = (time.monotonic() if now is None else now) - last
+        if idle <= self.hot_window:
+            return self.hot_ttl
+        if idle <= self.cold_window:
+            return self.cold_ttl
+        return None
+
+    def demanded(self, now: Optional[float] = None) -> List[str]:
+        """Символы со спросом за последние cold_window секунд; забытые удаляются из учёта."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            # touch() пишет без блокировки: перебираем копию (list(d.items()) не отпускает GIL)
+            items = list(self._demand.items())
+            for sym, last in items:
+                if now - last > self.cold_window:
+                    self._demand.pop(sym, None)
+            return [sym for sym, last in items if now - last <= self.cold_window]
+
+    def tracked(self, now: Optional[float] = None) -> List[str]:
+        """Что запрашивать при полном обновлении: закреплённые монеты и монеты со спросом."""
+        return list(dict.fromkeys([*self.pinned, *self.demanded(now)]))
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Символы со спросом, курс которых старше их периода обновления; сначала самые устаревшие."""
+        now = time.monotonic() if now is None else now
+        overdue = []
+        for sym in self.demanded(now):
+            ttl = self.ttl(sym, now)
+            age = now - self._fetched.get(sym, float("-inf"))
+            if ttl is not None and age >= ttl:
+                overdue.append((age - ttl, sym))
+        return [sym for _, sym in sorted(overdue, reverse=True)]
+
+    def seconds_until_due(self) -> float:
+        """Сколько ждать до следующего символа к обновлению (для RefreshScheduler)."""
+        now = time.monotonic()
+        waits = [self.hot_ttl]
+        for sym in self.demanded(now):
+            ttl = self.ttl(sym, now)
+            if ttl is not None:
+                waits.append(ttl - (now - self._fetched.get(sym, float("-inf"))))
+        return max(0.0, min(waits))
+
+    def mark_fetched(self, symbols: Iterable[str], now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for sym in symbols:
+            self._fetched[sym] = now
@@ -0,0 +1,200 @@
+from __future__ import annotations
+import csv
+import json
+from dataclasses import dataclass
+from decimal import Context, Decimal, InvalidOperation, getcontext
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+from .core import ConverterCore, RateSnapshot
+from .fixedpoint import round_minor
+
+
+# Строка на входе: (base, quote, amount) в сыром виде, как в файле
+Row = Tuple[str, str, str]
+# Результат строки: (rate, result) или текст ошибки
+RowResult = Union[Tuple[Decimal, Decimal], str]
+
+
+@dataclass
+class BulkStats:
+    rows: int = 0
+    errors: int = 0
+    version: int = 0
+    source: str = ""
+
+
+def parse_amount(raw: str) -> Decimal:
+    cleaned = (raw.replace(" ", "").replace("\u00a0", "").replace("_", "").replace(",", "."))
+    if not cleaned:
+        raise InvalidOperation
+    amount = Decimal(cleaned)
+    if not amount.is_finite():
+        raise InvalidOperation
+    return amount
+
+
+class BulkConverter:
+    """Потоковая конвертация больших файлов по одному снимку курсов.
+
+    Коды распознаются один раз на каждое различное значение, кросс-курс берётся
+    из матрицы снимка один раз на пару; строки пачки группируются по паре, и
+    внутри группы остаётся только умножение и округление. Семантика округления та же,
+    что у ConverterCore.convert: умножение в контексте по умолчанию, затем round_minor —
+    ROUND_HALF_UP до минимальной единицы валюты результата.
+    """
+
+    def __init__(self, core: ConverterCore, chunk_size: int = 10000) -> None:
+        self.core = core
+        self.chunk_size = chunk_size
+        self._codes: Dict[str, str] = {}
+        self._refreshed = False
+        self.snapshot: Optional[RateSnapshot] = core.snapshot
+
+    def _code(self, raw: str) -> str:
+        code = self._codes.get(raw)
+        if code is None:
+            try:
+                code = self.core.resolver.normalize(raw)
+            except ValueError:
+                code = ""
+            self._codes[raw] = code
+        return code
+
+    def _ensure(self, codes: Iterable[str]) -> None:
+        snap = self.snapshot
+        missing = {c for c in codes if c and (snap is None or c not in snap.rates)}
+        if missing and not self._refreshed:
+            # Не более одного принудительного обновления на весь файл
+            self._refreshed = True
+            self.core.ensure_symbols(missing)
+            self.snapshot = self.core.snapshot
+
+    def convert_chunk(self, rows: List[Row]) -> List[RowResult]:
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        results: List[RowResult] = [""] * len(rows)
+        for i, (base, quote, _) in enumerate(rows):
+            a, b = self._code(base), self._code(quote)
+            if not a or not b:
+                results[i] = "Не удалось распознать коды валют"
+                continue
+            groups.setdefault((a, b), []).append(i)
+
+        self._ensure({code for pair in groups for code in pair})
+        cross = self.snapshot.cross if self.snapshot is not None else {}
+        ctx = Context(prec=getcontext().prec)
+        multiply = ctx.multiply
+
+        for (a, b), idx in groups.items():
+            row = cross.get(a)
+            rate = row.get(b) if row is not None else None
+            if rate is None:
+                missing = [sym for sym in (a, b) if sym not in cross]
+                err = f"Курс(ы) {', '.join(missing)!r} недоступен(ы) у провайдера"
+                for i in idx:
+                    results[i] = err
+                continue
+            quantum = self.core.result_quantum(b)
+            for i in idx:
+                try:
+                    amount = parse_amount(rows[i][2])
+                except InvalidOperation:
+                    results[i] = "Некорректная сумма"
+                    continue
+                try:
+                    results[i] = (rate, round_minor(multiply(amount, rate), quantum))
+                except ArithmeticError:
+                    # Переполнение контекста Decimal — ошибка этой строки, а не всего файла
+                    results[i] = "Сумма вне допустимого диапазона"
+        return results
+
+    def convert_stream(self, rows: Iterable[Row]) -> Iterator[Tuple[Row, RowResult]]:
+        it = iter(rows)
+        while True:
+            chunk = list(islice(it, self.chunk_size))
+            if not chunk:
+                return
+            yield from zip(chunk, self.convert_chunk(chunk))
+
+
+def _stats(conv: BulkConverter, stats: BulkStats) -> BulkStats:
+    if conv.snapshot is not None:
+        stats.version = conv.snapshot.version
+        stats.source = conv.snapshot.source
+    return stats
+
+
+def convert_csv(core: ConverterCore, src: TextIO, dst: TextIO, *, base_col: str = "base",
+                quote_col: str = "quote", amount_col: str = "amount", quote: Optional[str] = None,
+                chunk_size: int = 10000) -> BulkStats:
+    """CSV с заголовком -> те же строки плюс колонки rate, result, error.
+
+    quote задаёт одну валюту назначения для всего файла (тогда колонка quote_col не нужна).
+    """
+    reader = csv.reader(src)
+    header = next(reader, None)
+    if header is None:
+        return BulkStats()
+    try:
+        ib = header.index(base_col)
+        ia = header.index(amount_col)
+        iq = header.index(quote_col) if quote is None else -1
+    except ValueError as e:
+        raise ValueError(f"В CSV нет нужной колонки: {e}") from None
+
+    writer = csv.writer(dst, lineterminator="\n")
+    writer.writerow(header + ["rate", "result", "error"])
+    conv = BulkConverter(core, chunk_size)
+    stats = BulkStats()
+    rows = ((r, (r[ib], quote if iq < 0 else r[iq], r[ia])) for r in reader if r)
+
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+        out = []
+        for (raw, _), res in zip(chunk, conv.convert_chunk([row for _, row in chunk])):
+            if isinstance(res, str):
+                stats.errors += 1
+                out.append(raw + ["", "", res])
+            else:
+                out.append(raw + [str(res[0]), str(res[1]), ""])
+        writer.writerows(out)
+        stats.rows += len(chunk)
+    return _stats(conv, stats)
+
+
+def convert_jsonl(core: ConverterCore, src: TextIO, dst: TextIO, *, base_col: str = "base",
+                  quote_col: str = "quote", amount_col: str = "amount", quote: Optional[str] = None,
+                  chunk_size: int = 10000) -> BulkStats:
+    """JSONL: в каждый объект добавляются поля rate и result (или error)."""
+    conv = BulkConverter(core, chunk_size)
+    stats = BulkStats()
+    lines = (line for line in src if line.strip())
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            break
+        objs, rows, bad = [], [], set()
+        for line in chunk:
+            try:
+                obj = json.loads(line)
+                row = (str(obj[base_col]), str(quote if quote is not None else obj[quote_col]), str(obj[amount_col]))
+            except (ValueError, KeyError, TypeError):
+                bad.add(len(objs))
+                obj, row = {"input": line.rstrip("\n")}, ("", "", "")
+            objs.append(obj)
+            rows.append(row)
+        for i, (obj, res) in enumerate(zip(objs, conv.convert_chunk(rows))):
+            if i in bad:
+                res = "Некорректная строка: ожидается JSON-объект с валютами и суммой"
+            if isinstance(res, str):
+                stats.errors += 1
+                obj["error"] = res
+            else:
+                obj["rate"], obj["result"] = str(res[0]), str(res[1])
+            dst.write(json.dumps(obj, ensure_ascii=False))
+            dst.write("\n")
+        stats.rows += len(chunk)
+    return _stats(conv, stats)
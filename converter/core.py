@@ -1,17 +1,26 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 import json
 import logging
-import sqlite3
-import re
-import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, Optional, Tuple, List
-from urllib.request import urlopen
-from urllib.error import URLError
+from types import MappingProxyType
+from typing import AsyncContextManager, Callable, Dict, Iterable, Iterator, Optional, Tuple, List, Mapping, Union
+
+from .providers import (CoinGeckoProvider, ECBProvider, FrankfurterProvider, HttpClient, Provider,
+                        ProviderRegistry, RateLimited, default_cache_dir)
+from .assets import AssetUniverse
+from .fixedpoint import minor_quantum, round_minor
+from .metrics import REGISTRY, Registry
+from .refresh import RefreshScheduler, SingleFlight
+from .resolver import Resolver
+from .shared import SharedSnapshot
+from .storage import IMPORT_BATCH_DAYS, Storage
 
 logger = logging.getLogger(__name__)
 if not logger.handlers:
@@ -20,6 +29,24 @@ if not logger.handlers:
     logger.addHandler(_h)
 logger.setLevel(logging.INFO)
 
+CONVERT_SECONDS = REGISTRY.histogram(
+    "converter_convert_seconds", "Время конвертации; path=snapshot — из снимка в памяти, "
+    "refresh — с принудительным обновлением, history — по историческому курсу, batch — пакет целиком", ["path"])
+_CONVERT_SNAPSHOT = CONVERT_SECONDS.labels(path="snapshot")
+_CONVERT_REFRESH = CONVERT_SECONDS.labels(path="refresh")
+_CONVERT_BATCH = CONVERT_SECONDS.labels(path="batch")
+PROVIDER_FETCH_SECONDS = REGISTRY.histogram(
+    "converter_provider_fetch_seconds", "Длительность запроса к провайдеру курсов", ["provider"])
+PROVIDER_ERRORS = REGISTRY.counter("converter_provider_errors_total", "Ошибки провайдеров курсов", ["provider"])
+REFRESH_TOTAL = REGISTRY.counter("converter_refresh_total", "Обновления курсов по результату", ["result"])
+REFRESH_SECONDS = REGISTRY.histogram("converter_refresh_seconds", "Длительность обновления курсов целиком")
+LOCK_WAIT_SECONDS = REGISTRY.histogram("converter_lock_wait_seconds", "Ожидание замка подмены снимка")
+MISSING_SYMBOL_TOTAL = REGISTRY.counter(
+    "converter_missing_symbol_total", "Запросы курсов, которых нет в снимке: targeted — точечный запрос, "
+    "full — полное обновление, rate_limited — обновление было недавно, negative_cache — символ известен как отсутствующий, "
+    "leader — читатель попросил ведущий процесс",
+    ["action"])
+
 
 NAME_ALIASES: Dict[str, str] = {
     #Фиат
@@ -75,7 +102,7 @@ NAME_ALIASES: Dict[str, str] = {
     "канадский доллар": "CAD",
     # Крипта — коды (верхний регистр) и синонимы
     "btc": "BTC", "bitcoin": "BTC", "биткоин": "BTC", "биток": "BTC",
-    "eth": "ETH", "ethereum": "ETH", "эфир": "ETH",
+    "eth": "ETH", "ethereum": "ETH", "ether": "ETH", "эфир": "ETH",
     "usdt": "USDT", "tether": "USDT", "тезер": "USDT", "тетер": "USDT",
     "usdc": "USDC", "usd coin": "USDC",
     "bnb": "BNB",
@@ -136,6 +163,113 @@ class ConversionResult:
     fetched_at: datetime
     source: str
 
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "base": self.base,
+            "quote": self.quote,
+            "amount": str(self.amount),
+            "rate": str(self.rate),
+            "result": str(self.result),
+            "fetched_at": self.fetched_at.isoformat(),
+            "source": self.source,
+        }
+
+
+class CrossRates(Mapping[str, Mapping[str, Decimal]]):
+    """Матрица кросс-курсов cross[a][b] с ленивыми строками.
+
+    Строка a считается при первом обращении и запоминается до конца жизни снимка. Полная
+    матрица N×N при сотнях монет со спросом стоила бы секунды и сотни мегабайт на каждую
+    подмену снимка, а конвертации используют немного строк. Две одновременные первые
+    выборки одной строки посчитают её дважды с одинаковым результатом — блокировка не нужна.
+    """
+
+    def __init__(self, rates: Mapping[str, Decimal], base: str) -> None:
+        self._rates = rates
+        self._base = base
+        self._rows: Dict[str, Mapping[str, Decimal]] = {}
+
+    def __getitem__(self, a: str) -> Mapping[str, Decimal]:
+        row = self._rows.get(a)
+        if row is None:
+            if a not in self._rates:
+                raise KeyError(a)
+            rates, base = self._rates, self._base
+            row = self._rows[a] = MappingProxyType({b: cross_rate(rates, base, a, b) for b in rates})
+        return row
+
+    def __contains__(self, a: object) -> bool:
+        return a in self._rates
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rates)
+
+    def __len__(self) -> int:
+        return len(self._rates)
+
+    def built(self) -> List[str]:
+        """Строки, которые уже посчитаны (то есть использовались)."""
+        return list(self._rows)
+
+    def warm(self, symbols: Iterable[str]) -> None:
+        for a in symbols:
+            if a in self._rates:
+                self[a]
+
+
+# Сколько использованных строк матрицы прежнего снимка посчитать в новом сразу при подмене
+WARM_CROSS_ROWS = 64
+
+
+@dataclass(frozen=True)
+class RateSnapshot:
+    """Неизменяемый набор курсов ref_base->X, которым обслуживаются конвертации.
+
+    Снимок подменяется целиком (одним присваиванием ссылки) при обновлении,
+    поэтому читатели берут его без блокировок и без обращений к SQLite.
+    Кросс-курсы cross[a][b] считаются по строкам при первом обращении (см. CrossRates).
+    """
+    base: str
+    rates: Mapping[str, Decimal]
+    fetched_at: datetime
+    source: str
+    version: int = 0
+    cross: CrossRates = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Нулевой курс не даёт построить кросс-курсы — такой символ считаем недоступным
+        rates = {sym: rate for sym, rate in self.rates.items() if rate}
+        rates.setdefault(self.base, Decimal("1"))
+        object.__setattr__(self, "rates", MappingProxyType(rates))
+        object.__setattr__(self, "cross", CrossRates(self.rates, self.base))
+
+    def warm_from(self, prev: Optional["RateSnapshot"]) -> None:
+        """Посчитать строки, которые использовались в prev: первая конвертация по горячей
+        паре после подмены снимка не платит за строку."""
+        if prev is not None:
+            self.cross.warm(prev.cross.built()[:WARM_CROSS_ROWS])
+
+    def age(self, now: Optional[datetime] = None) -> timedelta:
+        return (now or _utcnow()) - self.fetched_at
+
+    def delta(self, prev: Optional["RateSnapshot"]) -> Dict[str, Decimal]:
+        """Курсы, которые появились или изменились относительно prev (для prev=None — все)."""
+        if prev is None or prev.base != self.base:
+            return dict(self.rates)
+        old = prev.rates
+        return {sym: rate for sym, rate in self.rates.items() if old.get(sym) != rate}
+
+
+def cross_rate(rates: Mapping[str, Decimal], ref_base: str, a: str, b: str) -> Decimal:
+    """Курс a->b по курсам ref_base->X."""
+    if a == b:
+        return Decimal("1")
+    if a == ref_base:
+        return rates[b]
+    if b == ref_base:
+        return Decimal("1") / rates[a]
+    return rates[b] / rates[a]
+
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
@@ -146,115 +280,181 @@ def _as_epoch(dt: datetime) -> int:
 def _from_epoch(ts: int) -> datetime:
     return datetime.fromtimestamp(ts, tz=timezone.utc)
 
+_resolver = Resolver(NAME_ALIASES)
+
 def normalize_code(name_or_code: str) -> str:
-    s = (name_or_code or "").strip().lower()
-    if not s:
-        raise ValueError("Пустое название валюты")
-    if len(s) == 3 and s.isalpha():
-        return s.upper()
-    return NAME_ALIASES.get(s) or (s.upper() if len(s) == 3 else NAME_ALIASES.get(s, ""))
+    return _resolver.normalize(name_or_code)
 
 def parse_pair(pair: str) -> Tuple[str, str]:
-    if not pair or not pair.strip():
-        raise ValueError("Строка с валютами пуста")
+    return _resolver.parse_pair(pair)
 
-    s = pair.strip()
-    s = re.sub(r"[–—]+", "-", s)
-    s = re.sub(r"\s+", " ", s)
-
-    parts = re.split(r"\s*[-/\\→]+\s*|\s+(?:to|в)\s+", s, maxsplit=1, flags=re.I)
-
-    if len(parts) != 2:
-        toks = s.split(" ")
-        if len(toks) == 2:
-            parts = toks
-        else:
-            raise ValueError("Укажите две валюты, например: 'RUB - USD' или 'RUB USD'")
-
-    a, b = parts[0].strip(), parts[1].strip()
-    code_a = normalize_code(a)
-    code_b = normalize_code(b)
-    if not code_a or not code_b:
-        raise ValueError(f"Не удалось распознать валюты из строки: '{pair}'")
-    return code_a, code_b
+def suggest_codes(prefix: str, limit: int = 10) -> List[Tuple[str, str]]:
+    """Автодополнение по названиям и кодам валют: [(alias, code)]."""
+    return _resolver.suggest(prefix, limit)
 
 
 def _fetch_json(url: str, timeout: float = 10.0) -> dict:
+    from urllib.request import urlopen
+
     with urlopen(url, timeout=timeout) as resp:
         raw = resp.read()
     return json.loads(raw.decode("utf-8"))
 
-def fetch_fiat_usd_from_ecb() -> Dict[str, Decimal]:
-    url = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
-    with urlopen(url, timeout=10.0) as resp:
-        content = resp.read()
-    root = ET.fromstring(content)
-    #элементы <Cube currency="XXX" rate="N.NNNN">
-    eur_to: Dict[str, Decimal] = {}
-    for cube in root.iter():
-        c = cube.attrib.get("currency")
-        r = cube.attrib.get("rate")
-        if c and r:
-            eur_to[c.upper()] = Decimal(str(r))
-    eur_to["EUR"] = Decimal("1")
-    if "USD" not in eur_to:
-        raise RuntimeError("В ответе ЕЦБ нет USD")
-    #USD->X = (EUR->X) / (EUR->USD)
-    eur_to_usd = eur_to["USD"]
-    usd_to: Dict[str, Decimal] = {sym: (rate / eur_to_usd) for sym, rate in eur_to.items()}
-    usd_to["USD"] = Decimal("1")
-    return usd_to
-
-def fetch_crypto_usd_from_coingecko(symbols: List[str]) -> Dict[str, Decimal]:
-    ids = [COINGECKO_IDS[sym] for sym in symbols if sym in COINGECKO_IDS]
-    if not ids:
-        return {}
-    url = f"https://api.coingecko.com/api/v3/simple/price?ids={','.join(ids)}&vs_currencies=usd"
-    data = _fetch_json(url)
-    result: Dict[str, Decimal] = {}
-    for sym, cid in COINGECKO_IDS.items():
-        obj = data.get(cid)
-        if not obj:
-            continue
-        price = obj.get("usd")
-        if price is None:
-            continue
-        # USD->COIN = 1 / (USD per COIN)
-        try:
-            result[sym] = (Decimal("1") / Decimal(str(price)))
-        except Exception:
-            continue
-    return result
+_default_registry: Optional[ProviderRegistry] = None
+_default_assets: Optional[AssetUniverse] = None
+_registry_lock = threading.Lock()
 
-def fetch_usd_rates() -> Tuple[Dict[str, Decimal], str]:
-    source_parts: List[str] = []
-    rates: Dict[str, Decimal] = {}
+def default_registry() -> ProviderRegistry:
+    """Реестр по умолчанию: ЕЦБ (основной фиат), Frankfurter (резервный фиат), CoinGecko (крипта)."""
+    global _default_registry, _default_assets
+    with _registry_lock:
+        if _default_registry is None:
+            http = HttpClient(cache_dir=default_cache_dir())
+            _default_assets = AssetUniverse(COINGECKO_IDS, http, cache_dir=default_cache_dir())
+            registry = ProviderRegistry()
+            registry.register(ECBProvider(http))
+            registry.register(FrankfurterProvider(http))
+            registry.register(CoinGeckoProvider(COINGECKO_IDS, http, universe=_default_assets))
+            _default_registry = registry
+        return _default_registry
 
-    #Фиат
+def default_assets() -> AssetUniverse:
+    """Справочник криптоактивов CoinGecko-провайдера из реестра по умолчанию."""
+    default_registry()
+    return _default_assets
+
+def fetch_fiat_usd_from_ecb(timeout: float = 10.0) -> Dict[str, Decimal]:
+    return default_registry().get("ECB").fetch(timeout=timeout)
+
+def fetch_crypto_usd_from_coingecko(symbols: List[str], timeout: float = 10.0) -> Dict[str, Decimal]:
+    return default_registry().get("CoinGecko").fetch(timeout=timeout, symbols=symbols)
+
+
+# Общий дедлайн обновления курсов (сек) и через сколько секунд без ответа ЕЦБ
+# параллельно запрашивать резервный фиатный провайдер
+REFRESH_DEADLINE = 15.0
+HEDGE_DELAY = 2.0
+
+
+def _timed_fetch(provider: Provider, timeout: float, symbols: Optional[List[str]] = None) -> Dict[str, Decimal]:
+    """Запрос к провайдеру с учётом его здоровья: таймаут — по наблюдаемым задержкам, исход
+    записывается в автомат провайдера. Запись идёт в потоке запроса, так что и брошенный
+    по общему дедлайну запрос потом обновит состояние провайдера."""
+    breaker = provider.breaker
+    timeout = breaker.timeout(timeout)
+    provider.take_round_trip()  # остаток от прошлого запроса в этом потоке
+    t0 = time.perf_counter()
     try:
-        fiat = fetch_fiat_usd_from_ecb()
-        rates.update(fiat)
-        source_parts.append("ECB")
-    except Exception as e:
-        logger.warning("ЕЦБ недоступен: %s", e)
-        try:
-            data = _fetch_json("https://api.frankfurter.app/latest?from=USD")
-            if "rates" in data:
-                for k, v in data["rates"].items():
-                    rates[k.upper()] = Decimal(str(v))
-                rates["USD"] = Decimal("1")
-                source_parts.append("Frankfurter(ECB)")
-        except Exception as e2:
-            logger.warning("Резервный провайдер недоступен: %s", e2)
+        if symbols is not None:
+            result = provider.fetch(timeout=timeout, symbols=symbols)
+        else:
+            result = provider.fetch(timeout=timeout)
+    except RateLimited:
+        breaker.release()
+        raise
+    except Exception:
+        PROVIDER_ERRORS.inc(provider=provider.name)
+        breaker.record_failure()
+        raise
+    else:
+        # Задержка — только по настоящим сетевым запросам: ответы из кэша и 304 занимают
+        # микросекунды и стянули бы адаптивный таймаут к нулю
+        breaker.record_success(provider.take_round_trip())
+        return result
+    finally:
+        PROVIDER_FETCH_SECONDS.observe(time.perf_counter() - t0, provider=provider.name)
+
+
+def fetch_usd_rates(deadline: float = REFRESH_DEADLINE, hedge_delay: float = HEDGE_DELAY,
+                    registry: Optional[ProviderRegistry] = None) -> Tuple[Dict[str, Decimal], str]:
+    """Опрашивает группы провайдеров реестра параллельно и сливает ответы по мере поступления.
+
+    В каждой группе сначала запрашивается основной провайдер; при его ошибке или молчании
+    дольше hedge_delay параллельно запрашивается следующий, берётся первый успешный ответ.
+    Время обновления ограничено самым медленным нужным провайдером и общим deadline,
+    а не суммой таймаутов.
+
+    Порядок задаёт здоровье провайдеров (ProviderRegistry.route): провайдеры с разомкнутым
+    автоматом не запрашиваются вовсе, а ожидающим пробного запроса он отправляется сразу,
+    параллельно с первым рабочим провайдером группы.
+    """
+    registry = registry or default_registry()
+    started = time.monotonic()
 
+    def remaining() -> float:
+        return deadline - (time.monotonic() - started)
+
+    groups = {kind: registry.route(kind) for kind in registry.kinds()}
+    for kind in registry.kinds():
+        if not groups[kind]:
+            logger.warning("%s: все провайдеры временно отключены после ошибок", kind)
+    pool = ThreadPoolExecutor(max_workers=max(2, sum(len(g) for g in groups.values())), thread_name_prefix="rates-fetch")
+    pending: Dict[Future, Tuple[str, Provider]] = {}
+    got: Dict[str, Tuple[str, Dict[str, Decimal]]] = {}
+    next_idx: Dict[str, int] = {}
+    hedge_at: Dict[str, float] = {}
+
+    def launch(kind: str, provider: Provider) -> bool:
+        # acquire() может отказать, если пробный запрос уже отправило параллельное обновление
+        if not provider.breaker.acquire():
+            return False
+        pending[pool.submit(_timed_fetch, provider, max(0.1, min(10.0, remaining())))] = (kind, provider)
+        return True
+
+    def start_next(kind: str) -> None:
+        while next_idx.get(kind, 0) < len(groups[kind]):
+            provider = groups[kind][next_idx.get(kind, 0)]
+            next_idx[kind] = next_idx.get(kind, 0) + 1
+            if launch(kind, provider):
+                hedge_at[kind] = time.monotonic() + hedge_delay
+                return
+        hedge_at.pop(kind, None)
+
+    for kind, providers in groups.items():
+        probes = [p for p in providers if p.breaker.state == "half_open"]
+        for provider in probes:
+            launch(kind, provider)
+        groups[kind] = [p for p in providers if p not in probes]
+        start_next(kind)
     try:
-        crypto_list = list(COINGECKO_IDS.keys())
-        crypto = fetch_crypto_usd_from_coingecko(crypto_list)
-        if crypto:
-            rates.update(crypto)
-            source_parts.append("CoinGecko")
-    except Exception as e:
-        logger.warning("CoinGecko недоступен: %s", e)
+        while remaining() > 0 and any(kind not in got for kind, _ in pending.values()):
+            now = time.monotonic()
+            timeout = min([remaining()] + [max(0.0, at - now) for kind, at in hedge_at.items() if kind not in got])
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, provider = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    logger.warning("%s недоступен: %s", provider.name, e)
+                    result = None
+                if result and kind not in got:
+                    got[kind] = (provider.name, result)
+                elif kind not in got:
+                    start_next(kind)
+            now = time.monotonic()
+            for kind, at in list(hedge_at.items()):
+                if kind not in got and now >= at:
+                    logger.info("%s: нет ответа за %.1f с — параллельно запрашиваю резервный провайдер", kind, hedge_delay)
+                    start_next(kind)
+    finally:
+        # Незавершённые запросы не ждём: их результат уже не нужен
+        pool.shutdown(wait=False, cancel_futures=True)
+        for fut, (_, provider) in pending.items():
+            if fut.cancelled():
+                provider.breaker.release()  # пробный запрос так и не ушёл
+
+    for kind, provider in pending.values():
+        if kind not in got:
+            logger.warning("%s не ответил до истечения общего дедлайна %.1f с", provider.name, deadline)
+
+    source_parts: List[str] = []
+    rates: Dict[str, Decimal] = {}
+    for kind in groups:
+        if kind in got:
+            name, part = got[kind]
+            rates.update(part)
+            source_parts.append(name)
 
     if not rates:
         raise RuntimeError("Не удалось получить курсы ни от одного провайдера")
@@ -263,142 +463,763 @@ def fetch_usd_rates() -> Tuple[Dict[str, Decimal], str]:
     return rates, "+".join(source_parts) if source_parts else "unknown"
 
 
-DDL = """
-CREATE TABLE IF NOT EXISTS rates (
-    base       TEXT NOT NULL,
-    symbol     TEXT NOT NULL,
-    rate       TEXT NOT NULL,
-    fetched_at INTEGER NOT NULL,
-    source     TEXT NOT NULL,
-    PRIMARY KEY (base, symbol)
-);
-CREATE INDEX IF NOT EXISTS idx_rates_fetched ON rates(base, fetched_at);
-"""
-
-def _init_db(conn: sqlite3.Connection) -> None:
-    conn.executescript(DDL)
-    conn.commit()
-
-def _last_fetch_meta(conn: sqlite3.Connection, base: str) -> Optional[Tuple[int, str]]:
-    cur = conn.execute(
-        "SELECT fetched_at, source FROM rates WHERE base=? ORDER BY fetched_at DESC LIMIT 1",
-        (base,)
-    )
-    row = cur.fetchone()
-    return (row[0], row[1]) if row else None
-
-def _upsert_rates(conn: sqlite3.Connection, base: str, rates: Dict[str, Decimal], source: str, fetched_at: datetime) -> None:
-    ts = _as_epoch(fetched_at)
-    rows = [(base, sym, str(val), ts, source) for sym, val in rates.items()]
-    conn.executemany(
-        "INSERT OR REPLACE INTO rates(base, symbol, rate, fetched_at, source) VALUES(?,?,?,?,?)",
-        rows
-    )
-    conn.commit()
-
-def _get_two_rates(conn: sqlite3.Connection, base: str, a: str, b: str) -> Dict[str, Decimal]:
-    cur = conn.execute(
-        "SELECT symbol, rate FROM rates WHERE base=? AND symbol IN (?, ?)",
-        (base, a, b),
-    )
-    res = {row[0]: Decimal(row[1]) for row in cur.fetchall()}
-    if a == base and base not in res:
-        res[base] = Decimal("1")
-    if b == base and base not in res:
-        res[base] = Decimal("1")
-    return res
+def fetch_usd_rates_for(symbols: Iterable[str], registry: Optional[ProviderRegistry] = None,
+                        timeout: float = 10.0) -> Optional[Tuple[Dict[str, Decimal], str]]:
+    """Точечный запрос USD->X только для symbols и только у провайдеров, умеющих запрашивать
+    символы по отдельности (CoinGecko — один id вместо всего списка монет).
+
+    None — если хотя бы один символ так не запросить (или провайдер отключён после ошибок):
+    тогда нужно полное обновление.
+    """
+    registry = registry or default_registry()
+    plan: Dict[str, Tuple[Provider, List[str]]] = {}
+    for sym in symbols:
+        provider = next((p for p in registry if p.covers(sym)), None)
+        if provider is None:
+            return None
+        plan.setdefault(provider.name, (provider, []))[1].append(sym)
+
+    rates: Dict[str, Decimal] = {}
+    for provider, wanted in plan.values():
+        if not provider.breaker.acquire():
+            return None
+        rates.update(_timed_fetch(provider, timeout, wanted))
+    return rates, "+".join(plan)
+
+
+def load_snapshot_file(path: str | Path, base: str) -> Optional[RateSnapshot]:
+    """Снимок из JSON-файла (формат ConverterCore.export_snapshot); None, если файла нет или база другая."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    if data.get("base", "").upper() != base:
+        logger.warning("Поставляемый снимок %s — база %s, ожидалась %s", path, data.get("base"), base)
+        return None
+    rates = {sym.upper(): Decimal(str(rate)) for sym, rate in data["rates"].items()}
+    return RateSnapshot(base, rates, datetime.fromisoformat(data["fetched_at"]),
+                        f"{data.get('source', 'unknown')} (bundled)", version=0)
+
+
+# Полное обновление из-за отсутствующего символа — не чаще раза в столько секунд;
+# отсутствующий и после обновления символ столько секунд не запрашивается снова
+MISSING_REFRESH_INTERVAL = 30.0
+UNKNOWN_SYMBOL_TTL = 600.0
+UNKNOWN_SYMBOL_CACHE = 10000
+# Сколько процесс-читатель общего снимка ждёт, пока ведущий догрузит запрошенные символы
+LEADER_WAIT = 3.0
 
 
 class ConverterCore:
-    def __init__(self, db_path: str | Path = "rates.sqlite3", ref_base: str = "USD", auto_update_age_hours: int = 12) -> None:
+    def __init__(self, db_path: str | Path = "rates.sqlite3", ref_base: str = "USD", auto_update_age_hours: int = 12,
+                 io_workers: int = 4, registry: Optional[ProviderRegistry] = None,
+                 fetch_on_init: bool = True, bundled_snapshot: str | Path | None = None,
+                 shared_snapshot: str | Path | None = None, shared_poll_interval: float = 1.0,
+                 missing_refresh_interval: float = MISSING_REFRESH_INTERVAL,
+                 unknown_symbol_ttl: float = UNKNOWN_SYMBOL_TTL, assets: Optional[AssetUniverse] = None,
+                 leader_wait: float = LEADER_WAIT) -> None:
+        """fetch_on_init=False — неблокирующий старт: при пустой БД курсы берутся из bundled_snapshot
+        (если он задан), а загрузка от провайдеров идёт в фоне; готовность — см. ready.
+
+        shared_snapshot — файл общего снимка для нескольких процессов: курсы обновляет только
+        ведущий процесс (удерживает блокировку файла), остальные читают опубликованный снимок
+        раз в shared_poll_interval секунд и при падении ведущего забирают его роль. К провайдерам
+        читатели не ходят: недостающие символы они просят догрузить ведущего и ждут их в общем
+        снимке до leader_wait секунд.
+
+        Запрос символа, которого нет в снимке, не чаще раза в missing_refresh_interval секунд
+        приводит к полному обновлению (точечные запросы отдельных символов не ограничены);
+        символ, которого не оказалось и после обновления, unknown_symbol_ttl секунд считается
+        отсутствующим без новых походов к провайдерам.
+
+        assets — динамический справочник криптоактивов (обычно default_assets(), общий с провайдером
+        CoinGecko): конвертации отмечают спрос на монеты, в фоне загружается справочник тикеров,
+        а курсы монет со спросом обновляются по отдельности — горячие раз в минуту, холодные раз в час."""
         self.db_path = Path(db_path)
+        self.registry = registry
         self.ref_base = ref_base.upper()
         self.auto_update_age = timedelta(hours=auto_update_age_hours)
-        self.lock = threading.Lock()
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        _init_db(self.conn)
+        self.io_workers = io_workers
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self.lock = threading.Lock()  # замена снимка и негативный кэш; БД читается без блокировок (WAL)
+        # Запись обновления и подмена снимка идут одна за другой под этим замком: иначе полное
+        # обновление и точечная догрузка могли бы подменить снимки в обратном порядке версий
+        self._save_lock = threading.Lock()
+        self.storage = Storage(self.db_path)
+        self._snapshot: Optional[RateSnapshot] = None
+        self._refresh_flight = SingleFlight()
+        self._scheduler: Optional[RefreshScheduler] = None
+        self._background_wanted = False
+        self._shared = SharedSnapshot(shared_snapshot) if shared_snapshot is not None else None
+        self.shared_poll_interval = shared_poll_interval
+        self._shared_version = 0
+        self.leader_wait = leader_wait
+        self._follow_stop = threading.Event()
+        self._follower: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[Optional[RateSnapshot], RateSnapshot], None]] = []
+        self.missing_refresh_interval = missing_refresh_interval
+        self.unknown_symbol_ttl = unknown_symbol_ttl
+        self._unknown: Dict[str, float] = {}  # символ -> до какого time.monotonic() он считается отсутствующим
+        self._last_full_refresh = float("-inf")
+        # Ответили ли в последнем полном обновлении все группы провайдеров: если какая-то
+        # не ответила, отсутствие символа в снимке ничего не говорит о его существовании
+        self._last_refresh_complete = False
+        self.assets = assets
+        self._assets_scheduler: Optional[RefreshScheduler] = None
+        # Со справочником монет у ядра свой распознаватель: тикеры из справочника — коды только
+        # для этого ядра, а общий normalize_code/parse_pair модуля остаётся прежним
+        self.resolver = Resolver(NAME_ALIASES, is_code=assets.covers) if assets is not None else _resolver
 
-        meta = _last_fetch_meta(self.conn, self.ref_base)
-        if meta is None:
+        stored = self.storage.load_state(self.ref_base)
+        if stored is not None:
+            rates, ts, source, version = stored
+            self._snapshot = RateSnapshot(self.ref_base, rates, _from_epoch(ts), source, version=version)
+        if self._shared is not None:
+            self._init_shared()
+
+        if self._snapshot is None and fetch_on_init:
             logger.info("Первая инициализация БД — загружаем курсы %s", self.ref_base)
             self.update_rates(force=True)
+        elif self._snapshot is None:
+            if bundled_snapshot is not None:
+                self._snapshot = load_snapshot_file(bundled_snapshot, self.ref_base)
+            logger.info("Первая инициализация БД — курсы %s загружаются в фоне", self.ref_base)
+            self.refresh_in_background()
 
-    def update_rates(self, force: bool = False) -> None:
+    @contextmanager
+    def _swap_lock(self) -> Iterator[None]:
+        t0 = time.perf_counter()
         with self.lock:
-            meta = _last_fetch_meta(self.conn, self.ref_base)
-            need = True
-            if meta and not force:
-                last_dt = _from_epoch(meta[0])
-                age = _utcnow() - last_dt
-                need = age >= self.auto_update_age
-
-        if need:
-            rates, source = fetch_usd_rates() if self.ref_base == "USD" else fetch_usd_like_base(self.ref_base)
-            now = _utcnow()
-            with self.lock:
-                _upsert_rates(self.conn, self.ref_base, rates, source=source, fetched_at=now)
-            logger.info("Курсы обновлены (%s), записей: %d", source, len(rates))
-        else:
+            LOCK_WAIT_SECONDS.observe(time.perf_counter() - t0)
+            yield
+
+    # --- общий снимок для нескольких процессов ---
+
+    @property
+    def is_leader(self) -> bool:
+        """Обновляет ли этот процесс курсы сам (без общего снимка — всегда да)."""
+        return self._shared is None or self._shared.is_leader
+
+    def _init_shared(self) -> None:
+        adopted = self._adopt_shared()
+        leader = self._shared.try_acquire()
+        self._follower = threading.Thread(target=self._follow, name="rates-follow", daemon=True)
+        self._follower.start()
+        if not leader:
+            return
+        snap = self._snapshot
+        if snap is not None and not adopted:
+            # В БД снимок свежее опубликованного — публикуем его, не откатывая номер версии
+            with self._swap_lock():
+                self._snapshot = snap = RateSnapshot(snap.base, snap.rates, snap.fetched_at, snap.source,
+                                                     version=max(snap.version, self._shared_version + 1))
+            self._publish(snap)
+
+    def _adopt_shared(self) -> bool:
+        """Подхватить опубликованный снимок, если он новее текущего.
+
+        Новизна — по версии: догрузка отдельных символов не меняет fetched_at снимка, но
+        публикуется под новой версией и тоже должна дойти до всех процессов."""
+        record = self._shared.poll()
+        if record is None or record.base != self.ref_base:
+            return False
+        self._shared_version = record.version
+        with self._swap_lock():
+            prev = self._snapshot
+            if prev is not None and prev.version >= record.version:
+                return False
+            self._snapshot = snap = RateSnapshot(record.base, record.rates, record.fetched_at, record.source,
+                                                 version=record.version)
+        snap.warm_from(prev)
+        self._notify(prev, snap)
+        return True
+
+    def _publish(self, snap: RateSnapshot) -> None:
+        try:
+            self._shared.publish(snap.base, snap.rates, snap.fetched_at, snap.source, snap.version)
+        except OSError as e:
+            logger.warning("Не удалось опубликовать общий снимок %s: %s", self._shared.path, e)
+
+    def _follow(self) -> None:
+        """Фоновый цикл общего снимка. Читатель подхватывает новые версии, передаёт ведущему
+        спрос на монеты и пытается забрать роль ведущего; ведущий выполняет запросы читателей."""
+        forwarded = time.monotonic()
+        while not self._shared.is_leader and not self._follow_stop.wait(self.shared_poll_interval):
+            self._adopt_shared()
+            now = time.monotonic()
+            if self.assets is not None and now - forwarded >= self.assets.hot_ttl / 2:
+                # Горячие монеты обновляет ведущий, а спрос на них виден только здесь
+                self._request_from_leader(self.assets.touched_since(forwarded))
+                forwarded = now
+            if self._shared.try_acquire():
+                logger.info("Процесс стал ведущим: курсы обновляются и публикуются здесь")
+                if self._background_wanted:
+                    self.start_background_refresh()
+                elif self._is_stale(self._snapshot):
+                    self.refresh_in_background()
+        while not self._follow_stop.wait(self.shared_poll_interval):
+            self._serve_requests()
+
+    def _request_from_leader(self, symbols: List[str]) -> bool:
+        if not symbols:
+            return True
+        try:
+            self._shared.request(symbols)
+            return True
+        except OSError as e:
+            logger.warning("Не удалось передать запрос ведущему процессу (%s): %s", self._shared.wanted_path, e)
+            return False
+
+    def _serve_requests(self) -> None:
+        symbols = self._shared.take_requests()
+        if not symbols:
+            return
+        if self.assets is not None:
+            for sym in symbols:
+                self.assets.touch(sym)
+        snap = self._snapshot
+        missing = [sym for sym in symbols if snap is None or sym not in snap.rates]
+        if missing:
+            try:
+                self.ensure_symbols(missing)
+            except Exception as e:
+                logger.warning("Не удалось догрузить курсы %s по запросу читателя: %s", ", ".join(missing), e)
+
+    def _wait_for_leader(self, symbols: List[str]) -> None:
+        """Читатель общего снимка: попросить ведущего догрузить символы и дождаться их в снимке."""
+        MISSING_SYMBOL_TOTAL.inc(action="leader")
+        if self._request_from_leader(symbols):
+            deadline = time.monotonic() + self.leader_wait
+            while True:
+                self._adopt_shared()
+                snap = self._snapshot
+                if snap is not None and all(sym in snap.rates for sym in symbols):
+                    return
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(min(0.05, self.shared_poll_interval))
+        # Не дождались — какое-то время не ждём эти символы снова
+        self._remember_unknown(symbols, self.missing_refresh_interval)
+
+    @property
+    def ready(self) -> bool:
+        """Есть ли снимок, которым можно обслуживать запросы (готовность, в отличие от «жив ли процесс»)."""
+        return self._snapshot is not None
+
+    def export_snapshot(self, path: str | Path) -> None:
+        """Сохранить текущий снимок в JSON — его можно поставлять вместе с приложением как bundled_snapshot."""
+        snap = self._snapshot
+        if snap is None:
+            raise ValueError("Снимок курсов ещё не загружен")
+        payload = {
+            "base": snap.base,
+            "fetched_at": snap.fetched_at.isoformat(),
+            "source": snap.source,
+            "rates": {sym: str(rate) for sym, rate in snap.rates.items()},
+        }
+        Path(path).write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+
+    @property
+    def snapshot(self) -> Optional[RateSnapshot]:
+        return self._snapshot
+
+    def _is_stale(self, snap: Optional[RateSnapshot]) -> bool:
+        return snap is None or snap.age() >= self.auto_update_age
+
+    def update_rates(self, force: bool = False) -> None:
+        if not self.is_leader:
+            # Курсы обновляет ведущий процесс; читатель только подхватывает опубликованный снимок
+            self._adopt_shared()
+            return
+        if not force and not self._is_stale(self._snapshot):
             logger.info("Курсы актуальны, обновление не требуется")
+            return
+        # Одновременные запросы на обновление схлопываются в один поход к провайдерам
+        self._refresh_flight.do(self._refresh)
+
+    def _fetch(self) -> Tuple[Dict[str, Decimal], str]:
+        if self.ref_base != "USD":
+            return fetch_usd_like_base(self.ref_base)
+        return fetch_usd_rates() if self.registry is None else fetch_usd_rates(registry=self.registry)
+
+    def _refresh(self) -> None:
+        self._last_full_refresh = time.monotonic()
+        try:
+            with REFRESH_SECONDS.time():
+                rates, source = self._fetch()
+                now = _utcnow()
+                with self._save_lock:
+                    version, changed = self._save(rates, source, now)
+                    self._swap(rates, source, now, version=version)
+                self._last_refresh_complete = self._answered_all(source)
+        except Exception:
+            REFRESH_TOTAL.inc(result="error")
+            raise
+        REFRESH_TOTAL.inc(result="ok")
+        logger.info("Курсы обновлены (%s), записей: %d, изменилось: %d, версия %d",
+                    source, len(rates), len(changed), version)
+
+    def _answered_all(self, source: str) -> bool:
+        """Есть ли в source (имена ответивших провайдеров через «+») провайдер каждой группы."""
+        if self.ref_base != "USD":
+            return True  # один источник (см. fetch_usd_like_base): ответил — значит, полностью
+        answered = set(source.split("+"))
+        registry = self.registry or default_registry()
+        return {p.kind for p in registry} <= {p.kind for p in registry if p.name in answered}
+
+    def _save(self, rates: Mapping[str, Decimal], source: str, now: datetime,
+              partial: bool = False) -> Tuple[int, Dict[str, Decimal]]:
+        snap = self._snapshot
+        return self.storage.save_refresh(self.ref_base, rates, source=source, fetched_at=now, partial=partial,
+                                         after_version=snap.version if snap is not None else 0)
+
+    def _refresh_symbols(self, symbols: List[str]) -> bool:
+        """Точечная догрузка символов; False — если их нельзя запросить по отдельности."""
+        got = fetch_usd_rates_for(symbols, registry=self.registry)
+        if got is None:
+            return False
+        rates, source = got
+        if rates:
+            now = _utcnow()
+            with self._save_lock:
+                version, _ = self._save(rates, source, now, partial=True)
+                self._swap(rates, source, now, partial=True, version=version)
+            logger.info("Догружены курсы %s (%s)", ", ".join(sorted(rates)), source)
+        return True
+
+    def _swap(self, rates: Mapping[str, Decimal], source: str, fetched_at: datetime, partial: bool = False,
+              version: Optional[int] = None) -> None:
+        with self._swap_lock():
+            prev = self._snapshot
+            # Как и в таблице (INSERT OR REPLACE), символы, не пришедшие в этот раз, сохраняются
+            merged = dict(prev.rates) if prev else {}
+            merged.update(rates)
+            if partial and prev is not None:
+                # Догрузка пары символов не делает свежее остальной снимок
+                fetched_at, source = prev.fetched_at, prev.source
+            if version is None:
+                version = (prev.version + 1) if prev else 1
+            self._snapshot = snap = RateSnapshot(self.ref_base, merged, fetched_at, source, version=version)
+            for sym in rates:
+                self._unknown.pop(sym, None)
+        if self._shared is not None and self._shared.is_leader:
+            self._publish(snap)
+        snap.warm_from(prev)
+        self._notify(prev, snap)
+
+    def changes_since(self, version: int) -> Tuple[int, Dict[str, Decimal]]:
+        """Что изменилось после версии version: (текущая версия, курсы ref_base->X, которые
+        появились или изменились). Для актуальной версии отвечает из памяти, без SQLite;
+        для версии новее текущей (БД пересоздана) возвращает все курсы."""
+        snap = self._snapshot
+        if snap is not None and version == snap.version:
+            return snap.version, {}
+        return self.storage.changes_since(self.ref_base, version)
+
+    def ensure_symbols(self, symbols: Iterable[str]) -> None:
+        """Догрузить отсутствующие в снимке символы, не превращая каждый запрос неизвестного кода
+        в поход ко всем провайдерам.
+
+        Символы, уже признанные отсутствующими, пропускаются (негативный кэш). Остальные по
+        возможности запрашиваются точечно; иначе — полное обновление, но не чаще раза в
+        missing_refresh_interval. Одновременные запросы одних и тех же символов схлопываются.
+        Если символа нет и после этого, ошибку формирует вызывающий код.
+        """
+        snap = self._snapshot
+        now = time.monotonic()
+        wanted = sorted({sym for sym in symbols if (snap is None or sym not in snap.rates)
+                         and self._unknown.get(sym, 0.0) <= now})
+        if not wanted:
+            MISSING_SYMBOL_TOTAL.inc(action="negative_cache")
+            return
+        if not self.is_leader:
+            self._wait_for_leader(wanted)
+            return
+
+        if snap is not None and self.ref_base == "USD":
+            try:
+                targeted = self._refresh_flight.do(lambda: self._refresh_symbols(wanted), key=tuple(wanted))
+            except RateLimited as e:
+                # Собственный лимит частоты: символ, возможно, есть — просто не сейчас
+                MISSING_SYMBOL_TOTAL.inc(action="rate_limited")
+                logger.info("Нет курсов для %s: %s", ", ".join(wanted), e)
+                return
+            if targeted:
+                MISSING_SYMBOL_TOTAL.inc(action="targeted")
+                self._remember_unknown(wanted)
+                return
+        if snap is not None and now - self._last_full_refresh < self.missing_refresh_interval:
+            MISSING_SYMBOL_TOTAL.inc(action="rate_limited")
+            logger.info("Нет курсов для %s; полное обновление было %.0f с назад — не повторяю",
+                        ", ".join(wanted), now - self._last_full_refresh)
+            return
+        MISSING_SYMBOL_TOTAL.inc(action="full")
+        logger.info("В БД нет курсов для %s — выполняю принудительное обновление…", ", ".join(wanted))
+        self.update_rates(force=True)
+        if self._last_refresh_complete:
+            self._remember_unknown(wanted)
+
+    def _remember_unknown(self, symbols: List[str], ttl: Optional[float] = None) -> None:
+        ttl = self.unknown_symbol_ttl if ttl is None else ttl
+        snap = self._snapshot
+        unknown = [sym for sym in symbols if snap is None or sym not in snap.rates]
+        if not unknown:
+            return
+        now = time.monotonic()
+        # Запросы из разных потоков пишут в кэш одновременно: перебор словаря без замка мог бы
+        # застать его посреди вставки (RuntimeError: dictionary changed size during iteration)
+        with self.lock:
+            if len(self._unknown) + len(unknown) > UNKNOWN_SYMBOL_CACHE:
+                # Перебор случайных кодов не должен раздувать кэш: сначала выбрасываем истёкшие
+                self._unknown = {sym: exp for sym, exp in self._unknown.items() if exp > now}
+                if len(self._unknown) + len(unknown) > UNKNOWN_SYMBOL_CACHE:
+                    self._unknown = {}
+            for sym in unknown:
+                self._unknown[sym] = now + ttl
+        logger.info("Курсов %s нет у провайдеров — не запрашиваю их %.0f с", ", ".join(unknown), ttl)
+
+    # --- подписка на смену снимка ---
+
+    def add_listener(self, fn: Callable[[Optional[RateSnapshot], RateSnapshot], None]) -> None:
+        """fn(prev, new) вызывается после каждой подмены снимка — в потоке, который её выполнил."""
+        with self.lock:
+            self._listeners = [*self._listeners, fn]
+
+    def remove_listener(self, fn: Callable[[Optional[RateSnapshot], RateSnapshot], None]) -> None:
+        with self.lock:
+            self._listeners = [f for f in self._listeners if f is not fn]
+
+    def _notify(self, prev: Optional[RateSnapshot], snap: RateSnapshot) -> None:
+        for fn in self._listeners:
+            try:
+                fn(prev, snap)
+            except Exception as e:
+                logger.warning("Подписчик на обновление курсов завершился с ошибкой: %s", e)
+
+    def register_metrics(self, registry: Registry = REGISTRY) -> None:
+        """Метрики, которые вычисляются из состояния этого ядра при каждом снятии:
+        возраст и версия снимка, лидерство, попадания в кэш распознавания кодов, автоматы провайдеров."""
+        def snapshot_state() -> Dict[Tuple[str, ...], float]:
+            snap = self._snapshot
+            if snap is None:
+                return {}
+            return {("age",): snap.age().total_seconds(), ("version",): snap.version,
+                    ("symbols",): len(snap.rates), ("until_stale",): self._seconds_until_stale()}
+
+        def resolver_cache() -> Dict[Tuple[str, ...], float]:
+            values: Dict[Tuple[str, ...], float] = {}
+            for name in ("normalize", "parse_pair"):
+                info = getattr(self.resolver, name).cache_info()
+                values[(name, "hit")] = info.hits
+                values[(name, "miss")] = info.misses
+            return values
+
+        registry.gauge("converter_snapshot", "Состояние снимка курсов: age — возраст (с), version — номер, "
+                       "symbols — число активов, until_stale — секунд до устаревания", ["field"], fn=snapshot_state)
+        registry.gauge("converter_leader", "1 — процесс сам обновляет курсы (ведущий)",
+                       fn=lambda: {(): 1 if self.is_leader else 0})
+        def breakers() -> Dict[Tuple[str, ...], float]:
+            values: Dict[Tuple[str, ...], float] = {}
+            for provider in self.registry or default_registry():
+                state = provider.breaker.state
+                for name in ("closed", "half_open", "open"):
+                    values[(provider.name, name)] = 1 if name == state else 0
+            return values
 
-    def convert(self, from_code: str, to_code: str, amount: Decimal = Decimal("1")) -> ConversionResult:
-        a = normalize_code(from_code)
-        b = normalize_code(to_code)
+        registry.gauge("converter_provider_breaker", "Автомат провайдера: 1 — в текущем состоянии "
+                       "(closed — работает, open — отключён после ошибок, half_open — ждёт пробного запроса)",
+                       ["provider", "state"], fn=breakers)
+        registry.counter("converter_resolver_cache_total", "Обращения к LRU-кэшу распознавания кодов",
+                         ["cache", "result"], fn=resolver_cache)
+        if self.assets is not None:
+            assets = self.assets
+            registry.gauge("converter_assets", "Криптоактивы: known — в справочнике, demanded — со спросом, "
+                           "due — ждут обновления курса", ["state"],
+                           fn=lambda: {("known",): len(assets.ids), ("demanded",): len(assets.demanded()),
+                                       ("due",): len(assets.due())})
+
+    def _seconds_until_stale(self) -> float:
+        snap = self._snapshot
+        if snap is None:
+            return 0.0
+        return (self.auto_update_age - snap.age()).total_seconds()
+
+    def start_background_refresh(self, **scheduler_kwargs) -> RefreshScheduler:
+        """Запускает фоновый планировщик: курсы обновляются по возрасту снимка, запросы не ждут провайдеров.
+
+        В процессе-читателе общего снимка планировщик создаётся, но запускается, только когда
+        процесс станет ведущим."""
+        self._background_wanted = True
+        if self._scheduler is None:
+            self._scheduler = RefreshScheduler(self.update_rates, self._seconds_until_stale, **scheduler_kwargs)
+        if self.assets is not None and self._assets_scheduler is None:
+            self._assets_scheduler = RefreshScheduler(self.refresh_assets, self.assets.seconds_until_due,
+                                                      **scheduler_kwargs)
+        if self.is_leader:
+            self._scheduler.start()
+            if self._assets_scheduler is not None:
+                self._assets_scheduler.start()
+        return self._scheduler
+
+    def stop_background_refresh(self) -> None:
+        self._background_wanted = False
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        if self._assets_scheduler is not None:
+            self._assets_scheduler.stop()
+
+    def refresh_assets(self) -> None:
+        """Шаг фонового обновления криптоактивов: справочник тикеров (раз в неделю) и курсы монет
+        со спросом, у которых истёк период обновления — одним пакетным запросом на пачку id."""
+        assets = self.assets
+        if assets.list_stale and assets.load_coin_list():
+            self.resolver.clear_cache()
+        due = [sym for sym in assets.due() if assets.covers(sym)]
+        if due and self.ref_base == "USD":
+            self._refresh_flight.do(lambda: self._refresh_symbols(due), key=tuple(due))
+
+    def refresh_in_background(self) -> None:
+        """stale-while-revalidate: инициирует обновление и сразу возвращает управление."""
+        if not self.is_leader:
+            return  # курсы обновит ведущий процесс, читатель подхватит их из общего снимка
+        if self._scheduler is not None and self._scheduler.running:
+            self._scheduler.trigger()
+            return
+        if self._refresh_flight.in_flight:
+            return
+        threading.Thread(target=self._background_refresh, name="rates-refresh-once", daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self.update_rates(force=False)
+        except Exception as e:
+            logger.warning("Фоновое обновление курсов не удалось: %s", e)
+
+    def _convert_cached(self, a: str, b: str, amount: Decimal) -> Optional[ConversionResult]:
+        """Конвертация только по текущему снимку; None — если без похода к провайдерам не обойтись."""
+        snap = self._snapshot
+        if snap is None or a not in snap.rates or b not in snap.rates:
+            return None
+        if self._is_stale(snap):
+            # Отдаём устаревший снимок, обновление идёт в фоне
+            self.refresh_in_background()
+
+        rate = snap.cross[a][b]
+        result_amount = round_minor(amount * rate, self.result_quantum(b))
+        return ConversionResult(base=a, quote=b, amount=amount, rate=rate, result=result_amount,
+                                fetched_at=snap.fetched_at, source=snap.source)
+
+    def result_quantum(self, code: str) -> Decimal:
+        """Шаг округления суммы в code — минимальная единица актива (цент, иена, сатоши…)."""
+        crypto = code in COINGECKO_IDS or (self.assets is not None and self.assets.covers(code))
+        return minor_quantum(code, crypto)
+
+    def convert(self, from_code: str, to_code: str, amount: Decimal = Decimal("1"),
+                at: Optional[datetime] = None) -> ConversionResult:
+        a = self.resolver.normalize(from_code)
+        b = self.resolver.normalize(to_code)
         if not a or not b:
             raise ValueError("Не удалось распознать коды валют")
+        if at is not None:
+            with CONVERT_SECONDS.time(path="history"):
+                return self._convert_at(a, b, amount, at)
+        if self.assets is not None:
+            self.assets.touch(a)
+            self.assets.touch(b)
 
-        self.update_rates(force=False)
+        t0 = time.perf_counter()
+        res = self._convert_cached(a, b, amount)
+        if res is not None:
+            _CONVERT_SNAPSHOT.observe(time.perf_counter() - t0)
+            return res
 
-        with self.lock:
-            rates = _get_two_rates(self.conn, self.ref_base, a, b)
-            meta = _last_fetch_meta(self.conn, self.ref_base)
+        self.ensure_symbols((a, b))
+        res = self._convert_cached(a, b, amount)
+        if res is None:
+            snap = self._snapshot
+            missing = [sym for sym in (a, b) if snap is None or sym not in snap.rates]
+            raise ValueError(f"Курс(ы) {', '.join(missing)!r} недоступен(ы) у провайдера")
+        _CONVERT_REFRESH.observe(time.perf_counter() - t0)
+        return res
 
-        missing = [sym for sym in (a, b) if sym != self.ref_base and sym not in rates]
+    def _convert_at(self, a: str, b: str, amount: Decimal, at: datetime) -> ConversionResult:
+        """Конвертация по историческому курсу: последний снимок не позже at."""
+        found = self.storage.rates_as_of(self.ref_base, {a, b} - {self.ref_base}, at)
+        missing = [sym for sym in (a, b) if sym != self.ref_base and sym not in found]
         if missing:
-            logger.info("В БД нет курсов для %s — выполняю принудительное обновление…", ", ".join(missing))
-            self.update_rates(force=True)
-            with self.lock:
-                rates = _get_two_rates(self.conn, self.ref_base, a, b)
-                meta = _last_fetch_meta(self.conn, self.ref_base)
-            missing = [sym for sym in (a, b) if sym != self.ref_base and sym not in rates]
-            if missing:
-                raise ValueError(f"Курс(ы) {', '.join(missing)!r} недоступен(ы) у провайдера")
-
-        if a == b:
-            rate = Decimal("1")
-        elif a == self.ref_base:
-            rate = rates[b]
-        elif b == self.ref_base:
-            rate = (Decimal("1") / rates[a])
-        else:
-            rate = (rates[b] / rates[a])
+            raise ValueError(f"Нет исторического курса {', '.join(missing)!r} на {at.isoformat()}")
+
+        rates = {sym: rate for sym, (rate, _, _) in found.items()}
+        rates[self.ref_base] = Decimal("1")
+        ts, source = max(((fetched, src) for _, fetched, src in found.values()), default=(_as_epoch(at), "history"))
+        rate = cross_rate(rates, self.ref_base, a, b)
+        result_amount = round_minor(amount * rate, self.result_quantum(b))
+        return ConversionResult(base=a, quote=b, amount=amount, rate=rate, result=result_amount,
+                                fetched_at=_from_epoch(ts), source=source)
+
+    async def aconvert(self, from_code: str, to_code: str, amount: Decimal = Decimal("1"),
+                       timeout: Optional[float] = None, at: Optional[datetime] = None,
+                       admit: Optional[Callable[[], AsyncContextManager[None]]] = None) -> ConversionResult:
+        """Асинхронная конвертация: из снимка — прямо в event loop, с I/O — в ограниченном пуле потоков.
+
+        admit — контроль допуска вызывающего кода (например, IoLimiter.slot): в него оборачивается
+        только работа с I/O, конвертация из снимка выполняется без него."""
+        a = self.resolver.normalize(from_code)
+        b = self.resolver.normalize(to_code)
+        if not a or not b:
+            raise ValueError("Не удалось распознать коды валют")
+
+        if at is None:
+            if self.assets is not None:
+                self.assets.touch(a)
+                self.assets.touch(b)
+            t0 = time.perf_counter()
+            res = self._convert_cached(a, b, amount)
+            if res is not None:
+                _CONVERT_SNAPSHOT.observe(time.perf_counter() - t0)
+                return res
+        return await self._offload(self.convert, a, b, amount, at, timeout=timeout, admit=admit)
 
-        result_amount = (amount * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        fetched_at = _from_epoch(meta[0]) if meta else _utcnow()
-        source = meta[1] if meta else "unknown"
+    async def achanges_since(self, version: int, timeout: Optional[float] = None,
+                             admit: Optional[Callable[[], AsyncContextManager[None]]] = None
+                             ) -> Tuple[int, Dict[str, Decimal]]:
+        """changes_since для event loop: актуальная версия — из памяти, остальное (чтение SQLite
+        и разбор курсов) — в пуле потоков под admit."""
+        snap = self._snapshot
+        if snap is not None and version == snap.version:
+            return snap.version, {}
+        return await self._offload(self.changes_since, version, timeout=timeout, admit=admit)
 
-        return ConversionResult(base=a, quote=b, amount=amount, rate=rate, result=result_amount, fetched_at=fetched_at,
-                                source=source)
+    async def _offload(self, fn, *args, timeout: Optional[float] = None,
+                       admit: Optional[Callable[[], AsyncContextManager[None]]] = None):
+        import asyncio
+
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="converter-io")
+        loop = asyncio.get_running_loop()
+        if admit is None:
+            return await asyncio.wait_for(loop.run_in_executor(self._io_executor, fn, *args), timeout)
+
+        slot = admit()
+        await slot.__aenter__()
+        try:
+            fut = loop.run_in_executor(self._io_executor, fn, *args)
+        except BaseException:
+            await slot.__aexit__(None, None, None)
+            raise
+
+        def finished(f) -> None:
+            # Слот освобождается, когда задача в пуле действительно закончилась, а не по таймауту
+            # ожидания: поток пула отменить нельзя, и иначе при перегрузке очередь пула росла бы
+            # без предела в обход контроля допуска
+            if not f.cancelled():
+                f.exception()  # результат брошенной по таймауту задачи уже никому не нужен
+            loop.create_task(slot.__aexit__(None, None, None))
+
+        fut.add_done_callback(finished)
+        return await asyncio.wait_for(asyncio.shield(fut), timeout)
 
     def convert_pair_string(self, pair: str, amount: Decimal = Decimal("1")) -> Dict[str, object]:
-        a, b = parse_pair(pair)
-        res = self.convert(a, b, amount=amount)
-        return {
-            "base": res.base,
-            "quote": res.quote,
-            "amount": str(res.amount),
-            "rate": str(res.rate),
-            "result": str(res.result),
-            "fetched_at": res.fetched_at.isoformat(),
-            "source": res.source,
-        }
+        a, b = self.resolver.parse_pair(pair)
+        return self.convert(a, b, amount=amount).as_dict()
 
-    def close(self) -> None:
-        with self.lock:
+    def convert_batch(self, items: Iterable[Tuple[str, str, Decimal]]) -> List[Union[ConversionResult, ValueError]]:
+        """Пакетная конвертация по одному снимку курсов.
+
+        Каждый код распознаётся один раз, кросс-курс берётся из матрицы снимка,
+        недостающие символы — не более одного принудительного обновления на весь пакет.
+        Ошибки возвращаются на месте соответствующего элемента.
+        """
+        t0 = time.perf_counter()
+        codes: Dict[str, str] = {}
+        parsed: List[Union[Tuple[str, str, Decimal], ValueError]] = []
+        for base, quote, amount in items:
             try:
-                self.conn.close()
-            except Exception:
-                pass
+                pair = []
+                for raw in (base, quote):
+                    code = codes.get(raw)
+                    if code is None:
+                        code = codes[raw] = self.resolver.normalize(raw)
+                    pair.append(code)
+                if not pair[0] or not pair[1]:
+                    raise ValueError("Не удалось распознать коды валют")
+                parsed.append((pair[0], pair[1], amount))
+            except ValueError as e:
+                parsed.append(e)
+
+        snap = self._snapshot
+        needed = {sym for item in parsed if not isinstance(item, ValueError) for sym in item[:2]}
+        if self.assets is not None:
+            for sym in needed:
+                self.assets.touch(sym)
+        if snap is None or not needed.issubset(snap.rates.keys()):
+            self.ensure_symbols(needed)
+            snap = self._snapshot
+        elif self._is_stale(snap):
+            self.refresh_in_background()
+
+        cross = snap.cross if snap is not None else {}
+        results: List[Union[ConversionResult, ValueError]] = []
+        for item in parsed:
+            if isinstance(item, ValueError):
+                results.append(item)
+                continue
+            a, b, amount = item
+            row = cross.get(a)
+            rate = row.get(b) if row is not None else None
+            if rate is None:
+                missing = [sym for sym in (a, b) if sym not in cross]
+                results.append(ValueError(f"Курс(ы) {', '.join(missing)!r} недоступен(ы) у провайдера"))
+                continue
+            try:
+                result_amount = round_minor(amount * rate, self.result_quantum(b))
+            except ArithmeticError:
+                # Переполнение контекста Decimal — ошибка этого элемента, а не всего пакета
+                results.append(ValueError("Сумма вне допустимого диапазона"))
+                continue
+            results.append(ConversionResult(base=a, quote=b, amount=amount, rate=rate, result=result_amount,
+                                            fetched_at=snap.fetched_at, source=snap.source))
+        _CONVERT_BATCH.observe(time.perf_counter() - t0)
+        return results
+
+    async def aconvert_batch(self, items: Iterable[Tuple[str, str, Decimal]], timeout: Optional[float] = None,
+                             admit: Optional[Callable[[], AsyncContextManager[None]]] = None
+                             ) -> List[Union[ConversionResult, ValueError]]:
+        return await self._offload(self.convert_batch, list(items), timeout=timeout, admit=admit)
+
+    def rates_row(self, base_code: str) -> Tuple[str, RateSnapshot, Mapping[str, Decimal]]:
+        """Строка матрицы кросс-курсов: одна валюта против всех остальных."""
+        a = self.resolver.normalize(base_code)
+        snap = self._snapshot
+        if snap is None or a not in snap.cross:
+            raise ValueError(f"Курс {a or base_code!r} недоступен у провайдера")
+        if self._is_stale(snap):
+            self.refresh_in_background()
+        return a, snap, snap.cross[a]
+
+    def prune_history(self, before: datetime) -> int:
+        return self.storage.prune_history(before, base=self.ref_base)
+
+    def import_ecb_history(self, source: str | Path = "full", batch_days: int = IMPORT_BATCH_DAYS) -> Tuple[int, int]:
+        """Загрузить архив курсов ЕЦБ в историю (для конвертаций с at=): файл .xml/.csv/.zip,
+        URL или "90d"/"full". Текущий снимок не меняется. Возвращает (дней, строк)."""
+        from .ecb import iter_source, rebased_days
+
+        days, rows = self.storage.import_history(self.ref_base, rebased_days(iter_source(source), self.ref_base),
+                                                 source="ECB", batch_days=batch_days)
+        logger.info("Импортирована история ЕЦБ: дней %d, курсов %d", days, rows)
+        return days, rows
+
+    def close(self) -> None:
+        self.stop_background_refresh()
+        if self._shared is not None:
+            self._follow_stop.set()
+            if self._follower is not None:
+                self._follower.join(self.shared_poll_interval + 1)
+            self._shared.close()
+        if self._io_executor is not None:
+            self._io_executor.shutdown(wait=False)
+        self.storage.close()
 
 
 def fetch_usd_like_base(base: str) -> Tuple[Dict[str, Decimal], str]:
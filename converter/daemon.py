@@ -0,0 +1,223 @@
+from __future__ import annotations
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from .core import ConverterCore
+
+# Долгоживущий процесс конвертации для скриптов и cron: держит снимок курсов в памяти
+# и отвечает по Unix-сокету, так что вызов из shell не платит за импорт ядра, открытие БД
+# и загрузку курсов. Клиентская часть модуля не импортирует ядро — только сокет и Decimal.
+#
+# Протокол — строки UTF-8, поля разделены табуляцией, по строке ответа на строку запроса
+# (запросы можно слать пачкой по одному соединению):
+#   PING                      -> OK  PONG
+#   STATUS                    -> OK  <version> <fetched_at> <source>
+#   CONVERT <pair> <amount>   -> OK  <base> <quote> <amount> <rate> <result> <fetched_at> <source>
+#   ошибка                    -> ERR <сообщение>
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE = 4096
+CLIENT_TIMEOUT = 5.0
+
+
+def default_socket_path() -> Path:
+    env = os.environ.get("CONVERTER_SOCKET")
+    if env:
+        return Path(env)
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "vault-converter.sock"
+    return Path(tempfile.gettempdir()) / f"vault-converter-{os.getuid() if hasattr(os, 'getuid') else 0}.sock"
+
+
+def _clean(value: object) -> str:
+    return str(value).replace("\t", " ").replace("\n", " ").replace("\r", " ")
+
+
+# ------------------------- сервер -------------------------
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        daemon: ConversionDaemon = self.server.converter_daemon
+        while True:
+            raw = self.rfile.readline(MAX_LINE + 1)
+            if not raw:
+                return
+            if len(raw) > MAX_LINE:
+                self.wfile.write("ERR\tСлишком длинная строка\n".encode("utf-8"))
+                return
+            reply = daemon.handle_line(raw.decode("utf-8", "replace").rstrip("\r\n"))
+            self.wfile.write(reply.encode("utf-8"))
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ConversionDaemon:
+    """Сервер протокола поверх уже созданного ConverterCore."""
+
+    def __init__(self, core: "ConverterCore", path: Optional[str | Path] = None) -> None:
+        self.core = core
+        self.path = Path(path) if path is not None else default_socket_path()
+        self._server: Optional[_Server] = None
+
+    def handle_line(self, line: str) -> str:
+        fields = line.split("\t")
+        cmd = fields[0].strip().upper()
+        try:
+            if cmd == "PING":
+                return "OK\tPONG\n"
+            if cmd == "STATUS":
+                snap = self.core.snapshot
+                if snap is None:
+                    raise ValueError("Курсы ещё загружаются")
+                return f"OK\t{snap.version}\t{snap.fetched_at.isoformat()}\t{_clean(snap.source)}\n"
+            if cmd == "CONVERT" and len(fields) == 3:
+                try:
+                    amount = Decimal(fields[2].strip().replace(",", "."))
+                except InvalidOperation:
+                    raise ValueError("Некорректная сумма") from None
+                if not amount.is_finite() or amount <= 0:
+                    raise ValueError("Некорректная сумма")
+                a, b = self.core.resolver.parse_pair(fields[1])
+                res = self.core.convert(a, b, amount=amount)
+                return "\t".join(["OK", res.base, res.quote, str(res.amount), str(res.rate), str(res.result),
+                                  res.fetched_at.isoformat(), _clean(res.source)]) + "\n"
+            raise ValueError(f"Неизвестная команда: {_clean(line[:40])!r}")
+        except Exception as e:
+            return f"ERR\t{_clean(e)}\n"
+
+    def bind(self) -> None:
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError("Unix-сокеты не поддерживаются на этой платформе")
+        if self.path.exists():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(str(self.path))
+            except OSError:
+                self.path.unlink()  # сокет остался от упавшего процесса
+            else:
+                raise RuntimeError(f"Демон уже запущен: {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        old_umask = os.umask(0o177)  # сокет доступен только владельцу
+        try:
+            self._server = _Server(str(self.path), _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.converter_daemon = self
+
+    def serve_forever(self) -> None:
+        if self._server is None:
+            self.bind()
+        self.core.start_background_refresh()
+        logger.info("Демон конвертации слушает %s", self.path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def start(self) -> threading.Thread:
+        """serve_forever в фоновом потоке (для тестов и встраивания)."""
+        self.bind()
+        thread = threading.Thread(target=self.serve_forever, name="converter-daemon", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+
+# ------------------------- клиент -------------------------
+
+class DaemonUnavailable(ConnectionError):
+    """Демон не запущен или не отвечает — вызывающий код может посчитать сам."""
+
+
+@dataclass(frozen=True)
+class RemoteResult:
+    """Ответ демона; поля те же, что у ConversionResult."""
+    base: str
+    quote: str
+    amount: Decimal
+    rate: Decimal
+    result: Decimal
+    fetched_at: datetime
+    source: str
+
+
+class DaemonClient:
+    def __init__(self, path: Optional[str | Path] = None, timeout: float = CLIENT_TIMEOUT) -> None:
+        self.path = Path(path) if path is not None else default_socket_path()
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+
+    def _connect(self) -> None:
+        if not hasattr(socket, "AF_UNIX"):
+            raise DaemonUnavailable("Unix-сокеты не поддерживаются")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(str(self.path))
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"Демон недоступен ({self.path}): {e}") from e
+        self._sock, self._rfile = sock, sock.makefile("rb")
+
+    def request(self, *fields: str) -> List[str]:
+        """Один запрос — одна строка ответа; ValueError, если демон ответил ERR."""
+        if self._sock is None:
+            self._connect()
+        try:
+            self._sock.sendall(("\t".join(_clean(f) for f in fields) + "\n").encode("utf-8"))
+            line = self._rfile.readline(MAX_LINE * 2)
+        except OSError as e:
+            self.close()
+            raise DaemonUnavailable(f"Демон не ответил: {e}") from e
+        if not line:
+            self.close()
+            raise DaemonUnavailable("Демон закрыл соединение")
+        status, *rest = line.decode("utf-8").rstrip("\n").split("\t")
+        if status != "OK":
+            raise ValueError(rest[0] if rest else "Ошибка демона")
+        return rest
+
+    def ping(self) -> bool:
+        try:
+            return self.request("PING") == ["PONG"]
+        except (DaemonUnavailable, ValueError):
+            return False
+
+    def convert(self, pair: str, amount: Decimal) -> RemoteResult:
+        base, quote, amt, rate, result, fetched_at, source = self.request("CONVERT", pair, str(amount))
+        return RemoteResult(base, quote, Decimal(amt), Decimal(rate), Decimal(result),
+                            datetime.fromisoformat(fetched_at), source)
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+            self._sock = self._rfile = None
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import codecs
+import csv
+import logging
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, time, timezone
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import IO, Dict, Iterator, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Архивы курсов ЕЦБ: ежедневный файл, 90 дней и вся история с 1999 года.
+# XML — <Cube time="YYYY-MM-DD"><Cube currency="USD" rate="1.0856"/>…</Cube>, по дню на элемент;
+# zip содержит CSV «Date, USD, JPY, …» с N/A на месте отсутствующих курсов.
+ECB_DAILY_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+ECB_90D_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist-90d.xml"
+ECB_HIST_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist.zip"
+ECB_SOURCES = {"daily": ECB_DAILY_URL, "90d": ECB_90D_URL, "full": ECB_HIST_URL}
+
+# Курсы ЕЦБ публикуются около 16:00 CET/CEST (14:00–15:00 UTC). В истории день помечается
+# 16:00 UTC — после публикации в любое время года, чтобы запрос at= не получил курс раньше,
+# чем его опубликовали.
+ECB_PUBLISH_TIME = time(16, 0, tzinfo=timezone.utc)
+
+DOWNLOAD_CHUNK = 1 << 16
+
+EcbDay = Tuple[date, Dict[str, Decimal]]
+
+
+def ecb_timestamp(day: date) -> datetime:
+    return datetime.combine(day, ECB_PUBLISH_TIME)
+
+
+def rebase(eur_to: Mapping[str, Decimal], base: str) -> Dict[str, Decimal]:
+    """Курсы EUR->X -> base->X (base->X = (EUR->X) / (EUR->base))."""
+    rates = dict(eur_to)
+    rates["EUR"] = Decimal("1")
+    if base not in rates:
+        raise KeyError(base)
+    divisor = rates[base]
+    rebased = {sym: rate / divisor for sym, rate in rates.items()}
+    rebased[base] = Decimal("1")
+    return rebased
+
+
+def iter_xml(stream: IO[bytes]) -> Iterator[EcbDay]:
+    """Дни из XML ЕЦБ по мере чтения: iterparse, разобранные элементы сразу удаляются из дерева,
+    так что память не зависит от длины файла."""
+    import xml.etree.ElementTree as ET
+
+    container = None  # внешний <Cube> без атрибутов, в который складываются дни
+    day: Optional[date] = None
+    eur_to: Dict[str, Decimal] = {}
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if not elem.tag.endswith("Cube"):
+            continue
+        if event == "start":
+            if "time" in elem.attrib:
+                day, eur_to = date.fromisoformat(elem.attrib["time"]), {}
+            elif "currency" not in elem.attrib and container is None:
+                container = elem
+            continue
+        currency = elem.attrib.get("currency")
+        if currency and day is not None:
+            eur_to[currency.upper()] = Decimal(elem.attrib["rate"])
+        elif "time" in elem.attrib:
+            if eur_to:
+                yield day, eur_to
+            day = None
+            if container is not None:
+                container.clear()
+
+
+def iter_csv(stream: IO[bytes]) -> Iterator[EcbDay]:
+    """Дни из CSV ЕЦБ (eurofxref-hist.csv) построчно."""
+    reader = csv.reader(codecs.getreader("utf-8-sig")(stream))
+    header = next(reader, None)
+    if not header or header[0].strip().lower() != "date":
+        raise ValueError("Неизвестный формат CSV ЕЦБ: нет колонки Date")
+    currencies = [c.strip().upper() for c in header[1:]]
+    for row in reader:
+        if not row or not row[0].strip():
+            continue
+        eur_to: Dict[str, Decimal] = {}
+        for sym, raw in zip(currencies, row[1:]):
+            raw = raw.strip()
+            if not sym or not raw or raw == "N/A":
+                continue
+            try:
+                eur_to[sym] = Decimal(raw)
+            except InvalidOperation:
+                raise ValueError(f"Некорректный курс {sym} за {row[0].strip()}: {raw!r}") from None
+        if eur_to:
+            yield date.fromisoformat(row[0].strip()), eur_to
+
+
+def iter_file(path: str | Path) -> Iterator[EcbDay]:
+    """Дни из локального файла ЕЦБ: .xml, .csv или .zip с одним из них внутри."""
+    path = Path(path)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            names = [n for n in zf.namelist() if n.lower().endswith((".csv", ".xml"))]
+            if not names:
+                raise ValueError(f"В архиве {path} нет CSV или XML ЕЦБ")
+            with zf.open(names[0]) as member:
+                yield from (iter_xml(member) if names[0].lower().endswith(".xml") else iter_csv(member))
+        return
+    with open(path, "rb") as f:
+        head = f.read(64).lstrip()
+        f.seek(0)
+        yield from (iter_xml(f) if head.startswith(b"<") else iter_csv(f))
+
+
+def iter_source(source: str | Path, timeout: float = 60.0) -> Iterator[EcbDay]:
+    """Дни из файла, URL или именованного архива ЕЦБ ("daily", "90d", "full").
+
+    Ответ по URL пишется во временный файл кусками (zip читается с конца, его нельзя разобрать
+    из потока), а затем разбирается как локальный.
+    """
+    url = ECB_SOURCES.get(str(source), str(source))
+    if not url.startswith(("http://", "https://")):
+        yield from iter_file(source)
+        return
+    from urllib.request import Request, urlopen
+
+    from .providers import USER_AGENT
+
+    with tempfile.NamedTemporaryFile(suffix=Path(url).suffix) as tmp:
+        logger.info("Загрузка %s", url)
+        with urlopen(Request(url, headers={"User-Agent": USER_AGENT}), timeout=timeout) as resp:
+            shutil.copyfileobj(resp, tmp, DOWNLOAD_CHUNK)
+        tmp.flush()
+        yield from iter_file(tmp.name)
+
+
+def rebased_days(days: Iterator[EcbDay], base: str) -> Iterator[Tuple[datetime, Dict[str, Decimal]]]:
+    """(момент публикации, курсы base->X) по дням; дни без курса base пропускаются."""
+    skipped = 0
+    for day, eur_to in days:
+        try:
+            yield ecb_timestamp(day), rebase(eur_to, base)
+        except KeyError:
+            skipped += 1
+    if skipped:
+        logger.warning("Пропущено дней без курса %s: %d", base, skipped)
+
+
+def latest_usd_rates(body: bytes) -> Dict[str, Decimal]:
+    """Курсы USD->X из ежедневного XML ЕЦБ (ECBProvider)."""
+    import io
+
+    days = list(iter_xml(io.BytesIO(body)))
+    if not days:
+        raise RuntimeError("В ответе ЕЦБ нет курсов")
+    _, eur_to = max(days, key=lambda d: d[0])
+    try:
+        return rebase(eur_to, "USD")
+    except KeyError:
+        raise RuntimeError("В ответе ЕЦБ нет USD") from None
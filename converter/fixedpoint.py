@@ -0,0 +1,144 @@
+"""Минимальные единицы активов, округление результатов до них и компактная таблица курсов.
+
+Конвертации считаются в Decimal (ConverterCore, BulkConverter) и округляются round_minor.
+FixedRates — только формат хранения и обмена курсами (общий снимок между процессами,
+см. shared.py): на пути конвертации его арифметика не используется.
+"""
+from __future__ import annotations
+import struct
+from array import array
+from decimal import ROUND_HALF_UP, Decimal, getcontext
+from functools import lru_cache
+from typing import Dict, Iterator, List, Mapping, Tuple
+
+# Число знаков после запятой в минимальной единице актива (ISO 4217 для фиата;
+# для крипты — сатоши, wei и т.п.). Не перечисленный фиат — 2 знака, крипта — 8.
+MINOR_UNITS: Dict[str, int] = {
+    "JPY": 0, "KRW": 0, "ISK": 0, "CLP": 0, "VND": 0, "HUF": 2,
+    "KWD": 3, "BHD": 3, "OMR": 3, "JOD": 3, "TND": 3, "LYD": 3, "IQD": 3,
+    "BTC": 8, "LTC": 8, "BCH": 8, "DOGE": 8,
+    "ETH": 18, "BNB": 18, "MATIC": 18,
+    "USDT": 6, "USDC": 6, "SOL": 9, "TON": 9, "TRX": 6, "XRP": 6, "ADA": 6, "DOT": 10,
+}
+DEFAULT_MINOR_UNITS = 2
+DEFAULT_CRYPTO_MINOR_UNITS = 8
+
+# Мантисса курса — знаковое 128-битное целое: до 38 значащих цифр, с запасом больше
+# 28 цифр контекста Decimal по умолчанию, поэтому курс хранится без округления.
+RATE_DIGITS = 38
+_MASK64 = (1 << 64) - 1
+_LIMIT = 10 ** RATE_DIGITS
+
+
+def minor_units(code: str, crypto: bool = False) -> int:
+    return MINOR_UNITS.get(code, DEFAULT_CRYPTO_MINOR_UNITS if crypto else DEFAULT_MINOR_UNITS)
+
+
+@lru_cache(maxsize=4096)
+def minor_quantum(code: str, crypto: bool = False) -> Decimal:
+    """Минимальная единица актива как шаг для quantize: 0.01 для USD, 1 для JPY, 1E-8 для BTC."""
+    return Decimal(1).scaleb(-minor_units(code, crypto))
+
+
+def round_minor(value: Decimal, quantum: Decimal) -> Decimal:
+    """ROUND_HALF_UP до минимальной единицы quantum (см. minor_quantum).
+
+    Если столько знаков не помещается в точность текущего контекста Decimal (крупная сумма
+    в ETH с 18 знаками после запятой), округляется до последней значащей цифры контекста:
+    произведение всё равно посчитано с этой точностью, а quantize иначе бросил бы InvalidOperation.
+    """
+    prec = getcontext().prec
+    if value.adjusted() - quantum.as_tuple().exponent >= prec:
+        quantum = Decimal(1).scaleb(value.adjusted() + 1 - prec)
+    return value.quantize(quantum, rounding=ROUND_HALF_UP)
+
+
+def split_decimal(value: Decimal) -> Tuple[int, int]:
+    """Decimal -> (mantissa, exponent) без потери точности; ValueError, если не помещается в 128 бит."""
+    sign, digits, exponent = value.as_tuple()
+    if not isinstance(exponent, int):
+        raise ValueError(f"Курс должен быть конечным числом: {value}")
+    mantissa = int("".join(map(str, digits))) if digits else 0
+    if mantissa >= _LIMIT:
+        raise ValueError(f"Курс {value} длиннее {RATE_DIGITS} значащих цифр")
+    return (-mantissa if sign else mantissa), exponent
+
+
+def join_decimal(mantissa: int, exponent: int) -> Decimal:
+    # Через строку — точно при любой длине мантиссы (scaleb округлил бы до точности контекста)
+    return Decimal(f"{mantissa}E{exponent}")
+
+
+class FixedRates:
+    """Компактная таблица курсов ref->X: целочисленные мантиссы и своя точность (порядок) у каждого актива.
+
+    Мантисса хранится двумя 64-битными словами (array 'q' — старшее со знаком, 'Q' — младшее),
+    порядок — в array 'b'. Таблица сериализуется в плоский буфер фиксированного шага
+    и восстанавливается из него без разбора текста (см. pack/unpack_from).
+    """
+
+    ENTRY = struct.Struct("<8sqQb")
+    SYMBOL_LEN = 8
+
+    def __init__(self, rates: Mapping[str, Decimal] = ()) -> None:
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.hi = array("q")
+        self.lo = array("Q")
+        self.exp = array("b")
+        for sym, rate in dict(rates).items():
+            self.set(sym, rate)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, sym: str) -> bool:
+        return sym in self.index
+
+    def set(self, sym: str, rate: Decimal) -> None:
+        mantissa, exponent = split_decimal(rate)
+        self._set(sym, mantissa >> 64, mantissa & _MASK64, exponent)
+
+    def _set(self, sym: str, hi: int, lo: int, exponent: int) -> None:
+        i = self.index.get(sym)
+        if i is None:
+            if len(sym.encode("ascii")) > self.SYMBOL_LEN:
+                raise ValueError(f"Код валюты длиннее {self.SYMBOL_LEN} символов: {sym!r}")
+            self.index[sym] = len(self.symbols)
+            self.symbols.append(sym)
+            self.hi.append(hi)
+            self.lo.append(lo)
+            self.exp.append(exponent)
+        else:
+            self.hi[i], self.lo[i], self.exp[i] = hi, lo, exponent
+
+    def fixed(self, sym: str) -> Tuple[int, int]:
+        """(mantissa, exponent) курса: rate == mantissa * 10**exponent."""
+        i = self.index[sym]
+        return (self.hi[i] << 64) | self.lo[i], self.exp[i]
+
+    def rate(self, sym: str) -> Decimal:
+        return join_decimal(*self.fixed(sym))
+
+    def items(self) -> Iterator[Tuple[str, Decimal]]:
+        for sym in self.symbols:
+            yield sym, self.rate(sym)
+
+    def as_dict(self) -> Dict[str, Decimal]:
+        return dict(self.items())
+
+    # --- сериализация ---
+
+    def pack(self) -> bytes:
+        entry = self.ENTRY
+        return b"".join(entry.pack(sym.encode("ascii"), self.hi[i], self.lo[i], self.exp[i])
+                        for i, sym in enumerate(self.symbols))
+
+    @classmethod
+    def unpack_from(cls, buf, count: int, offset: int = 0) -> "FixedRates":
+        table = cls()
+        size = cls.ENTRY.size
+        with memoryview(buf) as view:
+            for sym, hi, lo, exponent in cls.ENTRY.iter_unpack(view[offset:offset + count * size]):
+                table._set(sym.rstrip(b"\0").decode("ascii"), hi, lo, exponent)
+        return table
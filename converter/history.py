@@ -0,0 +1,122 @@
+from __future__ import annotations
+import sqlite3
+from datetime import datetime, timezone
+from decimal import Context, Decimal, ROUND_HALF_EVEN
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
+# История курсов: только дописывается, по строке на (base, symbol, fetched_at).
+# Курс хранится целыми числами mantissa * 10**exponent (не TEXT), источник — ссылкой
+# на справочник. Таблица WITHOUT ROWID кластеризована по (base, symbol, fetched_at),
+# поэтому поиск «последний курс не позже момента t» — один спуск по B-дереву, O(log n).
+# Колонка day (номер суток UTC) — ключ суточной партиции для выборок и очистки.
+HISTORY_DDL = """
+CREATE TABLE IF NOT EXISTS rate_sources (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rate_history (
+    base       TEXT NOT NULL,
+    symbol     TEXT NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    day        INTEGER NOT NULL,
+    mantissa   INTEGER NOT NULL,
+    exponent   INTEGER NOT NULL,
+    source_id  INTEGER NOT NULL REFERENCES rate_sources(id),
+    PRIMARY KEY (base, symbol, fetched_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_history_day ON rate_history(day);
+"""
+
+# Значащих цифр в мантиссе: 18 гарантированно помещаются в INTEGER SQLite (int64)
+RATE_DIGITS = 18
+_RATE_CTX = Context(prec=RATE_DIGITS, rounding=ROUND_HALF_EVEN)
+
+SECONDS_PER_DAY = 86400
+
+
+def encode_rate(value: Decimal) -> Tuple[int, int]:
+    """Decimal -> (mantissa, exponent) с округлением до RATE_DIGITS значащих цифр."""
+    sign, digits, exponent = _RATE_CTX.plus(value).normalize(_RATE_CTX).as_tuple()
+    mantissa = int("".join(map(str, digits))) if digits else 0
+    return (-mantissa if sign else mantissa), exponent
+
+
+def decode_rate(mantissa: int, exponent: int) -> Decimal:
+    if exponent >= 0:
+        return Decimal(mantissa * 10 ** exponent)
+    return Decimal(mantissa).scaleb(exponent)
+
+
+def _epoch(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def init_history(conn: sqlite3.Connection) -> None:
+    conn.executescript(HISTORY_DDL)
+
+
+def _source_id(conn: sqlite3.Connection, name: str) -> int:
+    conn.execute("INSERT OR IGNORE INTO rate_sources(name) VALUES(?)", (name,))
+    return conn.execute("SELECT id FROM rate_sources WHERE name=?", (name,)).fetchone()[0]
+
+
+SQL_INSERT_HISTORY = (
+    "INSERT OR REPLACE INTO rate_history(base, symbol, fetched_at, day, mantissa, exponent, source_id) "
+    "VALUES(?,?,?,?,?,?,?)"
+)
+
+
+def append_history(conn: sqlite3.Connection, base: str, rates: Mapping[str, Decimal], source: str,
+                   fetched_at: datetime) -> None:
+    """Дописывает снимок в историю. Транзакцию фиксирует вызывающий код."""
+    append_history_many(conn, base, [(fetched_at, rates)], source)
+
+
+def append_history_many(conn: sqlite3.Connection, base: str,
+                        snapshots: Iterable[Tuple[datetime, Mapping[str, Decimal]]], source: str) -> int:
+    """Дописывает в историю несколько снимков одним executemany; строки формируются генератором,
+    без промежуточного списка. Возвращает число строк. Транзакцию фиксирует вызывающий код."""
+    sid = _source_id(conn, source)
+    count = 0
+
+    def rows() -> Iterator[Tuple[object, ...]]:
+        nonlocal count
+        for fetched_at, rates in snapshots:
+            ts = _epoch(fetched_at)
+            day = ts // SECONDS_PER_DAY
+            for sym, val in rates.items():
+                count += 1
+                yield (base, sym, ts, day, *encode_rate(val), sid)
+
+    conn.executemany(SQL_INSERT_HISTORY, rows())
+    return count
+
+
+def rates_as_of(conn: sqlite3.Connection, base: str, symbols: Iterable[str],
+                at: datetime) -> Dict[str, Tuple[Decimal, int, str]]:
+    """Для каждого символа — последний курс, полученный не позже at: {symbol: (rate, fetched_at, source)}."""
+    ts = _epoch(at)
+    found: Dict[str, Tuple[Decimal, int, str]] = {}
+    for sym in symbols:
+        row = conn.execute(
+            "SELECT h.fetched_at, h.mantissa, h.exponent, s.name FROM rate_history h "
+            "JOIN rate_sources s ON s.id = h.source_id "
+            "WHERE h.base=? AND h.symbol=? AND h.fetched_at<=? ORDER BY h.fetched_at DESC LIMIT 1",
+            (base, sym, ts),
+        ).fetchone()
+        if row:
+            found[sym] = (decode_rate(row[1], row[2]), row[0], row[3])
+    return found
+
+
+def prune_history(conn: sqlite3.Connection, before: datetime, base: Optional[str] = None) -> int:
+    """Удаляет суточные партиции строго раньше дня before. Возвращает число удалённых строк."""
+    day = _epoch(before) // SECONDS_PER_DAY
+    if base is None:
+        cur = conn.execute("DELETE FROM rate_history WHERE day < ?", (day,))
+    else:
+        cur = conn.execute("DELETE FROM rate_history WHERE day < ? AND base=?", (day, base))
+    conn.commit()
+    return cur.rowcount
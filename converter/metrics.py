@@ -0,0 +1,342 @@
+from __future__ import annotations
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Метрики процесса в текстовом формате Prometheus (exposition format 0.0.4).
+# Счётчики пишутся под собственным замком метрики (без общего замка реестра). Гистограммы —
+# на горячем пути — вовсе без замков: у каждого потока своя строка корзин, которую пишет
+# только он, а строки суммируются при снятии метрик.
+
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name}: ожидались метки {self.label_names}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _series(self, key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def labels(self, **labels: str) -> "_Bound":
+        """Метрика с заранее разобранными метками — для горячего пути."""
+        return _Bound(self, self._key(labels))
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class _Valued(_Metric):
+    """Одно число на набор меток. Значения можно не хранить, а вычислять при каждом снятии
+    метрик функцией fn (она возвращает {кортеж значений меток: число})."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 fn: Optional[Callable[[], Dict[LabelKey, float]]] = None) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelKey, float] = {}
+        self.fn = fn
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        if self.fn is not None:
+            return self.fn().get(key, self._values.get(key, 0))
+        return self._values.get(key, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self.fn is not None:
+            values.update(self.fn())
+        for key, value in values.items():
+            yield f"{self.name}{self._series(key)} {_fmt(value)}"
+
+
+class Counter(_Valued):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self._inc(self._key(labels), amount)
+
+    def _inc(self, key: LabelKey, amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Valued):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[LabelKey, _HistogramSeries] = {}
+
+    def labels(self, **labels: str) -> "_HistogramSeries":
+        return self._series_for(self._key(labels))
+
+    def _series_for(self, key: LabelKey) -> "_HistogramSeries":
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, _HistogramSeries(self.buckets))
+        return child
+
+    def observe(self, value: float, **labels: str) -> None:
+        self._series_for(self._key(labels)).observe(value)
+
+    def time(self, **labels: str) -> "_Timer":
+        return _Timer(self._series_for(self._key(labels)))
+
+    def count(self, **labels: str) -> int:
+        child = self._children.get(self._key(labels))
+        return int(sum(child.merged()[:-1])) if child else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, child.merged()) for key, child in self._children.items()]
+        for key, row in values:
+            total = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row[:-1]):
+                total += n
+                yield f"{self.name}_bucket{self._series(key, [('le', _fmt(bound))])} {total}"
+            yield f"{self.name}_sum{self._series(key)} {_fmt(row[-1])}"
+            yield f"{self.name}_count{self._series(key)} {total}"
+
+
+class _HistogramSeries:
+    """Одна серия гистограммы (набор меток): по строке [корзины…, +Inf, сумма] на поток.
+
+    Строки завершившихся потоков (демон и пулы создают их на каждое соединение) сливаются
+    в общую строку _retired — число строк не растёт с числом когда-либо живших потоков.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self._local = threading.local()
+        self._rows: List[Tuple[threading.Thread, List[float]]] = []
+        self._retired = self._empty()
+        self._lock = threading.Lock()
+
+    def _empty(self) -> List[float]:
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def _row(self) -> List[float]:
+        row = self._empty()
+        with self._lock:
+            self._fold_dead()
+            self._rows.append((threading.current_thread(), row))
+        self._local.row = row
+        return row
+
+    def _fold_dead(self) -> None:
+        # Вызывается под self._lock; завершившийся поток в свою строку больше не пишет
+        alive = []
+        for thread, row in self._rows:
+            if thread.is_alive():
+                alive.append((thread, row))
+            else:
+                self._retired = [a + b for a, b in zip(self._retired, row)]
+        self._rows = alive
+
+    def observe(self, value: float) -> None:
+        try:
+            row = self._local.row
+        except AttributeError:
+            row = self._row()
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def merged(self) -> List[float]:
+        with self._lock:
+            self._fold_dead()
+            rows = [row for _, row in self._rows] + [self._retired]
+        return [sum(col) for col in zip(*rows)]
+
+
+class _Bound:
+    __slots__ = ("metric", "key")
+
+    def __init__(self, metric: Counter, key: LabelKey) -> None:
+        self.metric = metric
+        self.key = key
+
+    def inc(self, amount: float = 1) -> None:
+        self.metric._inc(self.key, amount)
+
+
+class _Timer:
+    """with hist.time(...): — длительность блока попадает в гистограмму (и при исключении тоже)."""
+    __slots__ = ("series", "t0")
+
+    def __init__(self, series: _HistogramSeries) -> None:
+        self.series = series
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.series.observe(time.perf_counter() - self.t0)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Повторная регистрация (перезагрузка модуля, второй экземпляр) — та же метрика
+                if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                    raise ValueError(f"Метрика {metric.name} уже зарегистрирована с другим типом или метками")
+                if isinstance(metric, _Valued) and metric.fn is not None:
+                    existing.fn = metric.fn
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (),
+                fn: Optional[Callable[[], Dict[LabelKey, float]]] = None) -> Counter:
+        return self._add(Counter(name, help, labels, fn))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (),
+              fn: Optional[Callable[[], Dict[LabelKey, float]]] = None) -> Gauge:
+        return self._add(Gauge(name, help, labels, fn))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def get(self, name: str) -> _Metric:
+        return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ------------------------- профилировщик -------------------------
+
+class SamplingProfiler:
+    """Статистический профилировщик: фоновый поток раз в interval секунд снимает стеки всех
+    потоков (sys._current_frames) и считает одинаковые. Включается и выключается на ходу;
+    пока выключен, ничего не стоит. Результат — «свёрнутые» стеки (формат flamegraph.pl/speedscope)."""
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks: _Tally = _Tally()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, reset: bool = True) -> None:
+        if self.running:
+            return
+        if reset:
+            self.reset()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(skip=me)
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            parts = []
+            while frame is not None and len(parts) < self.max_depth:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stacks.append(";".join(reversed(parts)))
+        with self._lock:
+            self._stacks.update(stacks)
+            self._samples += 1
+
+    @property
+    def samples(self) -> int:
+        return self._samples
+
+    def folded(self, limit: Optional[int] = None) -> str:
+        """Строки «стек;через;точку_с_запятой N», самые частые первыми."""
+        with self._lock:
+            top = self._stacks.most_common(limit)
+        return "".join(f"{stack} {n}\n" for stack, n in top)
+
+
+PROFILER = SamplingProfiler()
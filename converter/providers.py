@@ -0,0 +1,575 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+from typing import TYPE_CHECKING, Deque, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+if TYPE_CHECKING:
+    from .assets import AssetUniverse
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "vault-converter/1.0"
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("CONVERTER_CACHE_DIR")
+    return Path(env) if env else Path.home() / ".cache" / "vault-converter"
+
+
+# ------------------------- HTTP -------------------------
+
+@dataclass
+class HttpResponse:
+    url: str
+    status: int
+    body: bytes
+    not_modified: bool = False
+
+
+class HttpClient:
+    """GET с переиспользованием соединений (keep-alive, общий пул простаивающих соединений
+    на хост: запрос берёт соединение из пула и возвращает его, из какого бы потока он ни шёл)
+    и условными запросами: ETag/Last-Modified и сырое тело ответа хранятся на диске."""
+
+    MAX_IDLE_PER_HOST = 4
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_redirects: int = 3) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_redirects = max_redirects
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    # --- соединения ---
+
+    def _checkout(self, scheme: str, netloc: str, timeout: float, fresh: bool = False) -> http.client.HTTPConnection:
+        import http.client
+
+        conn = None
+        if not fresh:
+            with self._lock:
+                idle = self._idle.get((scheme, netloc))
+                if idle:
+                    conn = idle.pop()
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = cls(netloc, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _checkin(self, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.MAX_IDLE_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    # --- дисковый кэш ---
+
+    def _cache_paths(self, url: str) -> Optional[Tuple[Path, Path]]:
+        if self.cache_dir is None:
+            return None
+        import hashlib
+
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+
+    def _load_validators(self, url: str) -> Dict[str, str]:
+        paths = self._cache_paths(url)
+        if paths is None or not paths[0].exists() or not paths[1].exists():
+            return {}
+        try:
+            return json.loads(paths[0].read_text("utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _load_body(self, url: str) -> Optional[bytes]:
+        paths = self._cache_paths(url)
+        try:
+            return paths[1].read_bytes() if paths else None
+        except OSError:
+            return None
+
+    def _store(self, url: str, headers: http.client.HTTPMessage, body: bytes) -> None:
+        paths = self._cache_paths(url)
+        if paths is None:
+            return
+        validators = {k: v for k, v in (("etag", headers.get("ETag")),
+                                        ("last_modified", headers.get("Last-Modified"))) if v}
+        if not validators:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for path, data in ((paths[1], body), (paths[0], json.dumps(validators).encode("utf-8"))):
+                tmp = path.with_suffix(path.suffix + ".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Не удалось записать HTTP-кэш %s: %s", self.cache_dir, e)
+
+    # --- запрос ---
+
+    def get(self, url: str, timeout: float = 10.0, conditional: bool = True, store: bool = True) -> HttpResponse:
+        """store=False — не сохранять ответ на диск (для URL, которые вряд ли повторятся)."""
+        validators = self._load_validators(url) if conditional else {}
+        target = url
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(target)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip", "Connection": "keep-alive"}
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+            status, resp_headers, body = self._request(parts.scheme, parts.netloc, path, headers, timeout)
+            if status in (301, 302, 303, 307, 308) and resp_headers.get("Location"):
+                target = urljoin(target, resp_headers["Location"])
+                continue
+            if status == 304:
+                cached = self._load_body(url)
+                if cached is None:
+                    return self.get(url, timeout, conditional=False)
+                return HttpResponse(url, status, cached, not_modified=True)
+            if status != 200:
+                raise RuntimeError(f"HTTP {status} от {parts.netloc}")
+            if resp_headers.get("Content-Encoding") == "gzip":
+                import gzip
+
+                body = gzip.decompress(body)
+            if store:
+                self._store(url, resp_headers, body)
+            return HttpResponse(url, status, body)
+        raise RuntimeError(f"Слишком много перенаправлений: {url}")
+
+    def _request(self, scheme: str, netloc: str, path: str, headers: Dict[str, str], timeout: float):
+        import http.client
+
+        # Одна повторная попытка на новом соединении: сервер мог закрыть простаивающее keep-alive
+        for attempt in (0, 1):
+            conn = self._checkout(scheme, netloc, timeout, fresh=bool(attempt))
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if resp.getheader("Connection", "").lower() == "close":
+                conn.close()
+            else:
+                self._checkin(scheme, netloc, conn)
+            return resp.status, resp.headers, body
+
+
+class RateLimiter:
+    """Token bucket: не больше rate_per_minute запросов в минуту с всплеском до burst.
+    Не ждёт — take() сразу отвечает, можно ли сделать запрос сейчас."""
+
+    def __init__(self, rate_per_minute: float, burst: int) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._tokens = float(burst)
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._at) * self.rate)
+            self._at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RateLimited(RuntimeError):
+    """Запрос не отправлен из-за собственного лимита частоты — это не сбой провайдера."""
+
+
+class CircuitBreaker:
+    """Состояние здоровья провайдера: ошибки подряд, задержки ответов и «автомат».
+
+    closed — провайдер работает. После failure_threshold ошибок подряд (таймаут — тоже ошибка)
+    автомат размыкается (open): провайдер пропускается сразу, без ожидания таймаута. Через
+    cooldown секунд он становится half_open и получает один пробный запрос: успех замыкает
+    автомат, ошибка снова размыкает его с удвоенной паузой (до max_cooldown).
+
+    timeout() — таймаут запроса по наблюдаемым задержкам: p99 последних успешных ответов,
+    умноженный на timeout_factor, в пределах [min_timeout, заданный таймаут].
+    """
+
+    FAILURE_THRESHOLD = 3
+    COOLDOWN = 30.0
+    MAX_COOLDOWN = 600.0
+    WINDOW = 64
+    MIN_SAMPLES = 8
+    TIMEOUT_FACTOR = 3.0
+    MIN_TIMEOUT = 2.0
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN,
+                 max_cooldown: float = MAX_COOLDOWN, min_timeout: float = MIN_TIMEOUT) -> None:
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.min_timeout = min_timeout
+        self.failures = 0  # ошибок подряд
+        self.cooldown = cooldown
+        self._opened_at: Optional[float] = None  # time.monotonic() размыкания; None — замкнут
+        self._probing = False
+        self._latencies: Deque[float] = deque(maxlen=self.WINDOW)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or now - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def acquire(self) -> bool:
+        """Можно ли отправить запрос сейчас; в half_open разрешает единственный пробный запрос."""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Запрос не состоялся (например, RateLimited) — пробный запрос можно отправить снова."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self, latency: Optional[float]) -> None:
+        """latency — время сетевого запроса; None — ответ без него (кэш, 304), в окно задержек не идёт."""
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Провайдер снова отвечает — автомат замкнут")
+            if latency is not None:
+                self._latencies.append(latency)
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.failures += 1
+            if self._probing:
+                # Пробный запрос не прошёл — ждём дольше
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._opened_at = now
+            elif self._opened_at is None and self.failures >= self.failure_threshold:
+                self._opened_at = now
+            self._probing = False
+
+    def latency(self, q: float = 99) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._latencies)
+        if len(values) < self.MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+    def timeout(self, default: float) -> float:
+        p99 = self.latency(99)
+        if p99 is None:
+            return default
+        return min(default, max(self.min_timeout, p99 * self.TIMEOUT_FACTOR))
+
+
+# ------------------------- Провайдеры -------------------------
+
+class Provider:
+    """Источник курсов USD->X.
+
+    kind — группа ("fiat" или "crypto"): в реестре провайдеры одной группы
+    подменяют друг друга. Разобранный ответ держится ttl секунд; после этого
+    делается условный запрос, и на 304 повторный разбор не нужен.
+    """
+    name = "provider"
+    kind = "fiat"
+    ttl = 3600.0
+    # Условные запросы и дисковый кэш ответа — для провайдеров с постоянным URL
+    conditional = True
+    # Разобранных ответов в памяти не больше стольких URL (сначала вытесняются самые старые)
+    MAX_CACHED_URLS = 64
+
+    def __init__(self, http: Optional[HttpClient] = None, ttl: Optional[float] = None) -> None:
+        self.http = http or HttpClient()
+        if ttl is not None:
+            self.ttl = ttl
+        self._cache: Dict[str, Tuple[float, Dict[str, Decimal]]] = {}  # по возрастанию времени ответа
+        self._cache_lock = threading.Lock()
+        self._round_trips = threading.local()
+        self.breaker = CircuitBreaker()
+
+    def url(self) -> str:
+        raise NotImplementedError
+
+    def parse(self, body: bytes) -> Dict[str, Decimal]:
+        raise NotImplementedError
+
+    def fetch(self, timeout: float = 10.0) -> Dict[str, Decimal]:
+        return self._fetch_url(self.url(), timeout)
+
+    def covers(self, symbol: str) -> bool:
+        """Можно ли запросить этот символ отдельно — fetch(symbols=[...]), не загружая весь набор."""
+        return False
+
+    def _note_round_trip(self, seconds: float) -> None:
+        self._round_trips.seconds = (getattr(self._round_trips, "seconds", None) or 0.0) + seconds
+
+    def take_round_trip(self) -> Optional[float]:
+        """Сколько длились запросы этого потока с полным ответом от сервера после прошлого вызова;
+        None — таких не было (ответ из кэша в памяти или 304). По нему автомат подбирает таймаут."""
+        seconds = getattr(self._round_trips, "seconds", None)
+        self._round_trips.seconds = None
+        return seconds
+
+    def _fetch_url(self, url: str, timeout: float) -> Dict[str, Decimal]:
+        now = time.monotonic()
+        cached = self._cache.get(url)
+        if cached is not None and now - cached[0] < self.ttl:
+            return dict(cached[1])
+
+        t0 = time.perf_counter()
+        resp = self.http.get(url, timeout=timeout, conditional=self.conditional, store=self.conditional)
+        if not resp.not_modified:
+            self._note_round_trip(time.perf_counter() - t0)
+        if resp.not_modified and cached is not None:
+            rates = cached[1]
+        else:
+            rates = self.parse(resp.body)
+        with self._cache_lock:
+            self._cache.pop(url, None)
+            self._cache[url] = (now, rates)
+            while len(self._cache) > self.MAX_CACHED_URLS:
+                del self._cache[next(iter(self._cache))]
+        return dict(rates)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name} kind={self.kind} ttl={self.ttl}>"
+
+
+class ECBProvider(Provider):
+    name = "ECB"
+    kind = "fiat"
+    ttl = 3600.0
+
+    def url(self) -> str:
+        return "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+
+    def parse(self, body: bytes) -> Dict[str, Decimal]:
+        from .ecb import latest_usd_rates
+
+        return latest_usd_rates(body)
+
+
+class FrankfurterProvider(Provider):
+    name = "Frankfurter(ECB)"
+    kind = "fiat"
+    ttl = 3600.0
+
+    def url(self) -> str:
+        return "https://api.frankfurter.app/latest?from=USD"
+
+    def parse(self, body: bytes) -> Dict[str, Decimal]:
+        data = json.loads(body.decode("utf-8"))
+        if not isinstance(data.get("rates"), dict):
+            raise RuntimeError("В ответе Frankfurter нет курсов")
+        rates = {k.upper(): Decimal(str(v)) for k, v in data["rates"].items()}
+        rates["USD"] = Decimal("1")
+        return rates
+
+
+class CoinGeckoProvider(Provider):
+    """Курсы криптовалют. С universe (AssetUniverse) набор монет динамический: полное обновление
+    запрашивает только закреплённые монеты и монеты со спросом, id — пачками, укладывающимися
+    в длину URL, а все запросы проходят через общий лимит частоты."""
+    name = "CoinGecko"
+    kind = "crypto"
+    ttl = 60.0
+    # URL зависит от набора id (пачки, точечные запросы), а цены меняются каждую минуту:
+    # условные запросы почти не срабатывают, а файлы на каждый набор id копились бы без предела
+    conditional = False
+    # Бесплатный API: ~10–30 запросов в минуту и ограниченная длина строки запроса
+    RATE_PER_MINUTE = 10
+    BURST = 5
+    MAX_URL_LENGTH = 2000
+    MAX_IDS_PER_REQUEST = 250
+
+    def __init__(self, ids: Mapping[str, str], http: Optional[HttpClient] = None, ttl: Optional[float] = None,
+                 universe: Optional["AssetUniverse"] = None, limiter: Optional[RateLimiter] = None) -> None:
+        super().__init__(http, ttl)
+        self._ids = dict(ids)
+        self._by_id = {cid: sym for sym, cid in self._ids.items()}
+        self.universe = universe
+        self.limiter = limiter or RateLimiter(self.RATE_PER_MINUTE, self.BURST)
+
+    @property
+    def ids(self) -> Mapping[str, str]:
+        return self.universe.ids if self.universe is not None else self._ids
+
+    def covers(self, symbol: str) -> bool:
+        return symbol in self.ids
+
+    def url(self, ids: Optional[List[str]] = None) -> str:
+        ids = list(self.ids.values()) if ids is None else ids
+        return f"https://api.coingecko.com/api/v3/simple/price?ids={','.join(ids)}&vs_currencies=usd"
+
+    def batches(self, ids: List[str]) -> List[List[str]]:
+        """Разбить id на пачки: URL каждой не длиннее MAX_URL_LENGTH и не больше MAX_IDS_PER_REQUEST id."""
+        budget = self.MAX_URL_LENGTH - len(self.url([]))
+        out: List[List[str]] = []
+        cur: List[str] = []
+        size = 0
+        for cid in ids:
+            extra = len(cid) + (1 if cur else 0)
+            if cur and (size + extra > budget or len(cur) >= self.MAX_IDS_PER_REQUEST):
+                out.append(cur)
+                cur, size, extra = [], 0, len(cid)
+            cur.append(cid)
+            size += extra
+        if cur:
+            out.append(cur)
+        return out
+
+    def fetch(self, timeout: float = 10.0, symbols: Optional[List[str]] = None) -> Dict[str, Decimal]:
+        if symbols is None:
+            symbols = self.universe.tracked() if self.universe is not None else list(self.ids)
+        ids = self.ids
+        wanted = list(dict.fromkeys(ids[sym] for sym in symbols if sym in ids))
+        result: Dict[str, Decimal] = {}
+        batches = self.batches(wanted)
+        for i, batch in enumerate(batches):
+            if not self.limiter.take():
+                if not i:
+                    raise RateLimited("CoinGecko: исчерпан лимит запросов, повторите позже")
+                # Оставшиеся монеты получат курс в следующий раз
+                logger.warning("CoinGecko: исчерпан лимит запросов, отложено пачек: %d", len(batches) - i)
+                break
+            result.update(self._fetch_url(self.url(batch), timeout))
+        if self.universe is not None:
+            self.universe.mark_fetched(result)
+        return result
+
+    def parse(self, body: bytes) -> Dict[str, Decimal]:
+        data = json.loads(body.decode("utf-8"))
+        by_id = self.universe.by_id if self.universe is not None else self._by_id
+        result: Dict[str, Decimal] = {}
+        for cid, obj in data.items():
+            sym = by_id.get(cid)
+            if sym is None or not isinstance(obj, dict):
+                continue
+            price = obj.get("usd")
+            if price is None:
+                continue
+            # USD->COIN = 1 / (USD per COIN)
+            try:
+                result[sym] = (Decimal("1") / Decimal(str(price)))
+            except Exception:
+                continue
+        return result
+
+
+class StubProvider(Provider):
+    """Локальный провайдер с заданными курсами — для тестов, бенчмарков и работы без сети."""
+    ttl = 0.0
+
+    def __init__(self, rates: Mapping[str, Decimal], name: str = "stub", kind: str = "fiat",
+                 delay: float = 0.0, error: Optional[Exception] = None, targeted: bool = False) -> None:
+        super().__init__(http=None, ttl=0.0)
+        self.name = name
+        self.kind = kind
+        self.rates = dict(rates)
+        self.delay = delay
+        self.error = error
+        self.targeted = targeted
+        self.calls = 0
+        self.requested: List[Optional[List[str]]] = []
+
+    def covers(self, symbol: str) -> bool:
+        return self.targeted and symbol in self.rates
+
+    def fetch(self, timeout: float = 10.0, symbols: Optional[List[str]] = None) -> Dict[str, Decimal]:
+        self.calls += 1
+        self.requested.append(symbols)
+        if self.delay:
+            time.sleep(min(self.delay, timeout))
+            if self.delay > timeout:
+                raise TimeoutError(f"{self.name}: timed out")
+            self._note_round_trip(self.delay)  # задержка изображает сетевой запрос
+        if self.error is not None:
+            raise self.error
+        if symbols is not None:
+            return {sym: self.rates[sym] for sym in symbols if sym in self.rates}
+        return dict(self.rates)
+
+
+# ------------------------- Реестр -------------------------
+
+class ProviderRegistry:
+    """Провайдеры по группам; порядок регистрации внутри группы — приоритет (основной, затем резервные)."""
+
+    def __init__(self) -> None:
+        self._groups: Dict[str, List[Provider]] = {}
+
+    def register(self, provider: Provider) -> Provider:
+        self._groups.setdefault(provider.kind, []).append(provider)
+        return provider
+
+    def kinds(self) -> List[str]:
+        return list(self._groups)
+
+    def route(self, kind: str) -> List[Provider]:
+        """Провайдеры группы в порядке опроса: сначала работающие (в порядке приоритета), затем
+        ожидающие пробного запроса; провайдеры с разомкнутым автоматом пропускаются."""
+        rank = {"closed": 0, "half_open": 1}
+        ranked = [(rank[state], i, p) for i, p in enumerate(self._groups.get(kind, []))
+                  if (state := p.breaker.state) in rank]
+        return [p for _, _, p in sorted(ranked, key=lambda item: item[:2])]
+
+    def get(self, name: str) -> Provider:
+        for group in self._groups.values():
+            for provider in group:
+                if provider.name == name:
+                    return provider
+        raise KeyError(name)
+
+    def __iter__(self):
+        for group in self._groups.values():
+            yield from group
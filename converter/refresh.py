@@ -0,0 +1,139 @@
+from __future__ import annotations
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Схлопывает одновременные вызовы: работу выполняет один поток, остальные ждут его результат.
+
+    key разделяет независимые вызовы (например, точечные запросы разных символов): схлопываются
+    только вызовы с одинаковым ключом."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    @property
+    def in_flight(self) -> bool:
+        return None in self._calls
+
+    def do(self, fn: Callable[[], Any], key: Hashable = None) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class RefreshScheduler:
+    """Фоновое обновление курсов: по истечении возраста снимка (с джиттером) и с backoff при ошибках.
+
+    refresh — функция обновления (обычно ConverterCore.update_rates с single-flight внутри),
+    next_delay — сколько секунд осталось до планового обновления.
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[[], None],
+        next_delay: Callable[[], float],
+        jitter: float = 0.1,
+        backoff_initial: float = 5.0,
+        backoff_max: float = 600.0,
+    ) -> None:
+        self._refresh = refresh
+        self._next_delay = next_delay
+        self.jitter = jitter
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.failures = 0
+        self._retry_at = 0.0  # time.monotonic(), до которого идёт backoff после ошибки
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rates-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def trigger(self) -> None:
+        """Запросить обновление немедленно (не дожидаясь его окончания).
+
+        Во время backoff после ошибки запрос игнорируется: иначе каждая конвертация из
+        устаревшего снимка снова отправляла бы обновление к недоступным провайдерам."""
+        if time.monotonic() < self._retry_at:
+            return
+        self._wake.set()
+
+    def _backoff(self) -> float:
+        delay = min(self.backoff_max, self.backoff_initial * (2 ** (self.failures - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _delay(self) -> float:
+        if self.failures:
+            return self._backoff()
+        delay = max(0.0, self._next_delay())
+        # Джиттер только в сторону «позже»: воркеры не бьют в провайдеров одновременно,
+        # и снимок к моменту пробуждения гарантированно уже устарел
+        return delay + random.uniform(0, self.jitter * max(delay, 1.0))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            delay = self._delay()
+            if self.failures:
+                self._retry_at = time.monotonic() + delay
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self._refresh()
+                self.failures = 0
+                self._retry_at = 0.0
+            except Exception as e:
+                self.failures += 1
+                self._retry_at = float("inf")  # до расчёта задержки backoff в начале цикла
+                logger.warning("Фоновое обновление курсов не удалось (попытка %d): %s", self.failures, e)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+# Шаблоны разбора пары компилируются один раз при импорте
+_DASHES_RE = re.compile(r"[–—]+")
+_SPACES_RE = re.compile(r"\s+")
+_PAIR_SPLIT_RE = re.compile(r"\s*[-/\\→]+\s*|\s+(?:to|в)\s+", re.I)
+
+_VALUE = ""  # ключ узла trie, под которым лежит код валюты (символы алиасов — непустые строки)
+
+
+class AliasTrie:
+    """Префиксное дерево алиасов валют: точный поиск, автодополнение и поиск с опечатками."""
+
+    def __init__(self, aliases: Optional[Mapping[str, str]] = None) -> None:
+        self._root: Dict[str, dict] = {}
+        self.max_len = 0  # длина самого длинного алиаса
+        for alias, code in (aliases or {}).items():
+            self.insert(alias, code)
+
+    def insert(self, alias: str, code: str) -> None:
+        node = self._root
+        for ch in alias:
+            node = node.setdefault(ch, {})
+        node[_VALUE] = code
+        self.max_len = max(self.max_len, len(alias))
+
+    def _node(self, prefix: str) -> Optional[dict]:
+        node = self._root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def get(self, alias: str) -> Optional[str]:
+        node = self._node(alias)
+        return node.get(_VALUE) if node is not None else None
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """Алиасы с данным префиксом: [(alias, code)], короткие и по алфавиту — первыми."""
+        node = self._node(prefix)
+        if node is None:
+            return []
+        found: List[Tuple[str, str]] = []
+        stack = [(prefix, node)]
+        while stack:
+            word, cur = stack.pop()
+            for ch, child in cur.items():
+                if ch == _VALUE:
+                    found.append((word, child))
+                else:
+                    stack.append((word + ch, child))
+        found.sort(key=lambda item: (len(item[0]), item[0]))
+        return found[:limit]
+
+    def fuzzy(self, word: str, max_distance: int = 1) -> Optional[str]:
+        """Код валюты ближайшего по Левенштейну алиаса в пределах max_distance.
+
+        Обход trie с построчным пересчётом матрицы расстояний: ветки, где минимум строки
+        превысил порог, отсекаются. Если на минимальном расстоянии есть алиасы разных
+        валют, результат неоднозначен — возвращается None.
+
+        Первая буква считается верной: иначе отдельное слово принимается за опечатку
+        в более длинном («ether» — за «tether»).
+        """
+        best: Dict[int, set] = {}
+        first_row = list(range(len(word) + 1))
+
+        def walk(node: dict, ch: str, prev_row: List[int]) -> None:
+            row = [prev_row[0] + 1]
+            for i, wc in enumerate(word, 1):
+                row.append(min(row[i - 1] + 1, prev_row[i] + 1, prev_row[i - 1] + (wc != ch)))
+            code = node.get(_VALUE)
+            if code is not None and row[-1] <= max_distance:
+                best.setdefault(row[-1], set()).add(code)
+            if min(row) <= max_distance:
+                for nch, child in node.items():
+                    if nch != _VALUE:
+                        walk(child, nch, row)
+
+        child = self._root.get(word[:1])
+        if child is not None:
+            walk(child, word[0], first_row)
+        if not best:
+            return None
+        codes = best[min(best)]
+        return next(iter(codes)) if len(codes) == 1 else None
+
+
+class Resolver:
+    """Распознавание валют и пар из свободного текста с LRU-кэшем «сырая строка -> результат»."""
+
+    def __init__(self, aliases: Mapping[str, str], cache_size: int = 4096, fuzzy_min_len: int = 5,
+                 is_code: Optional[Callable[[str], bool]] = None) -> None:
+        """is_code — признаёт ли внешний справочник строку тикером (например, PEPE или SHIB,
+        которых нет среди алиасов и которые длиннее трёх букв)."""
+        self.aliases = aliases
+        self.cache_size = cache_size
+        self.fuzzy_min_len = fuzzy_min_len
+        self.is_code = is_code
+        self.reload()
+
+    def reload(self) -> None:
+        """Перестроить trie и сбросить кэши — после изменения таблицы алиасов."""
+        self.trie = AliasTrie(self.aliases)
+        self.normalize = lru_cache(maxsize=self.cache_size)(self._normalize)
+        self.parse_pair = lru_cache(maxsize=self.cache_size)(self._parse_pair)
+
+    def clear_cache(self) -> None:
+        """Сбросить кэши — после изменения справочника тикеров (is_code)."""
+        self.normalize.cache_clear()
+        self.parse_pair.cache_clear()
+
+    def _normalize(self, name_or_code: str) -> str:
+        s = (name_or_code or "").strip().lower()
+        if not s:
+            raise ValueError("Пустое название валюты")
+        code = self.trie.get(s)
+        if code:
+            return code
+        if len(s) == 3:
+            return s.upper()
+        if self.is_code is not None and len(s) <= 8 and s.isalnum() and self.is_code(s.upper()):
+            return s.upper()
+        max_distance = 1 if len(s) < 8 else 2
+        # Строка длиннее любого алиаса больше чем на max_distance не совпадёт ни с одним,
+        # а обход trie для неё стоит пропорционально длине
+        if self.fuzzy_min_len <= len(s) <= self.trie.max_len + max_distance:
+            return self.trie.fuzzy(s, max_distance=max_distance) or ""
+        return ""
+
+    def _parse_pair(self, pair: str) -> Tuple[str, str]:
+        if not pair or not pair.strip():
+            raise ValueError("Строка с валютами пуста")
+
+        s = pair.strip()
+        s = _DASHES_RE.sub("-", s)
+        s = _SPACES_RE.sub(" ", s)
+
+        parts = _PAIR_SPLIT_RE.split(s, maxsplit=1)
+
+        if len(parts) != 2:
+            toks = s.split(" ")
+            if len(toks) == 2:
+                parts = toks
+            else:
+                raise ValueError("Укажите две валюты, например: 'RUB - USD' или 'RUB USD'")
+
+        a, b = parts[0].strip(), parts[1].strip()
+        code_a = self.normalize(a)
+        code_b = self.normalize(b)
+        if not code_a or not code_b:
+            raise ValueError(f"Не удалось распознать валюты из строки: '{pair}'")
+        return code_a, code_b
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, str]]:
+        return self.trie.complete((prefix or "").strip().lower(), limit)
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import logging
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .fixedpoint import FixedRates
+
+try:
+    import fcntl
+except ImportError:  # не Unix: без межпроцессной блокировки каждый процесс обновляет курсы сам
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Снимок курсов, общий для нескольких процессов (воркеров uvicorn).
+# Формат файла (little-endian):
+#   заголовок: magic(8) | version u64 | fetched_at (мкс UTC) i64 | count u32 | base(8) | len(source) u16
+#   затем source в UTF-8 и count записей FixedRates: symbol(8) | mantissa hi i64 | lo u64 | exponent i8
+# Курс хранится 128-битной мантиссой без округления — у всех воркеров ровно те же курсы, что у ведущего.
+# Файл только заменяется целиком (os.replace), поэтому читатель никогда не видит его наполовину записанным.
+# Читатель разбирает файл прямо из отображения в память и сразу его закрывает: курсы всё равно
+# превращаются в Decimal, держать отображение открытым незачем.
+#
+# Читатели к провайдерам не ходят: недостающие символы (и спрос на монеты) они дописывают строками
+# в <path>.wanted, ведущий забирает файл целиком и догружает курсы.
+MAGIC = b"VCSNAP02"
+_HEADER = struct.Struct("<8sQqI8sH")
+MAX_REQUESTS = 1000  # символов за один разбор <path>.wanted
+
+
+@dataclass(frozen=True)
+class SharedRecord:
+    base: str
+    rates: Dict[str, Decimal]
+    fetched_at: datetime
+    source: str
+    version: int
+
+
+def pack_snapshot(base: str, rates: Mapping[str, Decimal], fetched_at: datetime, source: str,
+                  version: int) -> bytes:
+    src = source.encode("utf-8")[:0xFFFF]
+    micros = int(fetched_at.timestamp() * 1_000_000)
+    table = FixedRates(rates)
+    return b"".join((_HEADER.pack(MAGIC, version, micros, len(table), base.encode("ascii"), len(src)), src,
+                     table.pack()))
+
+
+def unpack_snapshot(buf) -> SharedRecord:
+    """Разбор прямо из буфера (bytes или mmap) без промежуточной копии файла."""
+    with memoryview(buf) as view:
+        magic, version, micros, count, base, src_len = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("Неизвестный формат файла снимка")
+        offset = _HEADER.size
+        source = str(view[offset:offset + src_len], "utf-8")
+    rates = FixedRates.unpack_from(buf, count, offset + src_len).as_dict()
+    fetched_at = datetime.fromtimestamp(micros / 1_000_000, tz=timezone.utc)
+    return SharedRecord(base.rstrip(b"\0").decode("ascii"), rates, fetched_at, source, version)
+
+
+class SharedSnapshot:
+    """Файл снимка и блокировка «лидера» рядом с ним.
+
+    Лидер (тот, кто удерживает flock на <path>.lock) обновляет курсы и публикует их;
+    остальные процессы вызывают poll() — новая версия определяется по stat() файла.
+    Если лидер завершился, блокировка освобождается, и её забирает любой из читателей.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.wanted_path = self.path.with_name(self.path.name + ".wanted")
+        self._stat_key: Optional[Tuple[int, int, int]] = None
+        self._lock_fd: Optional[int] = None
+
+    # --- лидерство ---
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        if fcntl is None:
+            self._lock_fd = -1
+            return True
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._lock_fd is not None and self._lock_fd >= 0:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+        self._lock_fd = None
+
+    # --- запись ---
+
+    def publish(self, base: str, rates: Mapping[str, Decimal], fetched_at: datetime, source: str,
+                version: int) -> None:
+        data = pack_snapshot(base, rates, fetched_at, source, version)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    # --- чтение ---
+
+    def poll(self) -> Optional[SharedRecord]:
+        """Новый снимок, если файл изменился с прошлого вызова; иначе None."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key == self._stat_key:
+            return None
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                record = unpack_snapshot(mm)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Не удалось прочитать общий снимок %s: %s", self.path, e)
+            return None
+        self._stat_key = key
+        return record
+
+    # --- запросы читателей ведущему ---
+
+    def request(self, symbols: Iterable[str]) -> None:
+        """Попросить ведущего догрузить символы. Запись одним write() в файл с O_APPEND:
+        строки разных процессов не перемешиваются."""
+        data = "".join(f"{sym}\n" for sym in symbols).encode("ascii", "ignore")
+        if not data:
+            return
+        fd = os.open(self.wanted_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def take_requests(self) -> List[str]:
+        """Забрать накопившиеся запросы читателей (вызывает ведущий): символы без повторов."""
+        taken = self.wanted_path.with_name(f"{self.wanted_path.name}.{os.getpid()}")
+        try:
+            os.replace(self.wanted_path, taken)
+        except FileNotFoundError:
+            return []
+        try:
+            lines = taken.read_text("ascii", "ignore").split()
+        finally:
+            taken.unlink(missing_ok=True)
+        return list(dict.fromkeys(sym for sym in lines if sym.isalnum() and len(sym) <= 8))[:MAX_REQUESTS]
+
+    def close(self) -> None:
+        self.release()
@@ -0,0 +1,262 @@
+from __future__ import annotations
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .history import append_history, append_history_many, init_history, prune_history, rates_as_of
+from .metrics import REGISTRY
+
+DDL = """
+CREATE TABLE IF NOT EXISTS rates (
+    base       TEXT NOT NULL,
+    symbol     TEXT NOT NULL,
+    rate       TEXT NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    source     TEXT NOT NULL,
+    version    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (base, symbol)
+);
+CREATE INDEX IF NOT EXISTS idx_rates_fetched ON rates(base, fetched_at);
+CREATE TABLE IF NOT EXISTS rate_versions (
+    base       TEXT PRIMARY KEY,
+    version    INTEGER NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    source     TEXT NOT NULL
+);
+"""
+
+# Версии: каждое обновление курсов базы увеличивает rate_versions.version на единицу, а в rates
+# переписываются только изменившиеся символы — с номером версии, в которой они изменились
+# (fetched_at строки — момент последнего изменения). Время и источник последнего обновления
+# целиком хранятся в rate_versions. «Что изменилось после версии N» — выборка по индексу
+# (base, version) без сравнения снимков.
+
+# Запросы — константные строки: модуль sqlite3 держит на каждом соединении кэш
+# подготовленных выражений (cached_statements), и повторный вызов не компилирует SQL заново.
+SQL_LOAD_RATES = "SELECT symbol, rate FROM rates WHERE base=?"
+SQL_UPSERT_RATE = "INSERT OR REPLACE INTO rates(base, symbol, rate, fetched_at, source, version) VALUES(?,?,?,?,?,?)"
+SQL_VERSION = "SELECT version, fetched_at, source FROM rate_versions WHERE base=?"
+SQL_CHANGES = "SELECT symbol, rate FROM rates WHERE base=? AND version>?"
+SQL_SET_VERSION = (
+    "INSERT INTO rate_versions(base, version, fetched_at, source) VALUES(?,?,?,?) "
+    "ON CONFLICT(base) DO UPDATE SET version=excluded.version, fetched_at=excluded.fetched_at, source=excluded.source"
+)
+# Точечная догрузка не делает свежее остальной снимок: меняется только номер версии
+SQL_BUMP_VERSION = (
+    "INSERT INTO rate_versions(base, version, fetched_at, source) VALUES(?,?,?,?) "
+    "ON CONFLICT(base) DO UPDATE SET version=excluded.version"
+)
+
+STATEMENT_CACHE = 64
+# Импорт истории: дней на транзакцию. Между пачками замок записи отпускается,
+# чтобы плановое обновление курсов не ждало весь импорт.
+IMPORT_BATCH_DAYS = 1000
+BUSY_TIMEOUT_MS = 5000
+
+SQL_SECONDS = REGISTRY.histogram("converter_sql_seconds", "Время операций с SQLite (с ожиданием замка записи)", ["op"])
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+    # БД до появления версий: прежние курсы становятся версией 1 (версия 0 — «ничего нет»,
+    # changes_since(0) отдаёт всё), а rate_versions заполняется по последнему обновлению
+    if "version" not in {row[1] for row in conn.execute("PRAGMA table_info(rates)")}:
+        conn.execute("ALTER TABLE rates ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute("UPDATE rates SET version=1")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rates_version ON rates(base, version)")
+    conn.execute("INSERT OR IGNORE INTO rate_versions(base, version, fetched_at, source) "
+                 "SELECT base, 1, MAX(fetched_at), source FROM rates GROUP BY base")
+    init_history(conn)
+    conn.commit()
+
+
+def upsert_rates(conn: sqlite3.Connection, base: str, rates: Mapping[str, Decimal], source: str,
+                 fetched_at: datetime, version: int = 0) -> None:
+    """Перезаписывает текущие курсы. Транзакцию фиксирует вызывающий код."""
+    ts = int(fetched_at.timestamp())
+    conn.executemany(SQL_UPSERT_RATE, [(base, sym, str(val), ts, source, version) for sym, val in rates.items()])
+
+
+def load_state(conn: sqlite3.Connection, base: str) -> Optional[Tuple[Dict[str, Decimal], int, str, int]]:
+    """Текущие курсы базы с метаданными последнего обновления: (rates, fetched_at, source, version)."""
+    meta = conn.execute(SQL_VERSION, (base,)).fetchone()
+    if meta is None:
+        return None
+    rates = {sym: Decimal(rate) for sym, rate in conn.execute(SQL_LOAD_RATES, (base,))}
+    return rates, meta[1], meta[2], meta[0]
+
+
+def load_rates(conn: sqlite3.Connection, base: str) -> Optional[Tuple[Dict[str, Decimal], int, str]]:
+    state = load_state(conn, base)
+    return state[:3] if state is not None else None
+
+
+def save_changes(conn: sqlite3.Connection, base: str, rates: Mapping[str, Decimal], source: str,
+                 fetched_at: datetime, partial: bool = False, after_version: int = 0) -> Tuple[int, Dict[str, Decimal]]:
+    """Записывает обновление: новая версия базы, а в rates и историю — только изменившиеся курсы.
+
+    Версия на единицу больше большей из сохранённой и after_version (версии снимка, который
+    уже видят клиенты), так что номер не откатывается. Возвращает (версия, изменившиеся курсы).
+    Транзакцию фиксирует вызывающий код.
+    """
+    row = conn.execute(SQL_VERSION, (base,)).fetchone()
+    version = max(row[0] if row else 0, after_version) + 1
+    stored = dict(conn.execute(SQL_LOAD_RATES, (base,)))
+    changed: Dict[str, Decimal] = {}
+    for sym, val in rates.items():
+        old = stored.get(sym)
+        # Строки сравниваются сначала как текст: Decimal из них создаётся, только если текст разный
+        if old is None or (old != str(val) and Decimal(old) != val):
+            changed[sym] = val
+    if changed:
+        append_history(conn, base, changed, source=source, fetched_at=fetched_at)
+        upsert_rates(conn, base, changed, source=source, fetched_at=fetched_at, version=version)
+    conn.execute(SQL_BUMP_VERSION if partial else SQL_SET_VERSION, (base, version, int(fetched_at.timestamp()), source))
+    return version, changed
+
+
+def changes_since(conn: sqlite3.Connection, base: str, version: int) -> Tuple[int, Dict[str, Decimal]]:
+    """(текущая версия, курсы, изменившиеся после version); для неизвестной базы — (0, {}).
+
+    Версия новее текущей означает, что клиент видел другую БД, — ему возвращаются все курсы.
+    """
+    meta = conn.execute(SQL_VERSION, (base,)).fetchone()
+    if meta is None or meta[0] == version:
+        return (meta[0] if meta else 0), {}
+    if version > meta[0]:
+        version = -1
+    return meta[0], {sym: Decimal(rate) for sym, rate in conn.execute(SQL_CHANGES, (base, version))}
+
+
+class Storage:
+    """SQLite в режиме WAL: один пишущий и по читающему соединению на поток.
+
+    В WAL читатели работают со своим согласованным срезом базы и не ждут пишущую
+    транзакцию (а она — их), поэтому чтения идут без общей блокировки. Записи
+    сериализуются внутри процесса замком и выполняются одной транзакцией
+    BEGIN IMMEDIATE … COMMIT; между процессами их упорядочивает сама SQLite (busy_timeout).
+    """
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = Path(db_path)
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        init_db(self._writer)
+        # Дальше транзакциями пишущего соединения управляет write() явно
+        self._writer.isolation_level = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        # В WAL синхронизация при каждом COMMIT не нужна для целостности — только при checkpoint
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- чтение ---
+
+    def reader(self) -> sqlite3.Connection:
+        """Читающее соединение текущего потока (создаётся при первом обращении)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Хранилище закрыто")
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+            # Автокоммит: каждое чтение — свой короткий срез, без висящей транзакции, мешающей checkpoint
+            conn.isolation_level = None
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    @contextmanager
+    def _read_txn(self) -> Iterator[sqlite3.Connection]:
+        """Несколько чтений из одного среза базы (версия и строки не разъедутся при записи между ними)."""
+        conn = self.reader()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def load_rates(self, base: str) -> Optional[Tuple[Dict[str, Decimal], int, str]]:
+        with SQL_SECONDS.time(op="load_rates"), self._read_txn() as conn:
+            return load_rates(conn, base)
+
+    def load_state(self, base: str) -> Optional[Tuple[Dict[str, Decimal], int, str, int]]:
+        with SQL_SECONDS.time(op="load_rates"), self._read_txn() as conn:
+            return load_state(conn, base)
+
+    def changes_since(self, base: str, version: int) -> Tuple[int, Dict[str, Decimal]]:
+        with SQL_SECONDS.time(op="changes_since"), self._read_txn() as conn:
+            return changes_since(conn, base, version)
+
+    def rates_as_of(self, base: str, symbols: Iterable[str], at: datetime) -> Dict[str, Tuple[Decimal, int, str]]:
+        with SQL_SECONDS.time(op="rates_as_of"):
+            return rates_as_of(self.reader(), base, symbols, at)
+
+    # --- запись ---
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Одна транзакция на пишущем соединении: COMMIT при успехе, ROLLBACK при ошибке."""
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def save_refresh(self, base: str, rates: Mapping[str, Decimal], source: str, fetched_at: datetime,
+                     partial: bool = False, after_version: int = 0) -> Tuple[int, Dict[str, Decimal]]:
+        """Версия, история и текущие курсы одного обновления — в одной транзакции (см. save_changes)."""
+        with SQL_SECONDS.time(op="save_refresh"), self.write() as conn:
+            return save_changes(conn, base, rates, source, fetched_at, partial=partial, after_version=after_version)
+
+    def import_history(self, base: str, snapshots: Iterable[Tuple[datetime, Mapping[str, Decimal]]],
+                       source: str, batch_days: int = IMPORT_BATCH_DAYS) -> Tuple[int, int]:
+        """Массовая запись истории (только rate_history) транзакциями по batch_days снимков.
+
+        snapshots читается лениво, в памяти держится одна пачка. Возвращает (снимков, строк).
+        """
+        days = rows = 0
+        it = iter(snapshots)
+        while True:
+            batch = list(islice(it, batch_days))
+            if not batch:
+                return days, rows
+            with SQL_SECONDS.time(op="import_history"), self.write() as conn:
+                rows += append_history_many(conn, base, batch, source)
+            days += len(batch)
+
+    def prune_history(self, before: datetime, base: Optional[str] = None) -> int:
+        with SQL_SECONDS.time(op="prune_history"), self._write_lock:
+            return prune_history(self._writer, before, base=base)
+
+    def close(self) -> None:
+        self._closed = True
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        with self._write_lock:
+            try:
+                self._writer.close()
+            except sqlite3.Error:
+                pass
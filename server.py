@@ -1,19 +1,300 @@
+import asyncio
+import os
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
-from fastapi import FastAPI, Request, Form, Query
-from fastapi.templating import Jinja2Templates
-from converter.core import ConverterCore, parse_pair
+from functools import lru_cache
+from pathlib import Path
+from fastapi import FastAPI, Request, Form, Query, Response
+from starlette.responses import HTMLResponse, StreamingResponse
+from converter.admission import PRIORITY_BULK, ClientRateLimiter, IoLimiter, Rejected
+from converter.core import ConverterCore, default_assets
+from converter.metrics import PROFILER, REGISTRY
 
-app = FastAPI()
-templates = Jinja2Templates(directory="templates")
-core = ConverterCore(db_path="rates.sqlite3")
+try:
+    import orjson
 
-def style_vars(font_px:int, bg:str, text:str, accent:str, border:str, radius_px:int) -> str:
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:  # orjson необязателен, без него — стандартный json
+    import json
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    _loads = json.loads
+
+# Старт не ждёт провайдеров: при пустой БД курсы берутся из поставляемого снимка (если он есть),
+# а свежие загружаются в фоне. Пока снимка нет, /readyz отвечает 503.
+# Воркеры uvicorn делят один файл снимка: к провайдерам ходит только ведущий процесс.
+# Набор криптоактивов динамический (справочник CoinGecko + спрос); CONVERTER_DYNAMIC_ASSETS=0 —
+# только закреплённый список монет.
+core = ConverterCore(db_path="rates.sqlite3", fetch_on_init=False,
+                     bundled_snapshot=os.environ.get("CONVERTER_BUNDLED_SNAPSHOT", "rates.bundled.json"),
+                     shared_snapshot=os.environ.get("CONVERTER_SHARED_SNAPSHOT", "rates.snapshot"),
+                     assets=default_assets() if os.environ.get("CONVERTER_DYNAMIC_ASSETS", "1") == "1" else None)
+core.register_metrics()
+
+# Контроль допуска (см. converter/admission.py): частота запросов на клиента (в секунду, 0 — без
+# ограничения) и одновременные I/O-задачи с ограниченной очередью. Конвертации из снимка в эту
+# очередь не попадают и при перегрузке продолжают отвечать сразу.
+RATE_LIMIT = float(os.environ.get("CONVERTER_RATE_LIMIT", "20"))
+RATE_BURST = float(os.environ.get("CONVERTER_RATE_BURST", "40"))
+# Слотов вдвое больше потоков пула: у освободившегося потока сразу есть следующая задача,
+# и он не простаивает, пока занятый event loop передаёт слот ожидающему
+IO_CONCURRENCY = int(os.environ.get("CONVERTER_IO_CONCURRENCY", str(2 * core.io_workers)))
+IO_QUEUE = int(os.environ.get("CONVERTER_IO_QUEUE", "16"))
+IO_QUEUE_TIMEOUT = float(os.environ.get("CONVERTER_IO_QUEUE_TIMEOUT", "2.0"))
+# Брать адрес клиента из X-Forwarded-For (только за доверенным прокси)
+TRUST_PROXY = os.environ.get("CONVERTER_TRUST_PROXY") == "1"
+# Не ограничиваются: проверки живости и сбор метрик
+RATE_LIMIT_EXEMPT = ("/healthz", "/readyz", "/metrics")
+
+client_limiter = ClientRateLimiter(RATE_LIMIT, RATE_BURST) if RATE_LIMIT > 0 else None
+io_limiter = IoLimiter(IO_CONCURRENCY, IO_QUEUE, IO_QUEUE_TIMEOUT)
+REGISTRY.gauge("converter_admission_io", "I/O-задачи: выполняются и ждут слота", ["state"], fn=io_limiter.state)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    core.add_listener(rate_stream.publish)
+    core.start_background_refresh()
+    try:
+        yield
+    finally:
+        core.remove_listener(rate_stream.publish)
+        PROFILER.stop()
+        core.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def rejected_response(e: Rejected) -> Response:
+    return json_response({"error": str(e)}, e.status, headers={"Retry-After": e.retry_after_header})
+
+
+def client_key(scope) -> str:
+    if TRUST_PROXY:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "-"
+
+
+class RateLimitMiddleware:
+    """ASGI-обёртка: запрос сверх частоты клиента отклоняется 429 до разбора и маршрутизации."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if client_limiter is not None and scope["type"] == "http" and not scope["path"].startswith(RATE_LIMIT_EXEMPT):
+            try:
+                client_limiter.check(client_key(scope))
+            except Rejected as e:
+                return await rejected_response(e)(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(RateLimitMiddleware)
+
+
+@lru_cache(maxsize=None)
+def get_templates():
+    # Jinja2 загружается при первом рендере HTML, а не при импорте модуля
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory=Path(__file__).parent / "templates")
+
+# Предельное время ожидания конвертации, если ей понадобился поход к провайдерам (сек)
+CONVERT_TIMEOUT = 15.0
+# Максимум элементов в одном запросе /convert/batch
+BATCH_LIMIT = 10000
+# Сколько вариантов темы/языка страницы виджета держать отрендеренными (LRU)
+PAGE_CACHE_SIZE = 256
+# Поток обновлений курсов (SSE): период комментария-keepalive (сек) и очередь на подписчика
+STREAM_KEEPALIVE = 15.0
+STREAM_QUEUE_SIZE = 16
+# /debug/profiler (сэмплирующий профилировщик) доступен только при CONVERTER_DEBUG_ENDPOINTS=1
+DEBUG_ENDPOINTS = os.environ.get("CONVERTER_DEBUG_ENDPOINTS") == "1"
+
+
+def sse_event(event: str, snap, rates) -> bytes:
+    payload = {
+        "version": snap.version,
+        "base": snap.base,
+        "fetched_at": snap.fetched_at.isoformat(),
+        "source": snap.source,
+        "rates": {sym: str(rate) for sym, rate in rates.items()},
+    }
+    return f"event: {event}\nid: {snap.version}\ndata: ".encode() + _dumps(payload) + b"\n\n"
+
+
+class RateStream:
+    """Рассылка изменений снимка подписчикам SSE.
+
+    publish вызывается слушателем ядра в потоке обновления курсов; событие кодируется один
+    раз и передаётся в event loop каждого подписчика. Если подписчик не успевает читать
+    и его очередь переполнена, очередь сбрасывается, и он получает снимок целиком.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: set = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers = {sub for sub in self._subscribers if sub[1] is not queue}
+
+    def publish(self, prev, snap) -> None:
+        event = sse_event("delta", snap, snap.delta(prev))
+        for loop, queue in list(self._subscribers):
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:  # event loop подписчика уже закрыт
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: bytes) -> None:
+        if queue.full():
+            while not queue.empty():
+                queue.get_nowait()
+            event = None  # маркер: отправить снимок целиком
+        queue.put_nowait(event)
+
+
+rate_stream = RateStream()
+
+
+def parse_amount(raw) -> Decimal:
+    cleaned = (str(raw).replace(" ", "").replace("\u00a0","").replace("_","").replace(",", "."))
+    if not cleaned:
+        raise InvalidOperation
+    amt = Decimal(cleaned)
+    if not amt.is_finite() or amt <= 0:
+        raise InvalidOperation
+    return amt
+
+
+def json_response(payload, status_code: int = 200, headers: dict | None = None) -> Response:
+    return Response(content=_dumps(payload), status_code=status_code, media_type="application/json",
+                    headers=headers)
+
+def style_vars(font_px: int, bg: str, text: str, accent: str, border: str, radius_px: int) -> str:
     return (
         f"--cc-font:{font_px}px; "
         f"--cc-bg:{bg}; --cc-text:{text}; --cc-accent:{accent}; "
         f"--cc-border:{border}; --cc-radius:{radius_px}px;"
     )
 
+
+def norm_lang(lang: str) -> str:
+    return lang if lang in ("ru", "en") else "ru"
+
+
+# --- HTTP-кэширование ---
+# Ответы GET зависят только от параметров запроса и снимка курсов, поэтому валидатор —
+# версия снимка плюс контрольная сумма параметров, а max-age — время до планового обновления.
+# С динамическими криптоактивами курсы горячих монет обновляются чаще (догрузкой, без смены
+# fetched_at), поэтому max-age не больше их периода обновления.
+# Пока снимок не сменился, браузер и CDN переиспользуют ответ (или получают 304).
+
+def cache_headers(key: str) -> dict:
+    snap = core.snapshot
+    if snap is None:
+        return {"Cache-Control": "no-store"}
+    ttl = max(0, int((core.auto_update_age - snap.age()).total_seconds()))
+    if core.assets is not None:
+        ttl = min(ttl, int(core.assets.hot_ttl))
+    return {
+        "ETag": f'W/"{snap.version}-{zlib.crc32(key.encode("utf-8")):08x}"',
+        "Cache-Control": f"public, max-age={ttl}",
+    }
+
+
+def not_modified(request: Request, headers: dict) -> Response | None:
+    etag = headers.get("ETag")
+    if etag is None:
+        return None
+    tags = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+@lru_cache(maxsize=PAGE_CACHE_SIZE)
+def render_index(lang: str, font: int, bg: str, text: str, accent: str, border: str, radius: int) -> str:
+    """Пустая страница виджета для темы и языка — рендерится один раз на вариант."""
+    return get_templates().get_template("index.html").render(
+        lang=lang,
+        style_inline=style_vars(font, bg, text, accent, border, radius),
+        result=None,
+        error=None,
+        form={"base": "", "quote": "", "amount": "", "pair": ""},
+    )
+
+
+REGISTRY.counter("converter_page_cache_total", "Обращения к кэшу отрендеренных страниц виджета", ["result"],
+                 fn=lambda: {("hit",): render_index.cache_info().hits, ("miss",): render_index.cache_info().misses})
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: процесс жив и обслуживает HTTP, независимо от наличия курсов."""
+    return json_response({"status": "ok"})
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: есть снимок курсов, по которому можно конвертировать."""
+    snap = core.snapshot
+    if snap is None:
+        return json_response({"status": "warming_up"}, 503)
+    return json_response({
+        "status": "ready",
+        "version": snap.version,
+        "source": snap.source,
+        "age_seconds": round(snap.age().total_seconds(), 1),
+        "leader": core.is_leader,
+    })
+
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/debug/profiler")
+async def profiler_report(limit: int = Query(200, ge=1, le=10000)):
+    """Свёрнутые стеки, собранные профилировщиком (формат flamegraph.pl/speedscope)."""
+    if not DEBUG_ENDPOINTS:
+        return json_response({"error": "Not Found"}, 404)
+    header = f"# samples={PROFILER.samples} running={int(PROFILER.running)}\n"
+    return Response(header + PROFILER.folded(limit), media_type="text/plain; charset=utf-8")
+
+
+@app.post("/debug/profiler")
+async def profiler_toggle(enable: bool = Query(...), interval_ms: float = Query(5.0, gt=0, le=1000)):
+    """Включить (со сбросом накопленного) или выключить профилировщик без перезапуска."""
+    if not DEBUG_ENDPOINTS:
+        return json_response({"error": "Not Found"}, 404)
+    if enable:
+        PROFILER.interval = interval_ms / 1000
+        PROFILER.start()
+    else:
+        PROFILER.stop()
+    return json_response({"running": PROFILER.running, "samples": PROFILER.samples})
+
+
 @app.get("/")
 async def index(
     request: Request,
@@ -25,22 +306,13 @@ async def index(
     border: str = Query("#e5e7eb"),
     radius: int = Query(16, ge=0, le=32),
 ):
-    def style_vars(font_px, bg, text, accent, border, radius_px):
-        return (
-            f"--cc-font:{font_px}px; --cc-bg:{bg}; --cc-text:{text}; "
-            f"--cc-accent:{accent}; --cc-border:{border}; --cc-radius:{radius_px}px;"
-        )
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "lang": "ru" if lang not in ("ru", "en") else lang,
-            "style_inline": style_vars(font, bg, text, accent, border, radius),
-            "result": None,
-            "error": None,
-            "form": {"base": "", "quote": "", "amount": "", "pair": ""},
-        },
-    )
+    lang = norm_lang(lang)
+    theme = (lang, font, bg, text, accent, border, radius)
+    headers = cache_headers(repr(theme))
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    return HTMLResponse(render_index(*theme), headers=headers)
 
 @app.post("/convert")
 async def convert(
@@ -57,15 +329,8 @@ async def convert(
     border: str = Form("#e5e7eb"),
     radius: int = Form(16),
 ):
-    def style_vars(font_px, bg, text, accent, border, radius_px):
-        return (
-            f"--cc-font:{font_px}px; --cc-bg:{bg}; --cc-text:{text}; "
-            f"--cc-accent:{accent}; --cc-border:{border}; --cc-radius:{radius_px}px;"
-        )
-
-    lang = "ru" if lang not in ("ru","en") else lang
+    lang = norm_lang(lang)
     ctx = {
-        "request": request,
         "lang": lang,
         "style_inline": style_vars(font, bg, text, accent, border, radius),
         "result": None,
@@ -76,30 +341,26 @@ async def convert(
     try:
         #приоритет
         if pair.strip():
-            a, b = parse_pair(pair.strip())
+            a, b = core.resolver.parse_pair(pair.strip())
         else:
             a, b = base.strip(), quote.strip()
             if len(a) < 3 or len(b) < 3:
                 raise ValueError("Укажите обе валюты" if lang=="ru" else "Provide both currencies")
 
-        cleaned = (amount.replace(" ", "").replace("\u00a0","").replace("_","").replace(",", "."))
-        if not cleaned:
-            raise InvalidOperation
-        amt = Decimal(cleaned)
-        if amt <= 0:
-            raise InvalidOperation
+        amt = parse_amount(amount)
 
-        res = core.convert(a, b, amt)
+        res = await core.aconvert(a, b, amt, timeout=CONVERT_TIMEOUT, admit=io_limiter.slot)
         q3 = lambda x: x.quantize(Decimal("0.001"), rounding=ROUND_HALF_UP)
         q6 = lambda x: x.quantize(Decimal("0.000001"), rounding=ROUND_HALF_UP)
 
-        def fmt(num, loc):
-            s = f"{num:,.3f}"
+        def fmt(num, loc, digits=3):
+            s = f"{num:,.{digits}f}"
             return s.replace(",", " ").replace(".", ",") if loc=="ru" else s
 
         ctx["result"] = {
             "amount_fmt": fmt(q3(res.amount), lang),
-            "result_fmt": fmt(q3(res.result), lang),
+            # Результат — со всеми знаками минимальной единицы валюты (сатоши и т.п.), как в /convert
+            "result_fmt": fmt(res.result, lang, max(0, -res.result.as_tuple().exponent)),
             "rate_fmt": (str(q6(res.rate)) if lang=="en"
                          else str(q6(res.rate)).replace(".", ",")),
             "base": res.base, "quote": res.quote,
@@ -108,7 +369,198 @@ async def convert(
         }
     except InvalidOperation:
         ctx["error"] = "Некорректная сумма" if lang=="ru" else "Invalid amount"
+    except asyncio.TimeoutError:
+        ctx["error"] = "Провайдер курсов не ответил вовремя" if lang=="ru" else "Rate provider timed out"
+    except Rejected as e:
+        ctx["error"] = str(e) if lang=="ru" else "Server is busy, try again later"
+        return get_templates().TemplateResponse(request, "index.html", ctx, status_code=e.status,
+                                                headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         ctx["error"] = str(e)
 
-    return templates.TemplateResponse("index.html", ctx)
+    return get_templates().TemplateResponse(request, "index.html", ctx)
+
+
+@app.get("/convert")
+async def convert_json(
+    request: Request,
+    base: str = Query(""),
+    quote: str = Query(""),
+    amount: str = Query("1"),
+    pair: str = Query(""),
+    at: str = Query(""),
+):
+    headers = cache_headers(f"convert?{request.url.query}")
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    try:
+        a, b = core.resolver.parse_pair(pair) if pair.strip() else (base.strip(), quote.strip())
+        if not a or not b:
+            raise ValueError("Укажите обе валюты: base и quote")
+        try:
+            at_dt = datetime.fromisoformat(at.strip()) if at.strip() else None
+        except ValueError:
+            raise ValueError("Параметр at должен быть датой/временем в ISO 8601") from None
+        res = await core.aconvert(a, b, parse_amount(amount), timeout=CONVERT_TIMEOUT, at=at_dt,
+                                  admit=io_limiter.slot)
+    except Rejected as e:
+        return rejected_response(e)
+    except InvalidOperation:
+        return json_response({"error": "Некорректная сумма"}, 400)
+    except asyncio.TimeoutError:
+        return json_response({"error": "Провайдер курсов не ответил вовремя"}, 504)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    except Exception as e:
+        # Догрузка недостающего курса не удалась (провайдеры недоступны) — как и в /convert/batch
+        return json_response({"error": str(e)}, 502)
+    return json_response(res.as_dict(), headers=headers)
+
+
+@app.get("/rates")
+async def rates_row(request: Request, base: str = Query("USD")):
+    """Курсы одной валюты ко всем остальным — для виджетов-таблиц."""
+    headers = cache_headers(f"rates?{request.url.query}")
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    try:
+        code, snap, row = core.rates_row(base)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    return json_response({
+        "base": code,
+        "rates": {sym: str(rate) for sym, rate in row.items()},
+        "fetched_at": snap.fetched_at.isoformat(),
+        "source": snap.source,
+        "version": snap.version,
+    }, headers=headers)
+
+
+async def resume_event(snap, last_event_id: str | None) -> bytes:
+    """Первое событие подписчика: при переподключении с Last-Event-ID — только изменения после
+    той версии, иначе (и если чтение изменений сейчас не допущено) снимок целиком."""
+    if last_event_id and last_event_id.isdigit():
+        try:
+            version, changed = await core.achanges_since(int(last_event_id), timeout=CONVERT_TIMEOUT,
+                                                         admit=io_limiter.slot)
+        except (Rejected, asyncio.TimeoutError):
+            version, changed = -1, {}
+        if version == snap.version and int(last_event_id) <= version:
+            return sse_event("delta", snap, changed)
+    return sse_event("snapshot", snap, snap.rates)
+
+
+@app.get("/rates/changes")
+async def rates_changes(request: Request, since: int = Query(..., ge=0)):
+    """Курсы (ref_base->X), изменившиеся после версии since, — для точной инвалидации кэшей клиентов."""
+    headers = cache_headers(f"changes?{request.url.query}")
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    snap = core.snapshot
+    if snap is None:
+        return json_response({"error": "Курсы ещё загружаются"}, 503)
+    try:
+        version, changed = await core.achanges_since(since, timeout=CONVERT_TIMEOUT, admit=io_limiter.slot)
+    except Rejected as e:
+        return rejected_response(e)
+    except asyncio.TimeoutError:
+        return json_response({"error": "База курсов не ответила вовремя"}, 504)
+    return json_response({
+        "base": core.ref_base,
+        "since": since,
+        "version": version,
+        "rates": {sym: str(rate) for sym, rate in changed.items()},
+        "fetched_at": snap.fetched_at.isoformat(),
+        "source": snap.source,
+    }, headers=headers)
+
+
+async def rate_events(request: Request):
+    queue = rate_stream.subscribe()
+    try:
+        snap = core.snapshot
+        if snap is not None:
+            yield await resume_event(snap, request.headers.get("last-event-id"))
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event is None:
+                snap = core.snapshot
+                event = sse_event("snapshot", snap, snap.rates)
+            yield event
+    finally:
+        rate_stream.unsubscribe(queue)
+
+
+@app.get("/rates/stream")
+async def rates_stream(request: Request):
+    """SSE: сначала снимок целиком (event: snapshot), затем только изменившиеся курсы (event: delta)."""
+    return StreamingResponse(rate_events(request), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/resolve")
+async def resolve(base: str = Query(""), quote: str = Query(""), pair: str = Query("")):
+    """Распознать валюты так же, как /convert (pair главнее base/quote): коды и число знаков
+    после запятой у каждой — для предварительного расчёта в виджете."""
+    try:
+        if pair.strip():
+            a, b = core.resolver.parse_pair(pair)
+        else:
+            a, b = core.resolver.normalize(base), core.resolver.normalize(quote)
+        if not a or not b:
+            raise ValueError("Не удалось распознать коды валют")
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    digits = {code: -core.result_quantum(code).as_tuple().exponent for code in (a, b)}
+    return json_response({"base": a, "quote": b, "digits": digits})
+
+
+@app.get("/suggest")
+async def suggest(q: str = Query(""), limit: int = Query(10, ge=1, le=50)):
+    """Автодополнение названий и кодов валют для виджета."""
+    return json_response([{"alias": alias, "code": code} for alias, code in core.resolver.suggest(q, limit)])
+
+
+@app.post("/convert/batch")
+async def convert_batch(request: Request):
+    try:
+        payload = _loads(await request.body())
+        items = payload["items"] if isinstance(payload, dict) else payload
+        if not isinstance(items, list):
+            raise TypeError
+    except Exception:
+        return json_response({"error": 'Ожидается JSON вида {"items": [{"base", "quote", "amount"}, ...]}'}, 400)
+    if len(items) > BATCH_LIMIT:
+        return json_response({"error": f"Не более {BATCH_LIMIT} элементов за запрос"}, 413)
+
+    results = [None] * len(items)
+    batch, positions = [], []
+    for i, item in enumerate(items):
+        try:
+            batch.append((str(item["base"]), str(item["quote"]), parse_amount(item.get("amount", "1"))))
+            positions.append(i)
+        except InvalidOperation:
+            results[i] = {"error": "Некорректная сумма"}
+        except (KeyError, TypeError, AttributeError):
+            results[i] = {"error": "Элемент должен содержать base и quote"}
+
+    try:
+        converted = await core.aconvert_batch(batch, timeout=CONVERT_TIMEOUT,
+                                              admit=lambda: io_limiter.slot(PRIORITY_BULK))
+    except Rejected as e:
+        return rejected_response(e)
+    except asyncio.TimeoutError:
+        return json_response({"error": "Провайдер курсов не ответил вовремя"}, 504)
+    except Exception as e:
+        return json_response({"error": str(e)}, 502)
+
+    for i, res in zip(positions, converted):
+        results[i] = {"error": str(res)} if isinstance(res, ValueError) else res.as_dict()
+    return json_response({"count": len(results), "results": results})
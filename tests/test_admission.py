@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from converter.admission import PRIORITY_BULK, PRIORITY_INTERACTIVE, ClientRateLimiter, IoLimiter, Rejected
+
+
+def test_client_rate_limiter_per_client_buckets(monkeypatch):
+    now = {"t": 100.0}
+    monkeypatch.setattr("converter.admission.time.monotonic", lambda: now["t"])
+    limiter = ClientRateLimiter(rate=2, burst=3, max_clients=2)
+
+    for _ in range(3):
+        limiter.check("a")
+    with pytest.raises(Rejected) as err:
+        limiter.check("a")
+    assert err.value.status == 429 and err.value.retry_after_header == "1"
+    limiter.check("b")  # у другого клиента своя корзина
+
+    now["t"] += 0.5  # +1 токен
+    limiter.check("a")
+    limiter.check("c")
+    assert len(limiter) == 2  # самый давний клиент забыт
+
+
+def test_io_limiter_bounded_queue_and_priorities():
+    async def scenario():
+        limiter = IoLimiter(limit=1, max_queue=2, queue_timeout=1.0)
+        order = []
+        release = asyncio.Event()
+
+        async def job(name, priority):
+            async with limiter.slot(priority):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(job("first", PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        bulk = asyncio.create_task(job("bulk", PRIORITY_BULK))
+        await asyncio.sleep(0)
+        single = asyncio.create_task(job("single", PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        assert limiter.state() == {("active",): 1, ("waiting",): 2}
+
+        with pytest.raises(Rejected) as err:  # очередь полна — отказ сразу
+            await job("extra", PRIORITY_INTERACTIVE)
+        assert err.value.status == 503
+
+        release.set()
+        await asyncio.gather(first, bulk, single)
+        assert order == ["first", "single", "bulk"]
+        assert limiter.state() == {("active",): 0, ("waiting",): 0}
+
+        # Ожидание дольше queue_timeout — тоже 503, слот не теряется
+        limiter.queue_timeout = 0.01
+        release.clear()
+        holder = asyncio.create_task(job("holder", PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected):
+            await job("late", PRIORITY_INTERACTIVE)
+        release.set()
+        await holder
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_offload_keeps_slot_until_worker_finishes(tmp_path):
+    from converter.core import ConverterCore
+    from converter.providers import ProviderRegistry, StubProvider
+
+    registry = ProviderRegistry()
+    registry.register(StubProvider({"USD": 1}))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", registry=registry, fetch_on_init=False)
+
+    async def scenario():
+        limiter = IoLimiter(limit=1, max_queue=1, queue_timeout=0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await core._offload(time.sleep, 0.3, timeout=0.05, admit=limiter.slot)
+        # Поток пула ещё работает — слот занят, новая задача в пул не попадает
+        assert limiter.active == 1
+        with pytest.raises(Rejected):
+            await core._offload(time.sleep, 0, timeout=1.0, admit=limiter.slot)
+        await asyncio.sleep(0.4)
+        assert limiter.active == 0
+        await core._offload(time.sleep, 0, timeout=1.0, admit=limiter.slot)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        core.close()
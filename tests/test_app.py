@@ -65,10 +65,93 @@ def test_forced_update_when_symbol_missing(tmp_path, monkeypatch):
         )
 
     monkeypatch.setattr(coremod, "fetch_usd_rates", fetch_step)
+    monkeypatch.setattr(coremod, "fetch_usd_rates_for", lambda symbols, registry=None: None)
 
     db = tmp_path / "rates.sqlite3"
-    core = ConverterCore(db_path=db)
+    core = ConverterCore(db_path=db, missing_refresh_interval=0)
 
     res = core.convert("USD", "USDC", Decimal("5"))
     assert res.rate == Decimal("1")
     assert res.result == Decimal("5.00")
+
+
+def test_convert_served_from_snapshot_without_sql(tmp_path, monkeypatch):
+    monkeypatch.setattr(coremod, "fetch_usd_rates",
+                        lambda: ({"USD": Decimal("1"), "EUR": Decimal("0.90")}, "fake"))
+
+    db = tmp_path / "rates.sqlite3"
+    core = ConverterCore(db_path=db)
+    snap = core.snapshot
+    assert snap.version == 1 and snap.rates["EUR"] == Decimal("0.90")
+
+    # Горячий путь не должен обращаться к SQLite
+    core.storage.close()
+    res = core.convert("EUR", "USD", Decimal("9"))
+    assert res.result == Decimal("10.00")
+    assert res.source == "fake"
+
+
+def test_snapshot_warm_start_from_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(coremod, "fetch_usd_rates",
+                        lambda: ({"USD": Decimal("1"), "RUB": Decimal("90")}, "fake"))
+    db = tmp_path / "rates.sqlite3"
+    ConverterCore(db_path=db).close()
+
+    def no_fetch():
+        raise AssertionError("при тёплом старте сеть не нужна")
+
+    monkeypatch.setattr(coremod, "fetch_usd_rates", no_fetch)
+    core = ConverterCore(db_path=db)
+    assert core.snapshot.rates["RUB"] == Decimal("90")
+    assert core.convert("USD", "RUB", Decimal("2")).result == Decimal("180.00")
+
+
+def test_convert_batch_single_snapshot_and_per_item_errors(tmp_path, monkeypatch):
+    calls = {"n": 0}
+
+    def fake_fetch():
+        calls["n"] += 1
+        return {"USD": Decimal("1"), "EUR": Decimal("0.90"), "RUB": Decimal("90")}, "fake"
+
+    monkeypatch.setattr(coremod, "fetch_usd_rates", fake_fetch)
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", missing_refresh_interval=0)
+
+    items = [("usd", "eur", Decimal("10")), ("евро", "рубль", Decimal("1")), ("usd", "xyz", Decimal("1"))] * 1000
+    results = core.convert_batch(items)
+
+    assert len(results) == 3000
+    assert results[0].result == Decimal("9.00")
+    assert results[1].result == Decimal("100.00")
+    assert isinstance(results[2], ValueError)
+    # Один принудительный запрос к провайдеру на весь пакет (XYZ), а не на каждый элемент
+    assert calls["n"] == 2
+    assert core.convert_pair_string("usd-eur", Decimal("10")) == results[0].as_dict()
+
+
+def test_convert_batch_reports_overflow_on_its_item(tmp_path, monkeypatch):
+    monkeypatch.setattr(coremod, "fetch_usd_rates",
+                        lambda: ({"USD": Decimal("1"), "RUB": Decimal("90")}, "fake"))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3")
+
+    results = core.convert_batch([("usd", "rub", Decimal("1e999999")), ("usd", "rub", Decimal("2"))])
+
+    assert isinstance(results[0], ValueError) and "диапазона" in str(results[0])
+    assert results[1].result == Decimal("180.00")
+    core.close()
+
+
+def test_cross_rate_matrix_matches_direct_formula(tmp_path, monkeypatch):
+    rates = {"USD": Decimal("1"), "EUR": Decimal("0.90"), "RUB": Decimal("90"), "BTC": Decimal("0.000025")}
+    monkeypatch.setattr(coremod, "fetch_usd_rates", lambda: (rates, "fake"))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3")
+
+    cross = core.snapshot.cross
+    for a in rates:
+        for b in rates:
+            assert cross[a][b] == coremod.cross_rate(rates, "USD", a, b)
+    assert cross["RUB"]["EUR"] == Decimal("0.90") / Decimal("90")
+
+    code, snap, row = core.rates_row("евро")
+    assert code == "EUR" and snap is core.snapshot
+    assert row["BTC"] == Decimal("0.000025") / Decimal("0.90")
+    assert set(row) == set(rates)
@@ -0,0 +1,134 @@
+import json
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import converter.core as coremod
+from converter.assets import AssetUniverse, build_ids
+from converter.core import ConverterCore
+from converter.providers import CoinGeckoProvider, HttpResponse, ProviderRegistry, RateLimiter, StubProvider
+
+COINS = [
+    {"id": "bitcoin", "symbol": "btc", "name": "Bitcoin"},
+    {"id": "bitcoin-wormhole", "symbol": "btc", "name": "Bitcoin (Wormhole)"},
+    {"id": "pepe", "symbol": "pepe", "name": "Pepe"},
+    {"id": "pepe-2", "symbol": "pepe", "name": "Pepe 2.0"},
+    {"id": "shiba-inu", "symbol": "shib", "name": "Shiba Inu"},
+]
+RANKS = {"bitcoin": 1, "shiba-inu": 15, "pepe": 30}
+PRICES = {"bitcoin": 50000, "pepe": 0.00001, "shiba-inu": 0.00002, "ethereum": 2500}
+
+
+class FakeHttp:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, timeout=10.0, conditional=True, store=True):
+        self.urls.append(url)
+        ids = parse_qs(urlsplit(url).query)["ids"][0].split(",")
+        body = {cid: {"usd": PRICES[cid]} for cid in ids if cid in PRICES}
+        return HttpResponse(url, 200, json.dumps(body).encode())
+
+
+def test_build_ids_prefers_pinned_then_market_cap_rank():
+    ids = build_ids(COINS, {"BTC": "bitcoin", "ETH": "ethereum"}, ranks={"pepe-2": 900, "pepe": 30})
+    assert ids == {"BTC": "bitcoin", "PEPE": "pepe", "SHIB": "shiba-inu", "ETH": "ethereum"}
+    # Монеты с одним тикером и без места по капитализации — тикер не распознаётся
+    assert "PEPE" not in build_ids(COINS, {"BTC": "bitcoin"})
+
+
+def test_coin_list_is_ranked_by_markets(tmp_path):
+    class ListHttp:
+        def get(self, url, timeout=10.0, conditional=True, store=True):
+            if "/coins/list" in url:
+                body = COINS
+            else:
+                body = [{"id": cid, "market_cap_rank": rank} for cid, rank in RANKS.items()] if "page=1" in url else []
+            return HttpResponse(url, 200, json.dumps(body).encode())
+
+    assets = AssetUniverse({"BTC": "bitcoin"}, http=ListHttp(), cache_dir=tmp_path)
+    assert assets.load_coin_list()
+    assert assets.ids["PEPE"] == "pepe" and assets.ids["SHIB"] == "shiba-inu"
+
+
+def test_coin_tickers_never_shadow_fiat_codes():
+    assets = AssetUniverse({"BTC": "bitcoin"})
+    assets.load_coins(COINS + [{"id": "gelato", "symbol": "gel", "name": "Gelato"}], ranks=RANKS)
+    assert not assets.covers("GEL") and assets.covers("PEPE")
+    # Лари у фиатного провайдера нет, но и к CoinGecko его не отправляют
+    registry = ProviderRegistry()
+    registry.register(StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.9")}))
+    registry.register(CoinGeckoProvider({}, http=FakeHttp(), universe=assets))
+    assert coremod.fetch_usd_rates_for(["GEL"], registry=registry) is None
+
+
+def test_demand_tiers_and_due_order():
+    assets = AssetUniverse({"BTC": "bitcoin"}, hot_window=10, cold_window=100, hot_ttl=1, cold_ttl=50)
+    assets.load_coins(COINS, ranks=RANKS)
+    assets._demand.update({"PEPE": 0.0, "SHIB": 95.0, "BTC": 90.0})
+    assets.mark_fetched(["PEPE", "SHIB", "BTC"], now=80.0)
+
+    # t=100: SHIB и BTC горячие (курс старше секунды), PEPE холодный (курсу 20 с < 50)
+    assert assets.ttl("SHIB", 100.0) == 1 and assets.ttl("PEPE", 100.0) == 50
+    assert set(assets.due(100.0)) == {"SHIB", "BTC"}
+    # t=131: PEPE не запрашивали дольше cold_window — больше не обновляется
+    assert "PEPE" not in assets.due(131.0) and "PEPE" not in assets.demanded(131.0)
+
+
+def test_coingecko_batches_respect_url_length_and_rate_limit():
+    assets = AssetUniverse({})
+    assets.load_coins([{"id": f"coin-{i:04d}", "symbol": f"c{i}", "name": ""} for i in range(100)])
+    http = FakeHttp()
+    provider = CoinGeckoProvider({}, http=http, universe=assets, limiter=RateLimiter(60, burst=2))
+    provider.MAX_URL_LENGTH = len(provider.url([])) + 100
+
+    batches = provider.batches(list(assets.ids.values()))
+    assert all(len(provider.url(b)) <= provider.MAX_URL_LENGTH for b in batches)
+    assert [cid for b in batches for cid in b] == list(assets.ids.values())
+
+    provider.fetch(symbols=list(assets.ids))
+    assert len(http.urls) == 2  # остальные пачки отложены лимитом
+    with pytest.raises(RuntimeError):
+        provider.fetch(symbols=["C99"])
+
+
+def test_coingecko_response_cache_is_bounded_and_not_written_to_disk():
+    class RecordingHttp(FakeHttp):
+        def get(self, url, timeout=10.0, conditional=True, store=True):
+            assert not conditional and not store  # у каждого набора id свой URL — на диск не пишем
+            return super().get(url, timeout)
+
+    assets = AssetUniverse({})
+    assets.load_coins([{"id": f"coin-{i}", "symbol": f"c{i}", "name": ""} for i in range(10)])
+    provider = CoinGeckoProvider({}, http=RecordingHttp(), universe=assets, limiter=RateLimiter(600, burst=100))
+    provider.MAX_CACHED_URLS = 3
+    for i in range(10):
+        provider.fetch(symbols=[f"C{i}"])
+    assert list(provider._cache) == [provider.url([f"coin-{i}"]) for i in (7, 8, 9)]
+
+
+def test_core_tracks_demand_and_refreshes_only_requested_coins(tmp_path, monkeypatch):
+    assets = AssetUniverse({"BTC": "bitcoin", "ETH": "ethereum"}, hot_ttl=0)
+    assets.load_coins(COINS, ranks=RANKS)
+    http = FakeHttp()
+    registry = ProviderRegistry()
+    registry.register(StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.9")}))
+    registry.register(CoinGeckoProvider({}, http=http, universe=assets))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", registry=registry, assets=assets)
+    try:
+        # Полное обновление — только закреплённые монеты
+        assert "ids=bitcoin,ethereum&" in http.urls[-1]
+
+        # PEPE (4 буквы, нет среди алиасов) распознаётся по справочнику и догружается точечно
+        res = core.convert("pepe", "USD", Decimal("1000000"))
+        assert res.result == Decimal("10.00")
+        assert "ids=pepe&" in http.urls[-1]
+
+        core.refresh_assets()
+        assert "ids=pepe&" in http.urls[-1]  # ETH и SHIB никто не запрашивал
+
+        # Справочник монет влияет только на это ядро, а не на общий normalize_code модуля
+        assert core.resolver.normalize("pepe") == "PEPE" and coremod.normalize_code("pepe") == ""
+    finally:
+        core.close()
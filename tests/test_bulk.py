@@ -0,0 +1,73 @@
+import io
+import json
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+import converter.core as coremod
+from converter.bulk import convert_csv, convert_jsonl
+from converter.core import ConverterCore
+
+RATES = {"USD": Decimal("1"), "EUR": Decimal("0.9137"), "RUB": Decimal("91.37"), "BTC": Decimal("0.0000161")}
+
+
+@pytest.fixture
+def core(tmp_path, monkeypatch):
+    monkeypatch.setattr(coremod, "fetch_usd_rates", lambda: (RATES, "fake"))
+    c = ConverterCore(db_path=tmp_path / "rates.sqlite3")
+    yield c
+    c.close()
+
+
+def test_csv_results_match_convert_exactly(core):
+    rnd = random.Random(7)
+    codes = ["usd", "EUR", "рубль", "btc"]
+    lines = ["id,base,quote,amount"]
+    for i in range(2500):
+        amount = f"{rnd.randint(0, 10 ** 7)}.{rnd.randint(0, 999):03d}"
+        lines.append(f"{i},{rnd.choice(codes)},{rnd.choice(codes)},{amount}")
+    src = io.StringIO("\n".join(lines) + "\n")
+    dst = io.StringIO()
+
+    stats = convert_csv(core, src, dst, chunk_size=300)
+    assert stats.rows == 2500 and stats.errors == 0
+
+    out = dst.getvalue().splitlines()
+    assert out[0] == "id,base,quote,amount,rate,result,error"
+    for line in out[1:]:
+        _, base, quote, amount, rate, result, _ = line.split(",")
+        expected = core.convert(base, quote, Decimal(amount))
+        assert Decimal(rate) == expected.rate
+        assert Decimal(result) == expected.result
+        quantum = core.result_quantum(expected.quote)
+        assert expected.result == (Decimal(amount) * expected.rate).quantize(quantum, rounding=ROUND_HALF_UP)
+
+
+def test_jsonl_fixed_quote_and_errors(core):
+    src = io.StringIO(
+        '{"base": "usd", "amount": "10"}\n'
+        '{"base": "xyz", "amount": "1"}\n'
+        '{"base": "eur", "amount": "abc"}\n'
+        'not json\n'
+    )
+    dst = io.StringIO()
+    stats = convert_jsonl(core, src, dst, quote="RUB")
+    rows = [json.loads(line) for line in dst.getvalue().splitlines()]
+
+    assert stats.rows == 4 and stats.errors == 3
+    assert rows[0]["result"] == "913.70"
+    assert "XYZ" in rows[1]["error"]
+    assert rows[2]["error"] == "Некорректная сумма"
+    assert rows[3]["input"] == "not json"
+
+
+def test_overflowing_row_is_reported_in_its_error_column(core):
+    src = io.StringIO("base,quote,amount\nUSD,RUB,1e999999\nUSD,EUR,10\n")
+    dst = io.StringIO()
+    stats = convert_csv(core, src, dst)
+
+    out = dst.getvalue().splitlines()
+    assert stats.rows == 2 and stats.errors == 1
+    assert out[1].endswith(",,,Сумма вне допустимого диапазона")
+    assert out[2] == "USD,EUR,10,0.9137,9.14,"
@@ -0,0 +1,64 @@
+import sys
+from decimal import Decimal
+
+import pytest
+
+import app
+from converter.core import ConverterCore
+from converter.daemon import ConversionDaemon, DaemonClient, DaemonUnavailable
+from converter.providers import ProviderRegistry, StubProvider
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="нужны Unix-сокеты")
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    registry = ProviderRegistry()
+    registry.register(StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.90"), "RUB": Decimal("90")}))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", registry=registry)
+    # Короткий путь: у AF_UNIX ограничение ~100 байт, а tmp_path бывает длинным
+    d = ConversionDaemon(core, tmp_path / "d.sock")
+    thread = d.start()
+    yield d
+    d.shutdown()
+    thread.join(5)
+    core.close()
+
+
+def test_client_matches_core_and_reuses_connection(daemon):
+    with DaemonClient(daemon.path) as client:
+        assert client.ping()
+        res = client.convert("rub-eur", Decimal("12345.67"))
+        expected = daemon.core.convert("RUB", "EUR", Decimal("12345.67"))
+        assert (res.base, res.quote, res.rate, res.result) == (expected.base, expected.quote, expected.rate, expected.result)
+        assert res.fetched_at == expected.fetched_at and res.source == expected.source
+
+        with pytest.raises(ValueError):
+            client.convert("usd-xyz", Decimal("1"))
+        with pytest.raises(ValueError):
+            client.request("CONVERT", "usd-eur", "-5")
+        # После ошибок соединение остаётся рабочим
+        assert client.request("STATUS")[0] == str(daemon.core.snapshot.version)
+
+
+def test_cli_uses_daemon_and_falls_back_without_it(daemon, tmp_path, capsys, monkeypatch):
+    assert app.main(["--pair", "usd-eur", "--amount", "10", "--socket", str(daemon.path), "-q"]) == 0
+    assert capsys.readouterr().out.strip() == "9.00"
+
+    called = []
+    monkeypatch.setattr(app, "convert_local", lambda pair, amount, db: called.append(pair) or daemon.core.convert("USD", "EUR", amount))
+    assert app.main(["--pair", "usd-eur", "--amount", "10", "--socket", str(tmp_path / "none.sock"), "-q"]) == 0
+    assert called == ["usd-eur"] and capsys.readouterr().out.strip() == "9.00"
+
+    assert not DaemonClient(tmp_path / "none.sock").ping()
+    with pytest.raises(DaemonUnavailable):
+        DaemonClient(tmp_path / "none.sock").request("PING")
+
+
+def test_db_and_socket_accepted_before_or_after_subcommand():
+    parser = app.build_parser()
+    before = parser.parse_args(["--db", "x.db", "--socket", "/tmp/s", "daemon"])
+    after = parser.parse_args(["daemon", "--db", "x.db", "--socket", "/tmp/s"])
+    for args in (before, after):
+        assert (str(args.db), str(args.socket)) == ("x.db", "/tmp/s")
+    assert str(parser.parse_args(["bulk", "in.csv", "-"]).db) == "rates.sqlite3"
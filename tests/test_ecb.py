@@ -0,0 +1,55 @@
+import io
+import zipfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from converter.core import ConverterCore
+from converter.ecb import iter_csv, iter_file, iter_xml
+from converter.providers import ProviderRegistry, StubProvider
+
+XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+<Cube>
+<Cube time="2024-01-03"><Cube currency="USD" rate="1.0919"/><Cube currency="GBP" rate="0.86285"/></Cube>
+<Cube time="2024-01-02"><Cube currency="USD" rate="1.0956"/><Cube currency="GBP" rate="0.86560"/></Cube>
+</Cube>
+</gesmes:Envelope>"""
+
+CSV = b"""Date, USD, JPY, GBP, CYP, 
+2024-01-03, 1.0919, 155.86, 0.86285, N/A, 
+2024-01-02, 1.0956, 155.87, 0.86560, N/A, 
+2004-05-03, 1.1999, 133.01, 0.67330, 0.5834, 
+"""
+
+
+def test_xml_and_csv_parse_incrementally():
+    days = list(iter_xml(io.BytesIO(XML)))
+    assert [d for d, _ in days] == [date(2024, 1, 3), date(2024, 1, 2)]
+    assert days[0][1] == {"USD": Decimal("1.0919"), "GBP": Decimal("0.86285")}
+
+    rows = list(iter_csv(io.BytesIO(CSV)))
+    assert len(rows) == 3 and "CYP" not in rows[0][1] and rows[2][1]["CYP"] == Decimal("0.5834")
+    assert rows[0][1]["JPY"] == Decimal("155.86")
+
+
+def test_import_zip_into_history(tmp_path):
+    archive = tmp_path / "eurofxref-hist.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("eurofxref-hist.csv", CSV)
+    assert len(list(iter_file(archive))) == 3
+
+    registry = ProviderRegistry()
+    registry.register(StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.90")}))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", registry=registry)
+    try:
+        assert core.import_ecb_history(archive, batch_days=2) == (3, 13)
+        at = datetime(2024, 1, 2, 18, tzinfo=timezone.utc)
+        res = core.convert("EUR", "USD", Decimal("100"), at=at)
+        assert res.result == Decimal("109.56") and res.source == "ECB"
+        # До публикации курса за 2 января — курс последнего опубликованного дня
+        res = core.convert("GBP", "JPY", at=datetime(2024, 1, 2, 12, tzinfo=timezone.utc))
+        assert res.rate.quantize(Decimal("0.01")) == (Decimal("133.01") / Decimal("0.67330")).quantize(Decimal("0.01"))
+        # Текущий снимок импорт не трогает
+        assert core.convert("EUR", "USD").source == "stub"
+    finally:
+        core.close()
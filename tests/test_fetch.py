@@ -0,0 +1,243 @@
+import http.server
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+import converter.core as coremod
+from converter.providers import CircuitBreaker, ECBProvider, HttpClient, ProviderRegistry, StubProvider
+
+FIAT = {"USD": Decimal("1"), "EUR": Decimal("0.9")}
+
+
+@pytest.fixture
+def release():
+    ev = threading.Event()
+    yield ev
+    ev.set()
+
+
+class HangingProvider(StubProvider):
+    def __init__(self, release, **kwargs):
+        super().__init__({}, **kwargs)
+        self.release = release
+
+    def fetch(self, timeout=10.0, **kwargs):
+        self.calls += 1
+        self.release.wait(timeout)
+        raise TimeoutError(f"{self.name}: timed out")
+
+
+def make_registry(*providers):
+    registry = ProviderRegistry()
+    for p in providers:
+        registry.register(p)
+    return registry
+
+
+def test_providers_fetched_concurrently():
+    registry = make_registry(
+        StubProvider(FIAT, name="ECB", kind="fiat", delay=0.3),
+        StubProvider({"BTC": Decimal("0.00002")}, name="CoinGecko", kind="crypto", delay=0.3),
+    )
+    t0 = time.monotonic()
+    rates, source = coremod.fetch_usd_rates(registry=registry)
+    assert time.monotonic() - t0 < 0.55
+    assert source == "ECB+CoinGecko"
+    assert rates["EUR"] == Decimal("0.9") and rates["BTC"] == Decimal("0.00002")
+
+
+def test_hedged_fallback_when_primary_hangs(release):
+    fallback = StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.91")}, name="Frankfurter(ECB)", kind="fiat")
+    registry = make_registry(HangingProvider(release, name="ECB", kind="fiat"), fallback)
+
+    t0 = time.monotonic()
+    rates, source = coremod.fetch_usd_rates(deadline=5, hedge_delay=0.1, registry=registry)
+    assert time.monotonic() - t0 < 1.0
+    assert source == "Frankfurter(ECB)"
+    assert rates["EUR"] == Decimal("0.91")
+
+
+def test_fallback_started_immediately_on_primary_error():
+    fallback = StubProvider(FIAT, name="backup", kind="fiat")
+    registry = make_registry(StubProvider({}, name="primary", kind="fiat", error=RuntimeError("boom")), fallback)
+    t0 = time.monotonic()
+    _, source = coremod.fetch_usd_rates(hedge_delay=5, registry=registry)
+    assert time.monotonic() - t0 < 1.0
+    assert source == "backup"
+
+
+def test_overall_deadline_returns_partial_results(release):
+    registry = make_registry(
+        StubProvider(FIAT, name="ECB", kind="fiat"),
+        HangingProvider(release, name="CoinGecko", kind="crypto"),
+    )
+    t0 = time.monotonic()
+    rates, source = coremod.fetch_usd_rates(deadline=0.3, registry=registry)
+    assert time.monotonic() - t0 < 1.0
+    assert source == "ECB"
+    assert "BTC" not in rates
+
+
+def test_breaker_skips_failing_provider_and_probes_recovery():
+    primary = StubProvider(FIAT, name="primary", kind="fiat", error=RuntimeError("boom"))
+    registry = make_registry(primary, StubProvider(FIAT, name="backup", kind="fiat"))
+    for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+        assert coremod.fetch_usd_rates(hedge_delay=5, registry=registry)[1] == "backup"
+    assert primary.breaker.state == "open"
+    assert registry.route("fiat") == [registry.get("backup")]
+
+    coremod.fetch_usd_rates(hedge_delay=5, registry=registry)
+    assert primary.calls == CircuitBreaker.FAILURE_THRESHOLD  # разомкнутый автомат — без запроса
+
+    # Пауза истекла, провайдер снова работает: пробный запрос уходит параллельно с резервным
+    primary.error = None
+    primary.breaker.cooldown = 0.0
+    assert primary.breaker.state == "half_open"
+    coremod.fetch_usd_rates(hedge_delay=5, registry=registry)
+    for _ in range(100):
+        if primary.breaker.state == "closed":
+            break
+        time.sleep(0.01)
+    assert primary.calls == CircuitBreaker.FAILURE_THRESHOLD + 1
+    assert primary.breaker.state == "closed"
+    assert registry.route("fiat")[0] is primary
+
+
+def test_breaker_single_probe_and_adaptive_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.0, min_timeout=0.5)
+    assert breaker.timeout(10.0) == 10.0  # пока мало замеров — заданный таймаут
+    for _ in range(CircuitBreaker.MIN_SAMPLES):
+        breaker.record_success(0.1)
+    assert breaker.timeout(10.0) == 0.5
+    for _ in range(CircuitBreaker.WINDOW):
+        breaker.record_success(1.0)
+    assert breaker.timeout(10.0) == 3.0 and breaker.timeout(2.0) == 2.0
+
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.acquire() is True
+    assert breaker.acquire() is False  # пробный запрос — только один
+    breaker.record_failure()
+    assert breaker.failures == 2 and breaker.acquire() is True
+
+
+ECB_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+<Cube><Cube time="2025-09-12"><Cube currency="USD" rate="1.25"/><Cube currency="GBP" rate="0.85"/></Cube></Cube>
+</gesmes:Envelope>"""
+
+
+@pytest.fixture
+def ecb_server():
+    hits = {"200": 0, "304": 0}
+    connections = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == '"v1"':
+                hits["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            hits["200"] += 1
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(ECB_XML)))
+            self.end_headers()
+            self.wfile.write(ECB_XML)
+
+        def log_message(self, *args):
+            pass
+
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}/eurofxref-daily.xml", hits, connections
+    srv.shutdown()
+
+
+def test_conditional_request_skips_download_and_parsing(tmp_path, ecb_server, monkeypatch):
+    url, hits, _ = ecb_server
+
+    class LocalECB(ECBProvider):
+        def url(self):
+            return url
+
+    provider = LocalECB(HttpClient(cache_dir=tmp_path), ttl=0)
+    first = provider.fetch()
+    assert first["GBP"] == Decimal("0.68") and first["EUR"] == Decimal("0.8")
+    assert hits == {"200": 1, "304": 0}
+
+    monkeypatch.setattr(LocalECB, "parse", lambda self, body: pytest.fail("304 не должен разбираться заново"))
+    assert provider.fetch() == first
+    assert hits == {"200": 1, "304": 1}
+
+    # Новый процесс: валидаторы и тело ответа берутся из дискового кэша
+    monkeypatch.undo()
+    fresh = LocalECB(HttpClient(cache_dir=tmp_path), ttl=0)
+    assert fresh.fetch() == first
+    assert hits == {"200": 1, "304": 2}
+
+
+def test_ttl_serves_parsed_result_without_network(tmp_path, ecb_server):
+    url, hits, _ = ecb_server
+
+    class LocalECB(ECBProvider):
+        def url(self):
+            return url
+
+    provider = LocalECB(HttpClient(cache_dir=tmp_path), ttl=3600)
+    provider.fetch()
+    provider.fetch()
+    assert hits == {"200": 1, "304": 0}
+
+
+def test_breaker_latency_only_from_network_responses(tmp_path, ecb_server):
+    url, hits, _ = ecb_server
+
+    class LocalECB(ECBProvider):
+        def url(self):
+            return url
+
+    cached = LocalECB(HttpClient(cache_dir=tmp_path / "a"), ttl=3600)
+    revalidated = LocalECB(HttpClient(cache_dir=tmp_path / "b"), ttl=0)
+    for _ in range(5):
+        coremod._timed_fetch(cached, 10.0)
+        coremod._timed_fetch(revalidated, 10.0)
+    # По одному замеру: остальные ответы — из памяти или 304 без тела
+    assert len(cached.breaker._latencies) == 1 and len(revalidated.breaker._latencies) == 1
+    assert hits == {"200": 2, "304": 4}
+
+
+def test_connections_reused_across_refreshes(tmp_path, ecb_server):
+    url, hits, connections = ecb_server
+
+    class LocalECB(ECBProvider):
+        def url(self):
+            return url
+
+    # Каждое обновление опрашивает провайдеров в новых потоках, а соединение берётся из общего пула
+    registry = make_registry(LocalECB(HttpClient(cache_dir=tmp_path), ttl=0))
+    for _ in range(5):
+        coremod.fetch_usd_rates(registry=registry)
+    assert hits == {"200": 1, "304": 4}
+    assert len(connections) == 1
+
+
+def test_core_with_stub_registry_works_offline(tmp_path):
+    registry = make_registry(StubProvider(FIAT, name="stub-fiat"),
+                             StubProvider({"BTC": Decimal("0.00002")}, name="stub-crypto", kind="crypto"))
+    core = coremod.ConverterCore(db_path=tmp_path / "rates.sqlite3", registry=registry)
+    res = core.convert("BTC", "EUR", Decimal("1"))
+    assert res.result == Decimal("45000.00")
+    assert res.source == "stub-fiat+stub-crypto"
+    core.close()
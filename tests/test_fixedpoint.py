@@ -0,0 +1,58 @@
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+from converter.core import ConverterCore
+from converter.fixedpoint import FixedRates, minor_quantum, minor_units, round_minor, split_decimal
+from converter.providers import ProviderRegistry, StubProvider
+
+
+def test_fixed_rates_are_exact_and_pack_roundtrip():
+    rates = {
+        "USD": Decimal("1"),
+        "RUB": Decimal("91.37") / Decimal("0.9131"),
+        "BTC": Decimal("1") / Decimal("61873.21"),
+        "JPY": Decimal("1.495E+2"),
+        "NEG": Decimal("-0.000000000000000000000000001234567890123456789"),
+    }
+    table = FixedRates(rates)
+    assert table.as_dict() == rates
+    assert FixedRates.unpack_from(table.pack(), len(table)).as_dict() == rates
+
+    mantissa, exponent = table.fixed("RUB")
+    assert Decimal(mantissa).scaleb(exponent) == rates["RUB"]
+    with pytest.raises(ValueError):
+        split_decimal(Decimal("1" * 39))
+
+
+def test_minor_units_per_asset():
+    assert (minor_units("USD"), minor_units("JPY"), minor_units("KWD")) == (2, 0, 3)
+    assert minor_units("BTC") == 8 and minor_units("XYZ", crypto=True) == 8
+    assert minor_quantum("BTC") == Decimal("0.00000001") and minor_quantum("JPY") == Decimal("1")
+
+
+def test_round_minor_caps_digits_at_context_precision():
+    assert round_minor(Decimal("2.345"), Decimal("0.01")) == Decimal("2.35")
+    # 11 знаков до запятой + 18 после не помещаются в 28 цифр — остаётся 17 после запятой
+    value = Decimal("1e14") * Decimal("0.0003012345678901234567890123")
+    assert round_minor(value, minor_quantum("ETH")) == Decimal("30123456789.01234567890123000")
+
+
+def test_result_rounded_to_quote_minor_unit_half_up(tmp_path):
+    rates = {"USD": Decimal("1"), "EUR": Decimal("0.9131"), "JPY": Decimal("149.37"), "BTC": Decimal("0.0000161"),
+             "ETH": Decimal("1") / Decimal("3319.47")}
+    registry = ProviderRegistry()
+    registry.register(StubProvider(rates))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", registry=registry)
+    try:
+        assert core.convert("USD", "JPY", Decimal("1.5")).result == Decimal("224")
+        assert core.convert("USD", "BTC", Decimal("123.45")).result == Decimal("0.00198755")
+        assert core.convert("USD", "ETH", Decimal("1e14")).result.adjusted() == 10
+        rnd = random.Random(11)
+        for _ in range(2000):
+            amount = Decimal(f"{rnd.randint(0, 10 ** 6)}.{rnd.randint(0, 999):03d}")
+            res = core.convert("USD", "EUR", amount)
+            assert res.result == (amount * rates["EUR"]).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    finally:
+        core.close()
@@ -0,0 +1,65 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+import converter.core as coremod
+from converter.core import ConverterCore
+from converter.history import decode_rate, encode_rate
+from converter.storage import init_db
+
+
+def test_rate_encoding_roundtrip():
+    for raw in ("0.90", "90", "0.000025", "-3.5", "25000"):
+        assert decode_rate(*encode_rate(Decimal(raw))) == Decimal(raw)
+    assert str(decode_rate(*encode_rate(Decimal("90")))) == "90"
+
+    # Результаты деления (28 знаков) округляются до 18 значащих цифр и помещаются в int64
+    value = Decimal(1) / Decimal(3)
+    mantissa, exponent = encode_rate(value)
+    assert abs(mantissa) < 2 ** 63
+    assert abs(decode_rate(mantissa, exponent) - value) < Decimal("1e-18")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": datetime(2025, 1, 10, 12, tzinfo=timezone.utc)}
+    monkeypatch.setattr(coremod, "_utcnow", lambda: now["t"])
+    return now
+
+
+def test_convert_as_of_nearest_snapshot(tmp_path, monkeypatch, clock):
+    eur = {"v": Decimal("0.90")}
+    monkeypatch.setattr(coremod, "fetch_usd_rates",
+                        lambda: ({"USD": Decimal("1"), "EUR": eur["v"], "BTC": Decimal("0.00002")}, "fake"))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3")
+    first = clock["t"]
+
+    clock["t"] = first + timedelta(days=3)
+    eur["v"] = Decimal("0.95")
+    core.update_rates(force=True)
+
+    # Последний курс — из снимка, исторические — из rate_history
+    assert core.convert("USD", "EUR", Decimal("100")).result == Decimal("95.00")
+    old = core.convert("USD", "EUR", Decimal("100"), at=first + timedelta(days=1))
+    assert old.result == Decimal("90.00")
+    assert old.fetched_at == first
+    assert core.convert("EUR", "BTC", Decimal("1"), at=first + timedelta(days=4)).rate == Decimal("0.00002") / Decimal("0.95")
+
+    with pytest.raises(ValueError):
+        core.convert("USD", "EUR", at=first - timedelta(seconds=1))
+
+    assert core.prune_history(first + timedelta(days=1)) == 3
+    with pytest.raises(ValueError):
+        core.convert("USD", "EUR", at=first + timedelta(days=1))
+    core.close()
+
+
+def test_as_of_lookup_uses_primary_key(tmp_path):
+    conn = sqlite3.connect(tmp_path / "rates.sqlite3")
+    init_db(conn)
+    plan = " ".join(str(row) for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT fetched_at FROM rate_history "
+        "WHERE base=? AND symbol=? AND fetched_at<=? ORDER BY fetched_at DESC LIMIT 1", ("USD", "EUR", 0)))
+    assert "PRIMARY KEY" in plan and "TEMP B-TREE" not in plan
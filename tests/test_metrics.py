@@ -0,0 +1,106 @@
+import threading
+import time
+from decimal import Decimal
+
+from converter.core import PROVIDER_ERRORS, PROVIDER_FETCH_SECONDS, ConverterCore, fetch_usd_rates
+from converter.metrics import Registry, SamplingProfiler
+from converter.providers import ProviderRegistry, StubProvider
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    hits = registry.counter("demo_hits_total", "Попадания", ["result"])
+    hits.inc(result="hit")
+    hits.labels(result="hit").inc(2)
+    registry.gauge("demo_age_seconds", "Возраст", fn=lambda: {(): 12.5})
+    hist = registry.histogram("demo_seconds", "Задержка", buckets=(0.001, 0.01))
+    for value in (0.0005, 0.005, 0.5):
+        hist.observe(value)
+
+    text = registry.render()
+    assert "# TYPE demo_hits_total counter" in text
+    assert 'demo_hits_total{result="hit"} 3' in text
+    assert "demo_age_seconds 12.5" in text
+    assert 'demo_seconds_bucket{le="0.001"} 1' in text
+    assert 'demo_seconds_bucket{le="0.01"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in text
+    assert "demo_seconds_count 3" in text
+    # Повторная регистрация возвращает ту же метрику
+    assert registry.counter("demo_hits_total", "Попадания", ["result"]) is hits
+
+
+def test_histogram_counts_every_observation_across_threads():
+    hist = Registry().histogram("t_seconds", "t", ["path"])
+    series = hist.labels(path="x")
+
+    def work():
+        for _ in range(5000):
+            series.observe(0.0001)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert hist.count(path="x") == 40000
+
+
+def test_histogram_folds_rows_of_finished_threads():
+    series = Registry().histogram("conn_seconds", "c").labels()
+    for _ in range(50):
+        t = threading.Thread(target=series.observe, args=(0.001,))
+        t.start()
+        t.join()
+    series.observe(0.001)
+    assert len(series._rows) <= 2
+    assert sum(series.merged()[:-1]) == 51
+
+
+def test_provider_fetch_duration_and_errors_recorded():
+    registry = ProviderRegistry()
+    registry.register(StubProvider({}, name="metrics-broken", error=RuntimeError("down")))
+    registry.register(StubProvider({"EUR": Decimal("0.9")}, name="metrics-ok"))
+    before = PROVIDER_ERRORS.value(provider="metrics-broken")
+
+    fetch_usd_rates(deadline=5, hedge_delay=5, registry=registry)
+
+    assert PROVIDER_ERRORS.value(provider="metrics-broken") == before + 1
+    assert PROVIDER_FETCH_SECONDS.count(provider="metrics-ok") >= 1
+
+
+def test_core_exposes_snapshot_state(tmp_path):
+    providers = ProviderRegistry()
+    providers.register(StubProvider({"EUR": Decimal("0.9")}))
+    core = ConverterCore(db_path=tmp_path / "r.sqlite3", registry=providers)
+    registry = Registry()
+    try:
+        core.register_metrics(registry)
+        core.convert("USD", "EUR", Decimal("10"))
+        text = registry.render()
+        assert 'converter_snapshot{field="version"} 1' in text
+        assert "converter_leader 1" in text
+        assert 'converter_resolver_cache_total{cache="normalize",result="hit"}' in text
+    finally:
+        core.close()
+
+
+def test_sampling_profiler_toggles_at_runtime():
+    profiler = SamplingProfiler(interval=0.001)
+    stop = threading.Event()
+
+    def busy_marker_loop():
+        while not stop.is_set():
+            sum(range(100))
+
+    worker = threading.Thread(target=busy_marker_loop)
+    worker.start()
+    try:
+        profiler.start()
+        time.sleep(0.1)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not profiler.running and profiler.samples > 0
+    assert "busy_marker_loop" in profiler.folded()
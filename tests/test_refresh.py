@@ -0,0 +1,301 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+import converter.core as coremod
+from converter.core import ConverterCore, RateSnapshot
+from converter.refresh import RefreshScheduler, SingleFlight
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = {"n": 0}
+
+    def work():
+        calls["n"] += 1
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do(work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do(work))) for _ in range(8)]
+    for t in followers:
+        t.start()
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert calls["n"] == 1
+    assert results == ["done"] * 9
+
+
+def test_stale_snapshot_served_while_refresh_runs_in_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(coremod, "fetch_usd_rates", lambda: ({"USD": Decimal("1"), "EUR": Decimal("0.90")}, "old"))
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3")
+
+    snap = core.snapshot
+    core._snapshot = RateSnapshot(snap.base, snap.rates, snap.fetched_at - timedelta(hours=13), snap.source, snap.version)
+
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_fetch():
+        entered.set()
+        release.wait(5)
+        return {"USD": Decimal("1"), "EUR": Decimal("0.95")}, "new"
+
+    monkeypatch.setattr(coremod, "fetch_usd_rates", slow_fetch)
+
+    res = core.convert("USD", "EUR", Decimal("10"))
+    assert res.source == "old" and res.result == Decimal("9.00")
+    assert entered.wait(5)
+
+    # Пока обновление висит, запросы продолжают обслуживаться старым снимком
+    assert core.convert("USD", "EUR", Decimal("10")).source == "old"
+
+    release.set()
+    for _ in range(500):
+        if core.snapshot.source == "new":
+            break
+        time.sleep(0.01)
+    assert core.convert("USD", "EUR", Decimal("10")).result == Decimal("9.50")
+    core.close()
+
+
+def test_scheduler_backs_off_after_failures():
+    attempts = []
+    done = threading.Event()
+
+    def refresh():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("провайдер недоступен")
+        done.set()
+
+    sched = RefreshScheduler(refresh, next_delay=lambda: 0.0, jitter=0.0, backoff_initial=0.01, backoff_max=0.05)
+    sched.start()
+    assert done.wait(5)
+    sched.stop(timeout=5)
+    assert len(attempts) >= 3
+    assert sched.failures == 0
+
+
+def test_scheduler_triggers_ignored_during_backoff():
+    attempts = []
+
+    def refresh():
+        attempts.append(1)
+        raise RuntimeError("провайдер недоступен")
+
+    sched = RefreshScheduler(refresh, next_delay=lambda: 0.0, jitter=0.0, backoff_initial=5.0)
+    sched.start()
+    try:
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            sched.trigger()
+            time.sleep(0.005)
+        assert len(attempts) == 1
+    finally:
+        sched.stop(timeout=5)
+
+
+def test_aconvert_offloads_provider_io_with_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr(coremod, "fetch_usd_rates", lambda: ({"USD": Decimal("1"), "EUR": Decimal("0.90")}, "fake"))
+    monkeypatch.setattr(coremod, "fetch_usd_rates_for", lambda symbols, registry=None: None)
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", missing_refresh_interval=0)
+    release = threading.Event()
+
+    def hanging_fetch():
+        release.wait(5)
+        return {"USD": Decimal("1"), "EUR": Decimal("0.90")}, "fake"
+
+    monkeypatch.setattr(coremod, "fetch_usd_rates", hanging_fetch)
+
+    async def scenario():
+        # Курс из снимка — без пула потоков
+        res = await core.aconvert("USD", "EUR", Decimal("10"))
+        assert res.result == Decimal("9.00")
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        t = asyncio.ensure_future(ticker())
+        with pytest.raises(asyncio.TimeoutError):
+            await core.aconvert("USD", "BTC", Decimal("1"), timeout=0.1)
+        t.cancel()
+        # Пока провайдер «висел», event loop продолжал работать
+        assert ticks > 5
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        core.close()
+
+
+def test_non_blocking_init_warms_up_in_background(tmp_path, monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_fetch():
+        entered.set()
+        release.wait(5)
+        return {"USD": Decimal("1"), "EUR": Decimal("0.90")}, "fresh"
+
+    monkeypatch.setattr(coremod, "fetch_usd_rates", slow_fetch)
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", fetch_on_init=False)
+    # Конструктор вернулся, не дожидаясь провайдера
+    assert entered.wait(5) and not core.ready
+
+    release.set()
+    for _ in range(500):
+        if core.ready:
+            break
+        time.sleep(0.01)
+    assert core.snapshot.source == "fresh"
+
+    core.export_snapshot(tmp_path / "bundled.json")
+    core.close()
+
+    # Пустая БД + поставляемый снимок: ядро готово сразу, курсы — из файла
+    monkeypatch.setattr(coremod, "fetch_usd_rates", lambda: release.wait(5) and ({}, "unused"))
+    release.clear()
+    other = ConverterCore(db_path=tmp_path / "other.sqlite3", fetch_on_init=False,
+                          bundled_snapshot=tmp_path / "bundled.json")
+    try:
+        assert other.ready
+        assert other.snapshot.source == "fresh (bundled)"
+        assert other.convert("USD", "EUR", Decimal("10")).result == Decimal("9.00")
+    finally:
+        release.set()
+        other.close()
+
+
+def _stub_core(tmp_path, **kwargs):
+    from converter.providers import ProviderRegistry, StubProvider
+
+    fiat = StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.90")}, name="stub-fiat")
+    crypto = StubProvider({"BTC": Decimal("0.00002"), "ETH": Decimal("0.0003")}, name="stub-crypto",
+                          kind="crypto", targeted=True)
+    registry = ProviderRegistry()
+    registry.register(fiat)
+    registry.register(crypto)
+    core = ConverterCore(db_path=tmp_path / "rates.sqlite3", registry=registry, **kwargs)
+    return core, fiat, crypto
+
+
+def test_unknown_symbol_negative_cached_and_full_refresh_rate_limited(tmp_path):
+    core, fiat, _ = _stub_core(tmp_path, missing_refresh_interval=0)
+    try:
+        assert fiat.calls == 1
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                core.convert("USD", "XYZ")
+        # Одно полное обновление, дальше XYZ известен как отсутствующий
+        assert fiat.calls == 2
+
+        core.missing_refresh_interval = 60
+        with pytest.raises(ValueError):
+            core.convert("USD", "QQQ")
+        assert fiat.calls == 2
+    finally:
+        core.close()
+
+
+def test_symbol_not_negative_cached_when_its_provider_failed(tmp_path):
+    core, _, crypto = _stub_core(tmp_path, missing_refresh_interval=0)
+    try:
+        crypto.targeted = False  # только полным обновлением
+        snap = core.snapshot
+        core._snapshot = RateSnapshot(snap.base, {k: v for k, v in snap.rates.items() if k != "BTC"},
+                                      snap.fetched_at, snap.source, snap.version)
+        crypto.error = RuntimeError("timeout")
+        with pytest.raises(ValueError):
+            core.convert("USD", "BTC")
+
+        crypto.error = None
+        assert core.convert("USD", "BTC").rate == Decimal("0.00002")
+    finally:
+        core.close()
+
+
+def test_rate_limited_targeted_fetch_is_unavailable_not_unknown(tmp_path):
+    from converter.providers import RateLimited
+
+    core, _, crypto = _stub_core(tmp_path)
+    try:
+        snap = core.snapshot
+        core._snapshot = RateSnapshot(snap.base, {k: v for k, v in snap.rates.items() if k != "ETH"},
+                                      snap.fetched_at, snap.source, snap.version)
+        crypto.error = RateLimited("CoinGecko: исчерпан лимит запросов, повторите позже")
+        with pytest.raises(ValueError, match="недоступен"):
+            core.convert("USD", "ETH")
+
+        crypto.error = None
+        assert core.convert("USD", "ETH").rate == Decimal("0.0003")
+    finally:
+        core.close()
+
+
+def test_missing_crypto_fetched_alone_from_targeted_provider(tmp_path):
+    core, fiat, crypto = _stub_core(tmp_path)
+    try:
+        snap = core.snapshot
+        core._snapshot = RateSnapshot(snap.base, {k: v for k, v in snap.rates.items() if k != "ETH"},
+                                      snap.fetched_at, snap.source, snap.version)
+        fiat_calls, crypto_calls = fiat.calls, crypto.calls
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(core.convert("ETH", "USD"))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+
+        assert len(results) == 4 and results[0].rate == Decimal(1) / Decimal("0.0003")
+        assert fiat.calls == fiat_calls
+        assert crypto.requested[crypto_calls:] and all(r == ["ETH"] for r in crypto.requested[crypto_calls:])
+        # Догрузка не «освежает» весь снимок
+        assert core.snapshot.fetched_at == snap.fetched_at
+    finally:
+        core.close()
+
+
+def test_refresh_persists_only_changed_rates_under_new_version(tmp_path):
+    core, fiat, crypto = _stub_core(tmp_path)
+    try:
+        v1 = core.snapshot.version
+        assert core.changes_since(v1) == (v1, {})
+
+        fiat.rates["EUR"] = Decimal("0.91")
+        core.update_rates(force=True)
+        v2 = core.snapshot.version
+        assert v2 == v1 + 1
+        assert core.changes_since(v1) == (v2, {"EUR": Decimal("0.91")})
+
+        # Без изменений версия растёт, но в БД ничего не переписывается
+        rows = core.storage.reader().execute("SELECT COUNT(*) FROM rate_history").fetchone()[0]
+        core.update_rates(force=True)
+        assert core.snapshot.version == v2 + 1 and core.changes_since(v2) == (v2 + 1, {})
+        assert core.storage.reader().execute("SELECT COUNT(*) FROM rate_history").fetchone()[0] == rows
+        assert core.changes_since(0)[1].keys() == {"USD", "EUR", "BTC", "ETH"}
+    finally:
+        core.close()
+
+    # Версия и время обновления переживают перезапуск
+    reopened = ConverterCore(db_path=tmp_path / "rates.sqlite3", fetch_on_init=False)
+    try:
+        assert reopened.snapshot.version == v2 + 1 and reopened.changes_since(v2) == (v2 + 1, {})
+    finally:
+        reopened.close()
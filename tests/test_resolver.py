@@ -0,0 +1,60 @@
+import pytest
+
+from converter.core import NAME_ALIASES, normalize_code, parse_pair, suggest_codes
+from converter.resolver import AliasTrie, Resolver
+
+
+def test_aliases_resolved_before_three_letter_fallback():
+    assert normalize_code("руб") == "RUB"
+    assert normalize_code("сом") == "KGS"
+    assert normalize_code("krs") == "KGS"
+    assert normalize_code(" Eur ") == "EUR"
+    assert normalize_code("abc") == "ABC"
+    assert normalize_code("неизвестно") == ""
+    with pytest.raises(ValueError):
+        normalize_code("  ")
+
+
+def test_typo_tolerant_matching():
+    assert normalize_code("биткон") == "BTC"
+    assert normalize_code("dollars") == "USD"
+    assert normalize_code("etherium") == "ETH"
+    assert parse_pair("биткон в евро") == ("BTC", "EUR")
+    # Короткие строки не угадываем
+    assert normalize_code("eurx") == ""
+
+
+def test_ambiguous_typo_is_not_guessed():
+    trie = AliasTrie({"крона": "SEK", "крока": "XXX"})
+    assert trie.fuzzy("кроза") is None
+    assert trie.fuzzy("кронa") == "SEK"
+
+
+def test_separate_word_is_not_taken_for_typo():
+    assert normalize_code("ether") == "ETH"
+    # «ether» в одной правке от «tether», но это другое слово, а не опечатка
+    assert Resolver({"tether": "USDT"}).normalize("ether") == ""
+
+
+def test_long_input_skips_fuzzy_search(monkeypatch):
+    resolver = Resolver(NAME_ALIASES)
+    fuzzy = resolver.trie.fuzzy
+    calls = []
+    monkeypatch.setattr(resolver.trie, "fuzzy", lambda word, **kw: calls.append(word) or fuzzy(word, **kw))
+    assert resolver.normalize("bitcoin" * 1000) == ""
+    assert calls == []
+    assert resolver.normalize("bitcoinn") == "BTC"
+
+
+def test_autocomplete_by_prefix():
+    assert suggest_codes("бит")[0] == ("биток", "BTC")
+    assert ("bitcoin cash", "BCH") in suggest_codes("bitcoin")
+    assert suggest_codes("zzz") == []
+
+
+def test_pair_parsing_is_cached():
+    resolver = Resolver(NAME_ALIASES)
+    assert resolver.parse_pair("usd - eur") == ("USD", "EUR")
+    assert resolver.parse_pair("usd - eur") == ("USD", "EUR")
+    info = resolver.parse_pair.cache_info()
+    assert info.hits == 1 and info.misses == 1
@@ -0,0 +1,157 @@
+import asyncio
+import importlib
+import sys
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import converter.core as coremod  # noqa: E402
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CONVERTER_DYNAMIC_ASSETS", "0")
+    monkeypatch.setattr(coremod, "fetch_usd_rates",
+                        lambda: ({"USD": Decimal("1"), "EUR": Decimal("0.90")}, "fake"))
+    sys.modules.pop("server", None)
+    module = importlib.import_module("server")
+    with TestClient(module.app) as client:
+        module.core.update_rates(force=True)
+        yield module, client
+    sys.modules.pop("server", None)
+
+
+def test_widget_page_cached_per_theme_with_etag(server):
+    module, client = server
+    module.render_index.cache_clear()
+
+    first = client.get("/?lang=en&accent=%23ff0000")
+    assert first.status_code == 200 and "Currency Converter" in first.text
+    assert "--cc-accent:#ff0000" in first.text
+    assert first.headers["Cache-Control"].startswith("public, max-age=")
+
+    again = client.get("/?lang=en&accent=%23ff0000", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    client.get("/?lang=en&accent=%23ff0000")
+    assert module.render_index.cache_info().hits == 1
+
+    other = client.get("/?lang=ru")
+    assert other.headers["ETag"] != first.headers["ETag"]
+
+
+def test_conversion_etag_follows_snapshot_version(server):
+    module, client = server
+    res = client.get("/convert?base=USD&quote=EUR&amount=10")
+    assert res.json()["result"] == "9.00"
+    etag = res.headers["ETag"]
+    assert client.get("/convert?base=USD&quote=EUR&amount=10", headers={"If-None-Match": etag}).status_code == 304
+
+    module.core.update_rates(force=True)
+    res = client.get("/convert?base=USD&quote=EUR&amount=10", headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["ETag"] != etag
+
+    form = client.post("/convert", data={"base": "USD", "quote": "EUR", "amount": "10"})
+    assert form.status_code == 200 and "cc-res" in form.text
+
+
+
+def test_max_age_capped_by_hot_coin_refresh(server, monkeypatch):
+    from converter.assets import AssetUniverse
+
+    module, client = server
+    monkeypatch.setattr(module.core, "assets", AssetUniverse({"BTC": "bitcoin"}, hot_ttl=60))
+    res = client.get("/convert?base=USD&quote=EUR")
+    assert res.headers["Cache-Control"] == "public, max-age=60"
+
+
+def test_provider_failure_on_missing_symbol_is_json_502(server, monkeypatch):
+    module, client = server
+    module.core.missing_refresh_interval = 0
+
+    def down():
+        raise RuntimeError("Не удалось получить курсы ни от одного провайдера")
+
+    monkeypatch.setattr(coremod, "fetch_usd_rates", down)
+    res = client.get("/convert?base=USD&quote=GBP")
+    assert res.status_code == 502 and "провайдера" in res.json()["error"]
+
+
+def test_rate_stream_pushes_only_changed_symbols(server):
+    module, client = server
+    core = module.core
+
+    async def scenario():
+        queue = module.rate_stream.subscribe()
+        try:
+            coremod.fetch_usd_rates = lambda: ({"USD": Decimal("1"), "EUR": Decimal("0.95")}, "fake")
+            await asyncio.get_running_loop().run_in_executor(None, lambda: core.update_rates(force=True))
+            return await asyncio.wait_for(queue.get(), 5)
+        finally:
+            module.rate_stream.unsubscribe(queue)
+
+    event = asyncio.run(scenario()).decode("utf-8").split("\n")
+    assert event[0] == "event: delta" and event[1] == f"id: {core.snapshot.version}"
+    assert module._loads(event[2][len("data: "):])["rates"] == {"EUR": "0.95"}
+
+    # Переполненная очередь медленного подписчика сбрасывается до маркера полной пересылки
+    queue = asyncio.Queue(maxsize=1)
+    module.RateStream._offer(queue, b"a")
+    module.RateStream._offer(queue, b"b")
+    assert queue.get_nowait() is None
+
+
+def test_metrics_endpoint_reports_conversions(server):
+    module, client = server
+    client.get("/convert?base=USD&quote=EUR&amount=10")
+
+    res = client.get("/metrics")
+    assert res.status_code == 200 and res.headers["content-type"].startswith("text/plain")
+    assert 'converter_convert_seconds_count{path="snapshot"}' in res.text
+    assert 'converter_refresh_total{result="ok"}' in res.text
+    assert 'converter_snapshot{field="age"}' in res.text
+    assert client.get("/debug/profiler").status_code == 404
+
+
+def test_rates_changes_and_stream_resume_from_version(server, monkeypatch):
+    module, client = server
+    since = module.core.snapshot.version
+    monkeypatch.setattr(coremod, "fetch_usd_rates",
+                        lambda: ({"USD": Decimal("1"), "EUR": Decimal("0.95"), "GBP": Decimal("0.80")}, "fake"))
+    module.core.update_rates(force=True)
+
+    body = client.get(f"/rates/changes?since={since}").json()
+    assert body["version"] == since + 1 and body["rates"] == {"EUR": "0.95", "GBP": "0.80"}
+    assert client.get(f"/rates/changes?since={since + 1}").json()["rates"] == {}
+
+    snap = module.core.snapshot
+    assert asyncio.run(module.resume_event(snap, str(since))).startswith(b"event: delta\n")
+    assert asyncio.run(module.resume_event(snap, None)).startswith(b"event: snapshot\n")
+
+
+def test_admission_rejects_fast_and_keeps_snapshot_path_open(server, monkeypatch):
+    from converter.admission import ClientRateLimiter, IoLimiter
+
+    module, client = server
+    monkeypatch.setattr(module, "io_limiter", IoLimiter(limit=0, max_queue=0, queue_timeout=1.0))
+    # I/O-пути (историческая конвертация) отклоняются сразу, из снимка — отвечают
+    busy = client.get("/convert?pair=usd-eur&at=2025-01-01T00:00:00")
+    assert busy.status_code == 503 and busy.headers["Retry-After"] == "1"
+    assert client.get("/convert?pair=usd-eur&amount=10").json()["result"] == "9.00"
+
+    monkeypatch.setattr(module, "client_limiter", ClientRateLimiter(rate=0.1, burst=2))
+    codes = [client.get("/rates?base=EUR").status_code for _ in range(3)]
+    assert codes == [200, 200, 429]
+    assert client.get("/healthz").status_code == 200
+
+
+def test_resolve_matches_convert_codes_and_precision(server):
+    module, client = server
+    res = client.get("/resolve", params={"base": "биткоин", "quote": "евро"}).json()
+    assert res == {"base": "BTC", "quote": "EUR", "digits": {"BTC": 8, "EUR": 2}}
+    assert client.get("/resolve", params={"pair": "usd в йена", "base": "xxx"}).json()["quote"] == "JPY"
+    assert client.get("/resolve", params={"base": "неизвестно", "quote": "usd"}).status_code == 400
@@ -0,0 +1,90 @@
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import converter.core as coremod
+from converter.core import ConverterCore
+from converter.shared import pack_snapshot, unpack_snapshot
+
+
+def _wait(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_pack_roundtrip_keeps_rates_exact():
+    rates = {"EUR": Decimal("0.9123"), "BTC": Decimal("0.0000161234"), "JPY": Decimal("149.5"), "USD": Decimal("1"),
+             "RUB": Decimal("91.37") / Decimal("0.9131")}  # 28 значащих цифр — без округления
+    now = datetime(2025, 9, 14, 12, 0, tzinfo=timezone.utc)
+    record = unpack_snapshot(pack_snapshot("USD", rates, now, "ECB+CoinGecko", 7))
+    assert record.rates == rates
+    assert (record.base, record.fetched_at, record.source, record.version) == ("USD", now, "ECB+CoinGecko", 7)
+
+
+def test_followers_read_leader_snapshot_and_take_over(tmp_path, monkeypatch):
+    calls = {"n": 0}
+
+    def fetch():
+        calls["n"] += 1
+        return {"USD": Decimal("1"), "EUR": Decimal("0.90") + calls["n"] / Decimal(100)}, f"stub{calls['n']}"
+
+    monkeypatch.setattr(coremod, "fetch_usd_rates", fetch)
+    shared = tmp_path / "rates.snapshot"
+    leader = ConverterCore(db_path=tmp_path / "a.sqlite3", shared_snapshot=shared, shared_poll_interval=0.02)
+    follower = ConverterCore(db_path=tmp_path / "b.sqlite3", shared_snapshot=shared, shared_poll_interval=0.02,
+                             fetch_on_init=False)
+    try:
+        assert leader.is_leader and not follower.is_leader
+        # Читатель получил снимок ведущего, не обращаясь к провайдерам
+        assert calls["n"] == 1
+        assert follower.snapshot.source == "stub1"
+        assert follower.snapshot.fetched_at == leader.snapshot.fetched_at
+
+        leader.update_rates(force=True)
+        assert _wait(lambda: follower.snapshot.source == "stub2")
+        assert follower.convert("USD", "EUR", Decimal("10")).result == Decimal("9.20")
+        assert follower.snapshot.version == leader.snapshot.version
+
+        # Догрузка символа не меняет fetched_at, но доходит до читателя по версии
+        leader._swap({"SOL": Decimal("0.007")}, "stub-crypto", datetime.now(timezone.utc), partial=True)
+        assert _wait(lambda: "SOL" in follower.snapshot.rates)
+        assert follower.snapshot.version == leader.snapshot.version
+
+        leader.close()
+        assert _wait(lambda: follower.is_leader)
+    finally:
+        leader.close()
+        follower.close()
+
+
+def test_follower_asks_leader_instead_of_providers(tmp_path):
+    from converter.providers import ProviderRegistry, StubProvider
+
+    def registry(crypto_rates):
+        reg = ProviderRegistry()
+        reg.register(StubProvider({"USD": Decimal("1"), "EUR": Decimal("0.9")}, name="stub-fiat"))
+        crypto = StubProvider(crypto_rates, name="stub-crypto", kind="crypto", targeted=True)
+        reg.register(crypto)
+        return reg, crypto
+
+    leader_reg, leader_crypto = registry({})
+    follower_reg, follower_crypto = registry({"SOL": Decimal("0.007")})
+    shared = tmp_path / "rates.snapshot"
+    leader = ConverterCore(db_path=tmp_path / "a.sqlite3", registry=leader_reg, shared_snapshot=shared,
+                           shared_poll_interval=0.02)
+    follower = ConverterCore(db_path=tmp_path / "b.sqlite3", registry=follower_reg, shared_snapshot=shared,
+                             shared_poll_interval=0.02, fetch_on_init=False)
+    try:
+        leader_crypto.rates["SOL"] = Decimal("0.007")
+        follower.update_rates(force=True)
+        assert follower.convert("USD", "SOL", Decimal("100")).result == Decimal("0.70")
+        # Догрузил ведущий, читатель к провайдерам не ходил
+        assert leader_crypto.requested[-1] == ["SOL"]
+        assert follower_crypto.calls == 0
+    finally:
+        leader.close()
+        follower.close()
@@ -0,0 +1,56 @@
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from converter.storage import Storage
+
+
+def test_readers_do_not_wait_for_open_write_transaction(tmp_path):
+    storage = Storage(tmp_path / "rates.sqlite3")
+    t0 = datetime(2025, 9, 14, tzinfo=timezone.utc)
+    storage.save_refresh("USD", {"EUR": Decimal("0.90")}, "old", t0)
+    assert storage.reader().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    in_tx, release = threading.Event(), threading.Event()
+
+    def writer():
+        with storage.write() as conn:
+            conn.execute("UPDATE rates SET rate='0.95', source='new'")
+            conn.execute("UPDATE rate_versions SET source='new'")
+            in_tx.set()
+            release.wait(5)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    try:
+        assert in_tx.wait(5)
+        # Пишущая транзакция открыта, а чтение из другого потока сразу видит последний COMMIT
+        done = []
+        reader = threading.Thread(target=lambda: done.append(storage.load_rates("USD")))
+        reader.start()
+        reader.join(1)
+        assert done and done[0][0]["EUR"] == Decimal("0.90")
+    finally:
+        release.set()
+        t.join(5)
+    assert storage.load_rates("USD")[2] == "new"
+    storage.close()
+
+
+def test_failed_write_is_rolled_back(tmp_path):
+    storage = Storage(tmp_path / "rates.sqlite3")
+    t0 = datetime(2025, 9, 14, tzinfo=timezone.utc)
+    with pytest.raises(ValueError):
+        with storage.write() as conn:
+            conn.execute("INSERT INTO rates(base, symbol, rate, fetched_at, source) VALUES('USD', 'EUR', '0.9', 0, 'x')")
+            conn.execute("INSERT INTO rate_versions VALUES('USD', 1, 0, 'x')")
+            raise ValueError("сбой посреди обновления")
+    assert storage.load_rates("USD") is None
+
+    storage.save_refresh("USD", {"EUR": Decimal("0.90"), "RUB": Decimal("90")}, "fake", t0)
+    rates, ts, source = storage.load_rates("USD")
+    assert rates == {"EUR": Decimal("0.90"), "RUB": Decimal("90")} and source == "fake"
+    assert set(storage.rates_as_of("USD", ["EUR", "RUB"], t0)) == {"EUR", "RUB"}
+    storage.close()